@@ -0,0 +1,32 @@
+"""add test_cases content hash and testlink version stamps
+
+Revision ID: 5b2e8c1d4a7f
+Revises: cef99fbf6d6c
+Create Date: 2026-10-17 10:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e8c1d4a7f'
+down_revision: Union[str, Sequence[str], None] = 'cef99fbf6d6c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_cases', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('test_cases', sa.Column('testlink_version', sa.Integer(), nullable=True))
+    op.add_column('test_cases', sa.Column('testlink_modification_ts', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('test_cases', 'testlink_modification_ts')
+    op.drop_column('test_cases', 'testlink_version')
+    op.drop_column('test_cases', 'content_hash')
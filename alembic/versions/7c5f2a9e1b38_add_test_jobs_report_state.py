@@ -0,0 +1,41 @@
+"""add test_jobs TestLink report state
+
+Revision ID: 7c5f2a9e1b38
+Revises: e3a9b6d20f14
+Create Date: 2026-10-17 19:42:18.305117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c5f2a9e1b38'
+down_revision: Union[str, Sequence[str], None] = 'e3a9b6d20f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_jobs', sa.Column('reported_at', sa.DateTime(), nullable=True))
+    op.add_column('test_jobs', sa.Column('testlink_execution_id', sa.Integer(), nullable=True))
+    op.add_column('test_jobs', sa.Column('report_attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('test_jobs', sa.Column('next_report_at', sa.DateTime(), nullable=True))
+    # Уже завершённые jobs отчитывались каждую ночь - не отправляем их повторно
+    op.execute("UPDATE test_jobs SET reported_at = now() WHERE openqa_status = 'done'")
+    op.create_index(
+        'ix_test_jobs_unreported', 'test_jobs', ['next_report_at'],
+        postgresql_where=sa.text("openqa_status = 'done' AND reported_at IS NULL")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_jobs_unreported', table_name='test_jobs')
+    op.drop_column('test_jobs', 'next_report_at')
+    op.drop_column('test_jobs', 'report_attempts')
+    op.drop_column('test_jobs', 'testlink_execution_id')
+    op.drop_column('test_jobs', 'reported_at')
@@ -0,0 +1,44 @@
+"""unique test_cases.testcase_number for ON CONFLICT upsert
+
+Revision ID: 9d41f7a3c2e6
+Revises: 5b2e8c1d4a7f
+Create Date: 2026-10-17 11:03:48.215067
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41f7a3c2e6'
+down_revision: Union[str, Sequence[str], None] = '5b2e8c1d4a7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубликаты от старого sync: jobs переносим на самую раннюю строку, остальные удаляем
+    op.execute("""
+        WITH ranked AS (
+            SELECT id, min(id) OVER (PARTITION BY testcase_number) AS keep_id
+            FROM test_cases
+        )
+        UPDATE test_jobs j
+        SET testcase_id = r.keep_id
+        FROM ranked r
+        WHERE j.testcase_id = r.id AND r.id <> r.keep_id
+    """)
+    op.execute("""
+        DELETE FROM test_cases c
+        USING test_cases k
+        WHERE c.testcase_number = k.testcase_number AND c.id > k.id
+    """)
+    op.create_unique_constraint('test_cases_testcase_number_key', 'test_cases', ['testcase_number'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('test_cases_testcase_number_key', 'test_cases', type_='unique')
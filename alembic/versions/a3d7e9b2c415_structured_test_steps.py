@@ -0,0 +1,61 @@
+"""test_cases.steps as compact JSONB with GIN index, preconditions without HTML
+
+Revision ID: a3d7e9b2c415
+Revises: e8b4f1c7a2d9
+Create Date: 2026-10-18 01:12:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d7e9b2c415'
+down_revision: Union[str, Sequence[str], None] = 'e8b4f1c7a2d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Текст json.dumps(шаги TestLink) → jsonb; не-JSON (ручные правки) - NULL
+    op.execute("""
+        ALTER TABLE test_cases ALTER COLUMN steps TYPE jsonb USING (
+            CASE WHEN steps ~ '^\\s*\\[' THEN steps::jsonb END
+        )
+    """)
+    # Шаги TestLink → компактный вид; HTML здесь снимается грубо (регуляркой), поэтому
+    # content_hash сбрасывается: следующая синхронизация перепишет кейсы через BeautifulSoup
+    op.execute("""
+        UPDATE test_cases SET
+            steps = (
+                SELECT coalesce(jsonb_agg(jsonb_build_object(
+                    'step', coalesce(nullif(s->>'step_number', '')::int, n::int),
+                    'action', btrim(regexp_replace(coalesce(s->>'actions', ''), '<[^>]*>', ' ', 'g')),
+                    'expected', btrim(regexp_replace(coalesce(s->>'expected_results', ''), '<[^>]*>', ' ', 'g')),
+                    'manual', coalesce(s->>'execution_type', '1') = '1'
+                ) ORDER BY n), '[]'::jsonb)
+                FROM jsonb_array_elements(steps) WITH ORDINALITY AS t(s, n)
+            ),
+            preconditions = btrim(regexp_replace(preconditions, '<[^>]*>', ' ', 'g')),
+            content_hash = NULL
+        WHERE jsonb_typeof(steps) = 'array'
+    """)
+    op.execute("""
+        UPDATE test_cases SET
+            preconditions = btrim(regexp_replace(preconditions, '<[^>]*>', ' ', 'g')),
+            content_hash = NULL
+        WHERE steps IS NULL AND preconditions LIKE '%<%'
+    """)
+    op.create_index(
+        'ix_test_cases_steps', 'test_cases', ['steps'],
+        postgresql_using='gin', postgresql_ops={'steps': 'jsonb_path_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_cases_steps', table_name='test_cases')
+    op.alter_column('test_cases', 'steps', type_=sa.Text(), postgresql_using='steps::text')
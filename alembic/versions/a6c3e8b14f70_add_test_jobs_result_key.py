@@ -0,0 +1,33 @@
+"""add test_jobs.result_key for result reuse
+
+Revision ID: a6c3e8b14f70
+Revises: f2a7c91d5e63
+Create Date: 2026-10-17 22:48:12.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c3e8b14f70'
+down_revision: Union[str, Sequence[str], None] = 'f2a7c91d5e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_jobs', sa.Column('result_key', sa.String(length=64), nullable=True))
+    op.create_index(
+        'ix_test_jobs_result_key', 'test_jobs', ['result_key', 'finished_at'], unique=False,
+        postgresql_where=sa.text("openqa_status = 'done' AND result_key IS NOT NULL")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_jobs_result_key', table_name='test_jobs')
+    op.drop_column('test_jobs', 'result_key')
@@ -0,0 +1,33 @@
+"""add test_jobs.launch_id: cells of one matrix launch of a case
+
+Revision ID: b7e2c4a91d35
+Revises: f6b1d8e3c927
+Create Date: 2026-10-18 09:12:44.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c4a91d35'
+down_revision: Union[str, Sequence[str], None] = 'f6b1d8e3c927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_jobs', sa.Column('launch_id', sa.String(length=32), nullable=True))
+    op.create_index(
+        'ix_test_jobs_launch', 'test_jobs', ['launch_id', 'testcase_id'], unique=False,
+        postgresql_where=sa.text("launch_id IS NOT NULL")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_jobs_launch', table_name='test_jobs')
+    op.drop_column('test_jobs', 'launch_id')
@@ -0,0 +1,60 @@
+"""add indexes for hot test_cases / test_jobs queries
+
+Revision ID: b81d4e6f0a27
+Revises: 7c5f2a9e1b38
+Create Date: 2026-10-17 20:05:43.918270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81d4e6f0a27'
+down_revision: Union[str, Sequence[str], None] = '7c5f2a9e1b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # testcase_number уже уникален (test_cases_testcase_number_key), openqa_job_id - ix_test_jobs_openqa_job_id;
+    # ix_test_cases_id дублировал первичный ключ
+    op.drop_index('ix_test_cases_id', table_name='test_cases')
+    op.create_index('ix_test_cases_status_id', 'test_cases', ['status', 'id'])
+    op.create_index('ix_test_jobs_testcase_id', 'test_jobs', ['testcase_id', 'id'])
+    op.create_index(
+        'ix_test_jobs_active', 'test_jobs', ['next_check_at'],
+        postgresql_where=sa.text(
+            "openqa_job_id IS NOT NULL "
+            "AND (openqa_status IS NULL OR openqa_status NOT IN ('done', 'cancelled'))"
+        )
+    )
+    op.create_index(
+        'ix_test_jobs_done_duration', 'test_jobs', ['testcase_id'],
+        postgresql_include=['started_at', 'finished_at'],
+        postgresql_where=sa.text("openqa_status = 'done'")
+    )
+    # unreported_jobs сортирует по id - по next_report_at планировщик уходил в test_jobs_pkey
+    op.drop_index('ix_test_jobs_unreported', table_name='test_jobs')
+    op.create_index(
+        'ix_test_jobs_unreported', 'test_jobs', ['id'],
+        postgresql_include=['next_report_at', 'report_attempts'],
+        postgresql_where=sa.text("openqa_status = 'done' AND reported_at IS NULL")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_jobs_unreported', table_name='test_jobs')
+    op.create_index(
+        'ix_test_jobs_unreported', 'test_jobs', ['next_report_at'],
+        postgresql_where=sa.text("openqa_status = 'done' AND reported_at IS NULL")
+    )
+    op.drop_index('ix_test_jobs_done_duration', table_name='test_jobs')
+    op.drop_index('ix_test_jobs_active', table_name='test_jobs')
+    op.drop_index('ix_test_jobs_testcase_id', table_name='test_jobs')
+    op.drop_index('ix_test_cases_status_id', table_name='test_cases')
+    op.create_index('ix_test_cases_id', 'test_cases', ['id'], unique=False)
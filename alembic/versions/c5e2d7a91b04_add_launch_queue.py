@@ -0,0 +1,43 @@
+"""add launch_queue
+
+Revision ID: c5e2d7a91b04
+Revises: a6c3e8b14f70
+Create Date: 2026-10-17 23:36:40.218113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e2d7a91b04'
+down_revision: Union[str, Sequence[str], None] = 'a6c3e8b14f70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('launch_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('testcase_id', sa.Integer(), nullable=False),
+    sa.Column('test_suite_id', sa.Integer(), nullable=True),
+    sa.Column('priority', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('machine', sa.String(length=50), nullable=False),
+    sa.Column('build', sa.String(length=100), nullable=True),
+    sa.Column('reuse', sa.String(length=10), server_default='link', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['testcase_id'], ['test_cases.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('testcase_id')
+    )
+    op.create_index('ix_launch_queue_fair', 'launch_queue', ['priority', 'test_suite_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_launch_queue_fair', table_name='launch_queue')
+    op.drop_table('launch_queue')
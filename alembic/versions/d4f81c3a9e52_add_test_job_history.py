@@ -0,0 +1,57 @@
+"""add partitioned test_job_history and daily rollups
+
+Revision ID: d4f81c3a9e52
+Revises: b81d4e6f0a27
+Create Date: 2026-10-17 20:48:12.557301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f81c3a9e52'
+down_revision: Union[str, Sequence[str], None] = 'b81d4e6f0a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Секции по месяцам создаёт services/job_history.ensure_partitions
+    op.create_table('test_job_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('testcase_id', sa.Integer(), nullable=False),
+    sa.Column('openqa_job_id', sa.String(length=50), nullable=True),
+    sa.Column('openqa_status', sa.String(length=50), nullable=True),
+    sa.Column('openqa_result', sa.Text(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('reported_at', sa.DateTime(), nullable=True),
+    sa.Column('testlink_execution_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'started_at'),
+    postgresql_partition_by='RANGE (started_at)'
+    )
+    op.create_index('ix_test_job_history_testcase_id', 'test_job_history', ['testcase_id', 'started_at'])
+
+    op.create_table('test_job_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('testcase_id', sa.Integer(), nullable=False),
+    sa.Column('runs', sa.Integer(), nullable=False),
+    sa.Column('passed', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('duration_p50', sa.Float(), nullable=True),
+    sa.Column('duration_p95', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('day', 'testcase_id')
+    )
+    op.create_index('ix_test_job_daily_stats_testcase_id', 'test_job_daily_stats', ['testcase_id', 'day'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_job_daily_stats_testcase_id', table_name='test_job_daily_stats')
+    op.drop_table('test_job_daily_stats')
+    op.drop_index('ix_test_job_history_testcase_id', table_name='test_job_history')
+    op.drop_table('test_job_history')
@@ -0,0 +1,30 @@
+"""add test_jobs adaptive poll schedule
+
+Revision ID: e3a9b6d20f14
+Revises: 9d41f7a3c2e6
+Create Date: 2026-10-17 12:21:05.664190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9b6d20f14'
+down_revision: Union[str, Sequence[str], None] = '9d41f7a3c2e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('test_jobs', sa.Column('next_check_at', sa.DateTime(), nullable=True))
+    op.add_column('test_jobs', sa.Column('check_interval', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('test_jobs', 'check_interval')
+    op.drop_column('test_jobs', 'next_check_at')
@@ -0,0 +1,82 @@
+"""add test_runs, run_id on test_jobs and launch_queue
+
+Revision ID: e8b4f1c7a2d9
+Revises: c5e2d7a91b04
+Create Date: 2026-10-17 23:58:06.741390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b4f1c7a2d9'
+down_revision: Union[str, Sequence[str], None] = 'c5e2d7a91b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('test_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=True),
+    sa.Column('testplan_id', sa.Integer(), nullable=True),
+    sa.Column('test_suite_id', sa.Integer(), nullable=True),
+    sa.Column('build', sa.String(length=100), nullable=True),
+    sa.Column('testlink_build', sa.String(length=100), nullable=True),
+    sa.Column('reuse', sa.String(length=10), server_default='link', nullable=False),
+    sa.Column('priority', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='starting', nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('total', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('launched', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('finished', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('passed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('failed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('other', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('errors', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('reported', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('reported_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_test_runs_open', 'test_runs', ['status'], unique=False,
+                    postgresql_where=sa.text("status IN ('running', 'completed')"))
+
+    op.add_column('test_jobs', sa.Column('run_id', sa.Integer(), nullable=True))
+    op.add_column('test_jobs', sa.Column('source_job_id', sa.String(length=50), nullable=True))
+    op.create_foreign_key('test_jobs_run_id_fkey', 'test_jobs', 'test_runs', ['run_id'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_test_jobs_run_id', 'test_jobs', ['run_id', 'id'], unique=False,
+                    postgresql_where=sa.text('run_id IS NOT NULL'))
+    # Очередь отчётов фильтрует по run_id - он нужен в индексе для index-only scan
+    op.drop_index('ix_test_jobs_unreported', table_name='test_jobs')
+    op.create_index('ix_test_jobs_unreported', 'test_jobs', ['id'], unique=False,
+                    postgresql_include=['next_report_at', 'report_attempts', 'run_id'],
+                    postgresql_where=sa.text("openqa_status = 'done' AND reported_at IS NULL"))
+
+    op.add_column('launch_queue', sa.Column('run_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('launch_queue_run_id_fkey', 'launch_queue', 'test_runs', ['run_id'], ['id'],
+                          ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('launch_queue_run_id_fkey', 'launch_queue', type_='foreignkey')
+    op.drop_column('launch_queue', 'run_id')
+
+    op.drop_index('ix_test_jobs_unreported', table_name='test_jobs')
+    op.create_index('ix_test_jobs_unreported', 'test_jobs', ['id'], unique=False,
+                    postgresql_include=['next_report_at', 'report_attempts'],
+                    postgresql_where=sa.text("openqa_status = 'done' AND reported_at IS NULL"))
+    op.drop_index('ix_test_jobs_run_id', table_name='test_jobs')
+    op.drop_constraint('test_jobs_run_id_fkey', 'test_jobs', type_='foreignkey')
+    op.drop_column('test_jobs', 'source_job_id')
+    op.drop_column('test_jobs', 'run_id')
+
+    op.drop_index('ix_test_runs_open', table_name='test_runs')
+    op.drop_table('test_runs')
@@ -0,0 +1,42 @@
+"""add test_matrices and test_jobs.settings
+
+Revision ID: f2a7c91d5e63
+Revises: d4f81c3a9e52
+Create Date: 2026-10-17 21:31:54.102846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c91d5e63'
+down_revision: Union[str, Sequence[str], None] = 'd4f81c3a9e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('test_matrices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('test_suite_id', sa.Integer(), nullable=True),
+    sa.Column('testcase_id', sa.Integer(), nullable=True),
+    sa.Column('axes', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['testcase_id'], ['test_cases.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('test_suite_id'),
+    sa.UniqueConstraint('testcase_id')
+    )
+    op.add_column('test_jobs', sa.Column('settings', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('test_jobs', 'settings')
+    op.drop_table('test_matrices')
@@ -0,0 +1,48 @@
+"""test_cases full-text search vector (name, steps, preconditions) and trigram index on name
+
+Revision ID: f6b1d8e3c927
+Revises: a3d7e9b2c415
+Create Date: 2026-10-18 03:41:09.517302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b1d8e3c927'
+down_revision: Union[str, Sequence[str], None] = 'a3d7e9b2c415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# То же выражение, что models.TestCase.search_vector
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(steps, '[]'::jsonb)), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(preconditions, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # init.sql включает pg_trgm только при первом создании БД - для старых баз включаем здесь
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Вычисляемая колонка пересчитывается самим PostgreSQL при INSERT/UPDATE (перезапись таблицы)
+    op.add_column('test_cases', sa.Column(
+        'search_vector', TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True)
+    ))
+    op.create_index('ix_test_cases_search_vector', 'test_cases', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_test_cases_name_trgm', 'test_cases', ['name'],
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_cases_name_trgm', table_name='test_cases')
+    op.drop_index('ix_test_cases_search_vector', table_name='test_cases')
+    op.drop_column('test_cases', 'search_vector')
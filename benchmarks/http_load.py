@@ -0,0 +1,100 @@
+"""Нагрузочный тест HTTP-эндпоинтов: N параллельных клиентов опрашивают пути в течение T секунд.
+
+    python -m benchmarks.http_load --url http://localhost:8000 --concurrency 50 --duration 20 \\
+        --path /api/v1/dashboard --path /health --save benchmarks/results/http_load.json
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+
+import requests
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_load(url: str, path: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.get(f"{url}{path}", timeout=30)
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "duration": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def save_results(path: str, label: str, results: List[Dict[str, Any]]):
+    """Дописывает прогон в JSON-файл, чтобы сравнивать с предыдущими"""
+    try:
+        with open(path) as f:
+            history = json.load(f)
+    except FileNotFoundError:
+        history = []
+    history.append({"label": label, "timestamp": datetime.utcnow().isoformat(), "results": results})
+    with open(path, "w") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP-эндпоинтов")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--save")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.paths or ["/api/v1/dashboard"]:
+        result = run_load(args.url, path, args.concurrency, args.duration)
+        print(f"{path}: {result['rps']} req/s, p50 {result['p50_ms']} ms, "
+              f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, ошибок {result['errors']}")
+        results.append(result)
+
+    if args.save:
+        save_results(args.save, args.label, results)
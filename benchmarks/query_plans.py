@@ -0,0 +1,175 @@
+"""Планы горячих запросов: засевает БД до N jobs и проверяет через EXPLAIN, что каждый
+запрос идёт по своему индексу (Index Scan / Index Only Scan / Bitmap Index Scan).
+
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans --jobs 1000000 \\
+        --save benchmarks/results/query_plans.json
+
+Пишет данные в указанную БД (bench-* jobs и кейсы) - запускать только на тестовой базе.
+Код выхода 1, если хотя бы один запрос не попал в ожидаемый индекс.
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Iterator
+
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.engine import Connection
+
+from src.app.models import TestCase, TestCaseStatus, TestJob
+from src.app.services.job_poller import FINAL_STATES
+from src.app.services.testcase_search import text_search_query, fuzzy_name_query
+from .http_load import save_results
+
+INDEX_NODES = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+
+def seed(conn: Connection, jobs: int, cases: int):
+    """Досевает test_cases и test_jobs до заданного размера одним INSERT ... SELECT на таблицу"""
+    have_cases = conn.scalar(select(func.count()).select_from(TestCase))
+    if have_cases < cases:
+        conn.execute(text("""
+            INSERT INTO test_cases (testcase_number, name, test_suite_id, status, created_at, updated_at)
+            SELECT n, 'bench case ' || n, n % 50,
+                   (ARRAY['PENDING','RUNNING','PASSED','FAILED','BLOCKED'])[1 + n % 5]::testcasestatus,
+                   now(), now()
+            FROM generate_series(
+                (SELECT coalesce(max(testcase_number), 0) + 1 FROM test_cases),
+                (SELECT coalesce(max(testcase_number), 0) FROM test_cases) + :count
+            ) AS n
+        """), {"count": cases - have_cases})
+
+    have_jobs = conn.scalar(select(func.count()).select_from(TestJob))
+    if have_jobs < jobs:
+        # 95% завершены (из них 1% ещё не отправлены в TestLink), 5% активны
+        conn.execute(text("""
+            WITH ids AS (SELECT array_agg(id) AS a FROM test_cases)
+            INSERT INTO test_jobs (testcase_id, openqa_job_id, openqa_status, openqa_result,
+                                   started_at, finished_at, next_check_at, reported_at)
+            SELECT ids.a[1 + g % cardinality(ids.a)], 'bench-' || g,
+                   CASE WHEN g % 20 = 0 THEN 'running' ELSE 'done' END,
+                   CASE WHEN g % 20 = 0 THEN 'none' WHEN g % 7 = 0 THEN 'failed' ELSE 'passed' END,
+                   now() - make_interval(secs => g % 86400 + 1800),
+                   CASE WHEN g % 20 = 0 THEN NULL ELSE now() - make_interval(secs => g % 86400) END,
+                   CASE WHEN g % 20 = 0 THEN now() + make_interval(secs => g % 3600 - 1800) END,
+                   CASE WHEN g % 20 = 0 OR g % 100 = 1 THEN NULL ELSE now() END
+            FROM ids, generate_series(
+                (SELECT coalesce(max(id), 0) + 1 FROM test_jobs),
+                (SELECT coalesce(max(id), 0) FROM test_jobs) + :count
+            ) AS g
+        """), {"count": jobs - have_jobs})
+    conn.execute(text("ANALYZE test_cases"))
+    conn.execute(text("ANALYZE test_jobs"))
+
+
+def hot_queries(conn: Connection) -> Dict[str, Any]:
+    """Запросы приложения (те же фильтры и сортировки) → ожидаемый индекс"""
+    now = datetime.utcnow()
+    case = conn.execute(select(TestCase.id, TestCase.testcase_number).order_by(TestCase.id.desc()).limit(1)).one()
+    job_id = conn.scalar(select(TestJob.openqa_job_id).order_by(TestJob.id.desc()).limit(1))
+    active = (TestJob.openqa_status.is_(None)) | (TestJob.openqa_status.notin_(FINAL_STATES))
+
+    return {
+        # api/testlink.get_test_case, api/openqa.run_test_case
+        "case_by_number": (
+            select(TestCase).where(TestCase.testcase_number == case.testcase_number),
+            "test_cases_testcase_number_key"
+        ),
+        # testcase_listing.keyset_page со status
+        "cases_by_status": (
+            select(TestCase.id, TestCase.name).where(
+                TestCase.id > 0, TestCase.status == TestCaseStatus.PENDING
+            ).order_by(TestCase.id).limit(100),
+            "ix_test_cases_status_id"
+        ),
+        # testcase_search.search_cases
+        "case_text_search": (text_search_query("bench case", 20), "ix_test_cases_search_vector"),
+        "case_name_fuzzy": (fuzzy_name_query("bnech", 20), "ix_test_cases_name_trgm"),
+        # api/openqa.get_job_status, job_poller.apply_job_states
+        "job_by_openqa_id": (
+            select(TestJob).where(TestJob.openqa_job_id == job_id),
+            "ix_test_jobs_openqa_job_id"
+        ),
+        # job_poller.poll_due_jobs
+        "due_jobs": (
+            select(TestJob.id, TestJob.openqa_job_id).where(
+                TestJob.openqa_job_id.isnot(None), active,
+                (TestJob.next_check_at.is_(None)) | (TestJob.next_check_at <= now),
+            ),
+            "ix_test_jobs_active"
+        ),
+        # job_poller.expected_durations
+        "expected_durations": (
+            select(TestJob.testcase_id, func.avg(func.extract("epoch", TestJob.finished_at - TestJob.started_at)))
+            .where(
+                TestJob.testcase_id.in_([case.id, case.id - 1, case.id - 2]),
+                TestJob.openqa_status == "done",
+                TestJob.started_at.isnot(None),
+                TestJob.finished_at.isnot(None),
+            ).group_by(TestJob.testcase_id),
+            "ix_test_jobs_done_duration"
+        ),
+        # result_reporter.unreported_jobs
+        "unreported_jobs": (
+            select(TestJob.id).where(
+                TestJob.openqa_status == "done",
+                TestJob.reported_at.is_(None),
+                TestJob.report_attempts < 8,
+                (TestJob.next_report_at.is_(None)) | (TestJob.next_report_at <= now),
+                TestJob.run_id.is_(None),
+            ).order_by(TestJob.id).limit(1000),
+            "ix_test_jobs_unreported"
+        ),
+    }
+
+
+def _nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def explain(conn: Connection, statement) -> Dict[str, Any]:
+    sql = str(statement.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    return conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()[0]
+
+
+def check_plans(conn: Connection) -> List[Dict[str, Any]]:
+    results = []
+    for name, (statement, index) in hot_queries(conn).items():
+        plan = explain(conn, statement)
+        used = sorted({
+            f"{node['Node Type']} {node['Index Name']}"
+            for node in _nodes(plan["Plan"]) if node["Node Type"] in INDEX_NODES
+        })
+        results.append({
+            "query": name,
+            "expected_index": index,
+            "indexes": used,
+            "ok": any(u.endswith(f" {index}") for u in used),
+            "execution_ms": round(plan["Execution Time"], 3),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--cases", type=int, default=20_000)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--save")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    with engine.begin() as conn:
+        seed(conn, args.jobs, args.cases)
+    with engine.connect() as conn:
+        results = check_plans(conn)
+
+    for r in results:
+        mark = "✅" if r["ok"] else "❌"
+        print(f"{mark} {r['query']}: {r['execution_ms']} ms, {', '.join(r['indexes']) or 'Seq Scan'}")
+
+    if args.save:
+        save_results(args.save, args.label, results)
+    raise SystemExit(0 if all(r["ok"] for r in results) else 1)
@@ -0,0 +1,171 @@
+"""Сквозная пропускная способность на локальных заглушках TestLink и OpenQA (без живых серверов):
+синхронизация сьюта (кейсов/с), запуск прогона (jobs/с), опрос (мс на 1000 jobs), отчёт (результатов/с).
+
+    DATABASE_URL=postgresql://... python -m benchmarks.throughput --sizes 1000,10000,100000 \\
+        --save benchmarks/results/throughput.json
+
+Задержки и ошибки серверов: --testlink-latency, --openqa-latency, --openqa-failure-rate.
+Пишет в указанную БД (кейсы с номерами от --first-number, их jobs и прогоны; в конце удаляются) -
+запускать только на тестовой базе.
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+
+from sqlalchemy import delete, select
+
+from src.app.database import SessionLocal
+from src.app.models import LaunchQueueItem, TestCase, TestJob, TestRun
+from src.app.services import launch_queue, openqa_client
+from src.app.services.job_poller import handle_job_events
+from src.app.services.result_reporter import bulk_report_results
+from src.app.services.test_runs import create_run, start_run
+from src.app.services.testlink_sync import TESTLINK_PREFIX, sync_testsuite
+from src.app.simulators.openqa_stub import OpenQAStub
+from src.app.simulators.testlink_stub import TestLinkStub
+from .http_load import save_results
+
+RUN_NAME = "throughput"
+
+
+@contextmanager
+def timer() -> Iterator[Dict[str, float]]:
+    elapsed = {}
+    started = time.perf_counter()
+    yield elapsed
+    elapsed["seconds"] = time.perf_counter() - started
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds else 0.0
+
+
+def _per_1k_ms(seconds: float, count: int) -> float:
+    return round(seconds * 1000 * 1000 / count, 1) if count else 0.0
+
+
+def use_stubs(testlink: TestLinkStub, openqa: OpenQAStub):
+    """Синхронизация, отчёты и клиент OpenQA этого процесса - на заглушки"""
+    os.environ["TESTLINK_API_PYTHON_SERVER_URL"] = os.environ["TESTLINK_URL"] = testlink.url
+    os.environ["TESTLINK_API_PYTHON_DEVKEY"] = os.environ["TESTLINK_DEVKEY"] = "benchmark"
+    openqa_client._client = openqa_client.OpenQAClient(base_url=openqa.url)
+    openqa_client._client_pid = os.getpid()
+
+
+def bench_size(db, testlink: TestLinkStub, openqa: OpenQAStub, size: int, job_failure_rate: float) -> Dict[str, Any]:
+    suite_id = testlink.add_suite(size)
+    result: Dict[str, Any] = {"cases": size}
+
+    # 1. Синхронизация: первая (вставка) и повторная (без изменений)
+    requests_before = testlink.requests_count
+    with timer() as first:
+        synced = sync_testsuite(db, suite_id)
+    with timer() as again:
+        sync_testsuite(db, suite_id)
+    result.update(
+        sync_cases_per_s=_rate(synced["total_cases"], first["seconds"]),
+        sync_unchanged_cases_per_s=_rate(size, again["seconds"]),
+        sync_testlink_requests=testlink.requests_count - requests_before,
+    )
+
+    # 2. Запуск прогона сьюта: очередь запусков → диспетчер → POST /jobs
+    launch_queue.OPENQA_MAX_ACTIVE_JOBS = sum(launch_queue.active_jobs(db).values()) + size
+    run = create_run(db, test_suite_id=suite_id, build=f"bench-{size}-{int(time.time())}", reuse="never",
+                     name=f"{RUN_NAME} {size}")
+    requests_before = openqa.requests_count
+    with timer() as launch:
+        start_run(db, run.id)
+    db.refresh(run)
+    result.update(
+        launch_jobs_per_s=_rate(run.launched, launch["seconds"]),
+        launch_failed=run.total - run.launched,
+        launch_openqa_requests=openqa.requests_count - requests_before,
+    )
+
+    # 3. Опрос: цикл без изменений, затем цикл, в котором завершились все jobs
+    job_ids = db.scalars(select(TestJob.openqa_job_id).where(TestJob.run_id == run.id)).all()
+    requests_before = openqa.requests_count
+    with timer() as idle:
+        handle_job_events(db, job_ids)
+    for n, job_id in enumerate(job_ids):
+        openqa.finish_job(int(job_id), "failed" if n < len(job_ids) * job_failure_rate else "passed")
+    with timer() as changed:
+        handle_job_events(db, job_ids)
+    db.refresh(run)
+    result.update(
+        poll_idle_ms_per_1k=_per_1k_ms(idle["seconds"], len(job_ids)),
+        poll_done_ms_per_1k=_per_1k_ms(changed["seconds"], len(job_ids)),
+        poll_openqa_requests=openqa.requests_count - requests_before,
+        run_status=run.status,
+    )
+
+    # 4. Отчёт прогона в TestLink (system.multicall пачками)
+    requests_before = testlink.requests_count
+    with timer() as report:
+        reported = bulk_report_results(db)
+    db.refresh(run)
+    result.update(
+        report_results_per_s=_rate(run.reported, report["seconds"]),
+        report_failed=reported["failed"],
+        report_testlink_requests=testlink.requests_count - requests_before,
+    )
+    return result
+
+
+def cleanup(db, first_number: int):
+    """Удаляет кейсы бенчмарка, их jobs, очередь и прогоны"""
+    case_ids = select(TestCase.id).where(TestCase.testcase_number >= first_number).scalar_subquery()
+    db.execute(delete(LaunchQueueItem).where(LaunchQueueItem.testcase_id.in_(case_ids)))
+    db.execute(delete(TestJob).where(TestJob.testcase_id.in_(case_ids)))
+    db.execute(delete(TestRun).where(TestRun.name.like(f"{RUN_NAME} %")))
+    db.execute(delete(TestCase).where(TestCase.testcase_number >= first_number))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозная пропускная способность на заглушках TestLink/OpenQA")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--testlink-latency", type=float, default=0.0, help="секунд на XML-RPC запрос")
+    parser.add_argument("--openqa-latency", type=float, default=0.0, help="секунд на REST запрос")
+    parser.add_argument("--openqa-failure-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--job-failure-rate", type=float, default=0.1, help="доля jobs с result=failed")
+    parser.add_argument("--first-number", type=int, default=900_000_000,
+                        help="номера и ID кейсов заглушки - вне диапазона данных в базе")
+    parser.add_argument("--keep", action="store_true", help="не удалять данные бенчмарка")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--save")
+    args = parser.parse_args()
+
+    testlink = TestLinkStub(prefix=TESTLINK_PREFIX, latency=args.testlink_latency,
+                            first_id=args.first_number, first_number=args.first_number)
+    openqa = OpenQAStub(workers=64, latency=args.openqa_latency, failure_rate=args.openqa_failure_rate,
+                        first_id=args.first_number)
+    db = SessionLocal()
+    results = []
+    with testlink, openqa:
+        use_stubs(testlink, openqa)
+        # Очередь отчётов без прогонов разбирается заранее, чтобы не попасть в замер
+        bulk_report_results(db)
+        try:
+            for size in (int(s) for s in args.sizes.split(",")):
+                result = bench_size(db, testlink, openqa, size, args.job_failure_rate)
+                print(f"📏 {size} кейсов: синхронизация {result['sync_cases_per_s']}/с "
+                      f"(повторно {result['sync_unchanged_cases_per_s']}/с), запуск {result['launch_jobs_per_s']}/с, "
+                      f"опрос {result['poll_idle_ms_per_1k']}/{result['poll_done_ms_per_1k']} мс на 1000, "
+                      f"отчёт {result['report_results_per_s']}/с")
+                results.append(result)
+        finally:
+            if not args.keep:
+                db.rollback()
+                cleanup(db, args.first_number)
+            db.close()
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        save_results(args.save, args.label, results)
+
+
+if __name__ == "__main__":
+    main()
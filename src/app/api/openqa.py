@@ -1,83 +1,125 @@
-import requests
+import logging
 import os
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
 
-from ..schemas import JobResponse, TestJobResponse
-from ..database import get_db_session
-from ..services.openqa_runner import create_openqa_job, update_job_status
-from ..models import TestCase, TestJob, TestCaseStatus
-from ..models import TestJob
+from ..schemas import JobResponse, TestJobResponse, MatrixAxes
+from ..cache import TTLCache
+from ..database import get_db_session, get_async_db, AsyncSessionLocal
+from ..services.launch_queue import PRIORITY_INTERACTIVE, enqueue, dispatch, queue_status
+from ..services.openqa_runner import expand_matrix
+from ..services.job_poller import FINAL_STATES, fetch_job_states, apply_job_states
+from ..services.live_status import sse_stream, job_event, case_event
+from ..services.health import monitor as health_monitor
+from ..models import TestCase, TestJob, TestMatrix
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="", tags=["OpenQA"])
 
-OPENQA_URL = os.getenv("OPENQA_URL", "http://openqa/api/v1")
+# Не чаще раза в столько секунд на job спрашивать OpenQA из GET /jobs/{id}, сколько бы клиентов ни опрашивали
+JOB_STATUS_REFRESH_TTL = float(os.getenv("OPENQA_JOB_STATUS_REFRESH_TTL", "10"))
+job_refresh_cache = TTLCache(JOB_STATUS_REFRESH_TTL, max_size=10000)
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 @router.post("/run/{testlink_id}", response_model=JobResponse, status_code=201)
 def run_test_case(
-        testlink_id: str,
-        background_tasks: BackgroundTasks,
+        testlink_id: int,
+        response: Response,
+        build: Optional[str] = None,
+        reuse: Literal["link", "clone", "never"] = "link",
         db: Session = Depends(get_db_session)
 ):
-    """Запуск тест-кейса на OpenQA"""
+    """Запуск тест-кейса на OpenQA через очередь с приоритетом выше массовых запусков.
+
+    Есть свободное место - job создаётся сразу (201), иначе кейс ждёт в очереди (202).
+    В запросе отдаётся только этот кейс, остальную очередь разбирает диспетчер Celery.
+    С BUILD готовый результат той же сборки переиспользуется.
+    """
     # Найти тест-кейс
-    testcase = db.query(TestCase).filter(TestCase.testlink_id == testlink_id).first()
+    testcase = db.query(TestCase).filter(TestCase.testcase_number == testlink_id).first()
     if not testcase:
         raise HTTPException(status_code=404, detail="Test case not found")
 
-    # Создать OpenQA job
-    job_id = create_openqa_job(testcase.name, testcase_id=testcase.id)
-
-    # Обновить статус тест-кейса
-    testcase.openqa_job_id = job_id
-    testcase.status = TestCaseStatus.RUNNING
-    db.commit()
-
-    # Создать запись о job
-    test_job = TestJob(
-        testcase_id=testcase.id,
-        openqa_job_id=job_id
-    )
-    db.add(test_job)
-    db.commit()
-
-    # Фоновое обновление статуса
-    background_tasks.add_task(update_job_status, job_id, testcase.id, db)
+    enqueue(db, [testcase], PRIORITY_INTERACTIVE, build, reuse)
+    result = next((r for r in dispatch(db, testcase_ids=[testcase.id])["results"]
+                   if r["testcase_number"] == testlink_id), None)
+    if result is None:
+        response.status_code = 202
+        return JobResponse(status="queued", testcase_id=testcase.id)
+    if "error" in result:
+        raise HTTPException(status_code=502, detail=f"OpenQA error: {result['error']} (запуск повторится из очереди)")
 
     return JobResponse(
-        status="created",
-        openqa_job_id=job_id,
+        status=result["status"],
+        openqa_job_id=result["openqa_job_id"],
         testcase_id=testcase.id
     )
 
 
+@router.get("/queue")
+def get_launch_queue(db: Session = Depends(get_db_session)):
+    """Очередь запусков: размер по приоритетам, лимит и активные jobs по машинам"""
+    return queue_status(db)
+
+
 @router.get("/jobs/{job_id}", response_model=TestJobResponse)
 def get_job_status(job_id: str, db: Session = Depends(get_db_session)):
-    """Получить статус OpenQA job"""
+    """Получить статус OpenQA job.
+
+    OpenQA спрашивается не чаще раза в OPENQA_JOB_STATUS_REFRESH_TTL секунд на job и только
+    для незавершённых; запись и публикация перехода - как у поллера. Следить за статусом
+    лучше через /jobs/{job_id}/events.
+    """
     job = db.query(TestJob).filter(TestJob.openqa_job_id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    # Обновить статус из OpenQA
-    openqa_status = requests.get(
-        f"{OPENQA_URL}/jobs/{job_id}",
-        verify=False
-    ).json()
-
-    job.openqa_status = openqa_status.get("state")
-    job.openqa_result = openqa_status.get("result")
-    job.started_at = openqa_status.get("t_started")
-    job.finished_at = openqa_status.get("t_finished")
-    db.commit()
+    if job.openqa_status not in FINAL_STATES and job_refresh_cache.get(job_id) is None:
+        job_refresh_cache.set(job_id, True)
+        try:
+            apply_job_states(db, fetch_job_states([job_id]))
+            db.refresh(job)
+        except Exception as e:
+            logger.warning("OpenQA refresh of job %s failed: %s", job_id, e)
+            db.rollback()
 
     return job
 
 
+def _job_snapshot(job) -> dict:
+    return job_event(job.openqa_job_id, job.testcase_id, job.openqa_status, job.openqa_result,
+                     run_id=job.run_id, started_at=job.started_at, finished_at=job.finished_at)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(job_id: str):
+    """Переходы статуса job (SSE) до финального состояния; OpenQA не опрашивается.
+
+    Сессия БД - только на чтение состояния, соединение не держится всё время потока.
+    """
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            job = await session.scalar(select(TestJob).where(TestJob.openqa_job_id == job_id))
+            return _job_snapshot(job) if job else None
+
+    if await snapshot() is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        sse_stream(f"job:{job_id}", snapshot, lambda event: event.get("state") in FINAL_STATES),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+
 @router.get("/cases/{testcase_number}/status")
-def get_testcase_status(testcase_number: int, db: Session = Depends(get_db_session)):
-    testcase = db.query(TestCase).filter(TestCase.testcase_number == testcase_number).first()
+async def get_testcase_status(testcase_number: int, db: AsyncSession = Depends(get_async_db)):
+    testcase = await db.scalar(select(TestCase).where(TestCase.testcase_number == testcase_number))
     if not testcase:
         raise HTTPException(status_code=404, detail="Test case not found")
 
@@ -89,11 +131,76 @@ def get_testcase_status(testcase_number: int, db: Session = Depends(get_db_sessi
     }
 
 
+@router.get("/cases/{testcase_number}/events")
+async def stream_testcase_status(testcase_number: int):
+    """Переходы статуса кейса и его jobs (SSE); поток не закрывается - у кейса будут новые запуски"""
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            testcase = await session.scalar(select(TestCase).where(TestCase.testcase_number == testcase_number))
+            if testcase is None:
+                return None
+            return {**case_event(testcase.id, testcase.status), "testcase_number": testcase.testcase_number,
+                    "openqa_job_id": testcase.openqa_job_id}
+
+    current = await snapshot()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Test case not found")
+    return StreamingResponse(
+        sse_stream(f"case:{current['testcase_id']}", snapshot, lambda event: False),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+
 @router.get("/health")
-def openqa_health():
-    """Проверка доступности OpenQA"""
-    try:
-        resp = requests.get(f"{OPENQA_URL}/jobs", verify=False, timeout=5)
-        return {"status": "healthy", "jobs_count": len(resp.json()["jobs"])}
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"OpenQA unavailable: {str(e)}")
+async def openqa_health():
+    """Доступность OpenQA по последней фоновой пробе (GET /jobs?limit=1, см. services.health)"""
+    await health_monitor.ensure_fresh()
+    openqa = health_monitor.component("openqa")
+    if not openqa["ok"]:
+        raise HTTPException(status_code=503, detail=f"OpenQA unavailable: {openqa.get('error')}")
+    return {"status": "healthy", **openqa}
+
+
+def _save_matrix(db: Session, axes: MatrixAxes, **owner) -> dict:
+    matrix = db.query(TestMatrix).filter_by(**owner).first() or TestMatrix(**owner)
+    matrix.axes = axes.model_dump(exclude_unset=True)
+    db.add(matrix)
+    db.commit()
+    return {**owner, "axes": matrix.axes, "cells": len(expand_matrix(matrix.axes))}
+
+
+@router.put("/matrix/suite/{test_suite_id}")
+def set_suite_matrix(test_suite_id: int, axes: MatrixAxes, db: Session = Depends(get_db_session)):
+    """Оси матрицы для всех кейсов сьюта"""
+    return _save_matrix(db, axes, test_suite_id=test_suite_id)
+
+
+@router.put("/matrix/case/{testcase_number}")
+def set_case_matrix(testcase_number: int, axes: MatrixAxes, db: Session = Depends(get_db_session)):
+    """Оси матрицы отдельного кейса (заданные оси заменяют оси сьюта)"""
+    testcase = db.query(TestCase).filter(TestCase.testcase_number == testcase_number).first()
+    if not testcase:
+        raise HTTPException(status_code=404, detail="Test case not found")
+    return _save_matrix(db, axes, testcase_id=testcase.id)
+
+
+@router.get("/matrix/case/{testcase_number}")
+async def get_case_matrix(testcase_number: int, db: AsyncSession = Depends(get_async_db)):
+    """Итоговые ячейки матрицы кейса"""
+    testcase = await db.scalar(select(TestCase).where(TestCase.testcase_number == testcase_number))
+    if not testcase:
+        raise HTTPException(status_code=404, detail="Test case not found")
+    case_axes = await db.scalar(select(TestMatrix.axes).where(TestMatrix.testcase_id == testcase.id))
+    suite_axes = await db.scalar(select(TestMatrix.axes).where(TestMatrix.test_suite_id == testcase.test_suite_id))
+    axes = {**(suite_axes or {}), **(case_axes or {})} or None
+    return {"testcase_number": testcase_number, "axes": axes, "cells": expand_matrix(axes)}
+
+
+@router.post("/matrix/run", status_code=202)
+def run_matrix(test_suite_id: Optional[int] = None, build: Optional[str] = None,
+               reuse: Literal["link", "clone", "never"] = "link"):
+    """Полный прогон матрицы сьюта (или всех кейсов) пакетными POST /isos"""
+    from ..workers.celery_worker import launch_test_matrix
+
+    task = launch_test_matrix.delay(test_suite_id, build, reuse)
+    return {"task_id": task.id, "status": "sent"}
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ..schemas import TestRunCreate, TestRunResponse
+from ..database import get_db_session, AsyncSessionLocal
+from ..models import TestRun
+from ..services.test_runs import create_run, run_progress, run_event, RUN_REPORTED, RUN_ERROR
+from ..services.live_status import sse_stream
+from .openqa import SSE_HEADERS
+
+router = APIRouter(prefix="", tags=["Runs"])
+
+
+def _run_response(run: TestRun) -> TestRunResponse:
+    return TestRunResponse.model_validate({
+        **{column.name: getattr(run, column.name) for column in TestRun.__table__.columns},
+        **run_progress(run),
+    })
+
+
+@router.post("", response_model=TestRunResponse, status_code=202)
+def start_test_run(body: TestRunCreate, db: Session = Depends(get_db_session)):
+    """Прогон всех кейсов плана или сьюта; кейсы собираются и ставятся в очередь в Celery"""
+    from ..workers.celery_worker import start_test_run_task
+
+    run = create_run(db, **body.model_dump())
+    start_test_run_task.delay(run.id)
+    return _run_response(run)
+
+
+@router.get("", response_model=List[TestRunResponse])
+def list_test_runs(
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db_session)
+):
+    """Последние прогоны"""
+    query = db.query(TestRun)
+    if status:
+        query = query.filter(TestRun.status == status)
+    return [_run_response(run) for run in query.order_by(TestRun.id.desc()).limit(limit)]
+
+
+@router.get("/{run_id}", response_model=TestRunResponse)
+def get_test_run(run_id: int, db: Session = Depends(get_db_session)):
+    """Прогресс прогона - одна строка test_runs, без подсчёта по test_jobs"""
+    run = db.get(TestRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return _run_response(run)
+
+
+@router.get("/{run_id}/events")
+async def stream_test_run(run_id: int):
+    """Счётчики прогона (SSE) при каждом изменении, пока прогон не отправлен в TestLink"""
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            run = await session.get(TestRun, run_id)
+            return run_event(run) if run else None
+
+    if await snapshot() is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return StreamingResponse(
+        sse_stream(f"run:{run_id}", snapshot, lambda event: event.get("status") in (RUN_REPORTED, RUN_ERROR)),
+        media_type="text/event-stream", headers=SSE_HEADERS,
+    )
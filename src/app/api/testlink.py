@@ -1,39 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from ..services.testlink_sync import sync_testcases
-from ..schemas import SyncResponse, TestCaseResponse
-from ..database import get_db_session
+from ..services.testcase_listing import parse_fields, keyset_page, export_ndjson, export_csv, MAX_PAGE_SIZE
+from ..services.testcase_search import search_cases, MAX_SEARCH_LIMIT
+from ..schemas import SyncResponse, TestCaseResponse, TestCaseListItem, TestCaseSteps, TestCaseSearchHit, TestCaseStatus
+from ..database import get_db_session, get_async_db
 from ..models import TestCase
+from ..workers.celery_worker import bulk_testlink_sync
 
 router = APIRouter(prefix="", tags=["TestLink"])
 
 @router.post("/sync/{testcase_number}", response_model=SyncResponse, status_code=201)
 def sync_testlink(
     testcase_number: int,
+    incremental: bool = True,
     db: Session = Depends(get_db_session)
 ):
     try:
-        result = sync_testcases(db, testcase_number)  # 🔥 Передаём номер
+        result = sync_testcases(db, testcase_number, incremental=incremental)  # 🔥 Передаём номер
         return SyncResponse(
             status="success",
             synced_cases=result["synced_cases"],
-            total_cases=result["total_cases"]
+            total_cases=result["total_cases"],
+            inserted_cases=result["inserted_cases"],
+            updated_cases=result["updated_cases"],
+            unchanged_cases=result["unchanged_cases"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
-@router.get("/cases", response_model=List[TestCaseResponse])
-def get_test_cases(db: Session = Depends(get_db_session)):
-    cases = db.query(TestCase).all()
-    return cases
+@router.post("/sync/suite/{testsuite_id}", status_code=202)
+def sync_testlink_suite(testsuite_id: int, incremental: bool = True):
+    """Массовая синхронизация сьюта TestLink (со всеми вложенными сьютами)"""
+    task = bulk_testlink_sync.delay("suite", testsuite_id, incremental)
+    return {"task_id": task.id, "status": "sent"}
+
+
+@router.post("/sync/plan/{testplan_id}", status_code=202)
+def sync_testlink_plan(testplan_id: int, incremental: bool = True):
+    """Массовая синхронизация всех кейсов тест-плана TestLink"""
+    task = bulk_testlink_sync.delay("plan", testplan_id, incremental)
+    return {"task_id": task.id, "status": "sent"}
+
+
+@router.post("/sync/project/{prefix}", status_code=202)
+def sync_testlink_project(prefix: str, incremental: bool = True):
+    """Массовая синхронизация всего проекта TestLink по префиксу (например, repo-tests)"""
+    task = bulk_testlink_sync.delay("project", prefix, incremental)
+    return {"task_id": task.id, "status": "sent"}
+
+
+def _fields_or_400(fields: Optional[str]):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/cases", response_model=List[TestCaseListItem], response_model_exclude_unset=True)
+async def get_test_cases(
+    response: Response,
+    after_id: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[TestCaseStatus] = None,
+    fields: Optional[str] = None,
+    manual: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Страница кейсов по курсору id; следующий курсор - в заголовке X-Next-Cursor.
+
+    manual=true - кейсы, в которых есть ручные шаги (manual=false - полностью автоматические).
+    """
+    rows, next_cursor = await keyset_page(db, after_id, limit, status, _fields_or_400(fields), manual)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return rows
+
+
+@router.get("/cases/export")
+async def export_test_cases(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    status: Optional[TestCaseStatus] = None,
+    fields: Optional[str] = None
+):
+    """Выгрузка всех кейсов потоком (серверный курсор), без загрузки в память"""
+    columns = _fields_or_400(fields)
+    if format == "csv":
+        return StreamingResponse(
+            export_csv(status, columns), media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=testcases.csv"}
+        )
+    return StreamingResponse(export_ndjson(status, columns), media_type="application/x-ndjson")
+
+
+@router.get("/cases/search", response_model=List[TestCaseSearchHit])
+async def search_test_cases(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT),
+    status: Optional[TestCaseStatus] = None,
+    fuzzy: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Поиск кейсов для запуска: номер (123, repo-tests-123), слова из имени, шагов и предусловий
+    ("фраза", -исключение, or), при fuzzy - похожие имена (опечатки, части слов)
+    """
+    return await search_cases(db, q, limit, status, fuzzy)
+
 
 @router.get("/cases/{testcase_number}", response_model=TestCaseResponse)
-def get_test_case(testcase_number: int, db: Session = Depends(get_db_session)):
-    case = db.query(TestCase).filter(TestCase.testcase_number == testcase_number).first()
+async def get_test_case(testcase_number: int, db: AsyncSession = Depends(get_async_db)):
+    case = await db.scalar(select(TestCase).where(TestCase.testcase_number == testcase_number))
     if not case:
         raise HTTPException(status_code=404, detail="Test case not found")
     return case
 
 
+@router.get("/cases/{testcase_number}/steps", response_model=TestCaseSteps)
+async def get_test_case_steps(testcase_number: int, db: AsyncSession = Depends(get_async_db)):
+    """Предусловия и шаги кейса (текст без HTML) - отдельно от карточки, отложенные колонки"""
+    row = (await db.execute(
+        select(TestCase.testcase_number, TestCase.name, TestCase.preconditions, TestCase.steps)
+        .where(TestCase.testcase_number == testcase_number)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Test case not found")
+    return {**row._mapping, "steps": row.steps or []}
+
+
@@ -0,0 +1,50 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class TTLCache:
+    """Простой in-process кеш с TTL и явной инвалидацией.
+
+    max_size - для кешей с неограниченным числом ключей: при переполнении выбрасываются устаревшие.
+    """
+
+    def __init__(self, ttl: float, max_size: Optional[int] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                return None
+            return item[1]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            now = time.monotonic()
+            if self.max_size is not None and len(self._data) >= self.max_size:
+                self._data = {k: item for k, item in self._data.items() if now - item[0] <= self.ttl}
+            self._data[key] = (now, value)
+
+    def age(self, key: str) -> Optional[float]:
+        """Сколько секунд назад записано значение (None - нет значения)"""
+        with self._lock:
+            item = self._data.get(key)
+            return time.monotonic() - item[0] if item else None
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    async def get_or_load(self, key: str, loader: Callable) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = await loader()
+            self.set(key, value)
+        return value
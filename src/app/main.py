@@ -1,16 +1,29 @@
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
+import asyncio
 import os
-from typing import List
+import time
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from .database import SessionLocal, engine
-from .models import Base
+from . import tracing
+from .database import engine, get_async_db
+from .metrics import MetricsMiddleware, CONTENT_TYPE, render
+from .models import Base, TestCase, TestJobDailyStats
+from .services.dashboard_stats import get_dashboard_counts
+from .services.health import monitor as health_monitor
+from .services.live_status import hub as live_status_hub
+from .services.testcase_listing import keyset_page, MAX_PAGE_SIZE
 from .api.testlink import router as testlink_router
 from .api.openqa import router as openqa_router
-from .workers.celery_worker import celery_app, monitor_openqa_jobs, periodic_testlink_sync
+from .api.runs import router as runs_router
+from .workers.celery_worker import celery_app, periodic_testlink_sync
 from .schemas import (
-    TestCaseResponse, HealthCheck
+    TestCaseResponse, TestCaseStatus, HealthCheck
 )
 
 # Создание таблиц при старте
@@ -26,18 +39,17 @@ async def lifespan(app: FastAPI):
     print(f"🔗 TESTLINK_URL: {os.getenv('TESTLINK_URL', 'Not set')[:30]}...")
     print(f"🖥️  OPENQA_URL: {os.getenv('OPENQA_URL', 'Not set')[:30]}...")
 
-    # Celery ping
-    try:
-        inspect = celery_app.control.inspect()
-        workers = inspect.ping()
-        print(f"🐳 Celery workers: {len(workers) if workers else 0}")
-    except:
-        print("🐳 Celery not ready")
+    # Фоновые проверки БД / Redis / Celery / TestLink / OpenQA - /health отдаёт их результат
+    health_monitor.start()
+    # Подписка на живые статусы (Redis) - до первого SSE-клиента
+    live_status_hub.start()
 
     yield
 
     # Shutdown
     print("🛑 Graceful shutdown")
+    await health_monitor.stop()
+    await live_status_hub.stop()
     celery_app.control.shutdown()
 
 
@@ -57,19 +69,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Латентность по маршрутам (и span запроса при TRACING_ENABLED) - /metrics
+app.add_middleware(MetricsMiddleware)
+tracing.setup_tracing("api")
 
 # Подключаем роутеры
 app.include_router(testlink_router, prefix="/api/v1/testlink", tags=["TestLink"])
 app.include_router(openqa_router, prefix="/api/v1/openqa", tags=["OpenQA"])
-
-
-# Dependency для БД
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app.include_router(runs_router, prefix="/api/v1/runs", tags=["Runs"])
 
 
 ## 🏠 Root endpoints
@@ -83,64 +90,49 @@ async def root():
         "endpoints": {
             "testlink": "/api/v1/testlink/",
             "openqa": "/api/v1/openqa/",
-            "health": "/api/v1/health"
+            "health": "/health"
         }
     }
 
 
 @app.get("/health", tags=["Health"], response_model=HealthCheck)
-async def health_check(db: Session = Depends(get_db)):
-    """Полная проверка состояния системы"""
-    checks = {
-        "status": "healthy",
-        "database": False,
-        "testlink": False,
-        "openqa": False,
-        "celery": False
-    }
+async def health_check():
+    """Полная проверка состояния системы: последние результаты фоновых проб и их возраст"""
+    await health_monitor.ensure_fresh()
+    report = health_monitor.report()
+    return {**report, **{name: component["ok"] for name, component in report["components"].items()}}
 
-    # Database
-    try:
-        db.execute("SELECT 1")
-        checks["database"] = True
-    except:
-        pass
 
-    # Celery
-    try:
-        inspect = celery_app.control.inspect()
-        checks["celery"] = bool(inspect.ping())
-    except:
-        pass
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """Liveness: процесс жив и event loop отвечает (без обращений к БД и внешним системам)"""
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - health_monitor.started_at, 1)}
 
-    return checks
 
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    """Readiness: обязательные компоненты (HEALTH_REQUIRED) доступны по последней фоновой пробе; иначе 503"""
+    await health_monitor.ensure_fresh()
+    report = health_monitor.report()
+    return JSONResponse(jsonable_encoder(report), status_code=200 if report["ready"] else 503)
 
-## 📊 Dashboard endpoints
 
-@app.get("/api/v1/dashboard", tags=["Dashboard"])
-async def dashboard(db: Session = Depends(get_db)):
-    """Дашборд со статистикой"""
-    from .models import TestCase, TestJob
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики Prometheus: латентность API, SQL, вызовов OpenQA / TestLink, длина очередей Celery"""
+    # Длина очередей читается из брокера при сборе - не в event loop
+    return Response(await asyncio.to_thread(render), headers={"Content-Type": CONTENT_TYPE})
+
 
-    total_cases = db.query(TestCase).count()
-    running_cases = db.query(TestCase).filter(TestCase.status == "running").count()
-    passed_cases = db.query(TestCase).filter(TestCase.status == "passed").count()
-    failed_cases = db.query(TestCase).filter(TestCase.status == "failed").count()
+## 📊 Dashboard endpoints
 
-    total_jobs = db.query(TestJob).count()
+@app.get("/api/v1/dashboard", tags=["Dashboard"])
+async def dashboard(db: AsyncSession = Depends(get_async_db)):
+    """Дашборд со статистикой (один агрегирующий запрос, кеш DASHBOARD_CACHE_TTL секунд)"""
+    counts = await get_dashboard_counts(db)
 
     return {
-        "test_cases": {
-            "total": total_cases,
-            "running": running_cases,
-            "passed": passed_cases,
-            "failed": failed_cases,
-            "pending": total_cases - running_cases - passed_cases - failed_cases
-        },
-        "openqa_jobs": {
-            "total": total_jobs
-        },
+        **counts,
         "system": {
             "testlink_url": os.getenv("TESTLINK_URL", "Not set"),
             "openqa_url": os.getenv("OPENQA_URL", "Not set")
@@ -182,69 +174,60 @@ async def get_task_status(task_id: str):
 
 @app.get("/api/v1/testcases", response_model=List[TestCaseResponse], tags=["TestCases"])
 async def list_testcases(
-        skip: int = 0,
-        limit: int = 100,
-        status: str = None,
-        db: Session = Depends(get_db)
+        response: Response,
+        after_id: int = 0,
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+        status: Optional[TestCaseStatus] = None,
+        db: AsyncSession = Depends(get_async_db)
 ):
-    """Список тест-кейсов с фильтрацией"""
-    from .models import TestCase
-
-    query = db.query(TestCase)
-    if status:
-        query = query.filter(TestCase.status == status)
-
-    testcases = query.offset(skip).limit(limit).all()
+    """Список тест-кейсов с фильтрацией (курсор id > after_id вместо OFFSET)"""
+    testcases, next_cursor = await keyset_page(db, after_id, limit, status)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return testcases
 
 
 @app.get("/api/v1/testcases/statuses", tags=["TestCases"])
-async def get_status_stats(db: Session = Depends(get_db)):
+async def get_status_stats(db: AsyncSession = Depends(get_async_db)):
     """Статистика по статусам тест-кейсов"""
-    from .models import TestCase
+    stats = await db.execute(
+        select(TestCase.status, func.count(TestCase.id)).group_by(TestCase.status)
+    )
 
-    stats = db.query(
-        TestCase.status,
-        db.func.count(TestCase.id)
-    ).group_by(TestCase.status).all()
+    return [{"status": s[0], "count": s[1]} for s in stats.all()]
 
-    return [{"status": s[0], "count": s[1]} for s in stats]
+
+@app.get("/api/v1/testcases/{testcase_number}/trend", tags=["TestCases"])
+async def get_testcase_trend(testcase_number: int, days: int = Query(30, ge=1, le=366),
+                             db: AsyncSession = Depends(get_async_db)):
+    """Тренд кейса по дням из агрегатов test_job_daily_stats (сырая история не читается)"""
+    since = datetime.utcnow().date() - timedelta(days=days)
+    rows = await db.execute(
+        select(TestJobDailyStats)
+        .join(TestCase, TestCase.id == TestJobDailyStats.testcase_id)
+        .where(TestCase.testcase_number == testcase_number, TestJobDailyStats.day >= since)
+        .order_by(TestJobDailyStats.day)
+    )
+    return [{
+        "day": stat.day,
+        "runs": stat.runs,
+        "passed": stat.passed,
+        "failed": stat.failed,
+        "duration_p50": stat.duration_p50,
+        "duration_p95": stat.duration_p95,
+    } for stat in rows.scalars()]
 
 
 ## 🚀 Quick actions
 
-@app.post("/api/v1/run-all-pending/{limit}", tags=["Quick Actions"])
-async def run_all_pending(limit: int = 10, db: Session = Depends(get_db)):
-    """Запуск N ожидающих тест-кейсов"""
-    from .models import TestCase
-    from .services.openqa_runner import create_openqa_job
-
-    pending = db.query(TestCase).filter(
-        TestCase.status == "pending"
-    ).limit(limit).all()
-
-    results = []
-    for case in pending:
-        try:
-            job_id = create_openqa_job(case.name, case.id)
-            case.status = "running"
-            case.openqa_job_id = job_id
-            db.commit()
-
-            # Запускаем мониторинг
-            monitor_openqa_jobs.delay(job_id)
-
-            results.append({
-                "testlink_id": case.testlink_id,
-                "openqa_job_id": job_id
-            })
-        except Exception as e:
-            results.append({
-                "testlink_id": case.testlink_id,
-                "error": str(e)
-            })
-
-    return {"launched": len([r for r in results if "openqa_job_id" in r]), "results": results}
+@app.post("/api/v1/run-all-pending/{limit}", tags=["Quick Actions"], status_code=202)
+async def run_all_pending(limit: int = 10, priority: int = 0, build: Optional[str] = None,
+                          reuse: Literal["link", "clone", "never"] = "link"):
+    """Постановка N ожидающих тест-кейсов в очередь запусков (Celery; прогресс - /api/v1/tasks/{task_id})"""
+    from .workers.celery_worker import launch_pending_cases
+
+    task = launch_pending_cases.delay(limit, priority, build, reuse)
+    return {"task_id": task.id, "status": "sent", "limit": limit}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+"""Метрики Prometheus (prometheus_client): латентность API, SQL, вызовов OpenQA / TestLink, задачи Celery.
+
+Процесс API отдаёт реестр по умолчанию на /metrics. Воркер Celery (prefork) считает в дочерних
+процессах: при PROMETHEUS_MULTIPROC_DIR каждый процесс пишет значения в свои mmap-файлы каталога,
+главный процесс отдаёт их сумму через MultiProcessCollector на CELERY_METRICS_PORT (serve).
+Каталог должен быть задан до импорта prometheus_client (в окружении процесса) и у каждого воркера
+свой: при старте воркер его очищает, gauge завершившегося дочернего процесса убирает mark_dead.
+"""
+import glob
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, start_http_server,
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+# Секунды: от быстрого SQL до долгого multicall в TestLink
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Каталог mmap-файлов процессов (prometheus_client читает ту же переменную); пусто - один процесс
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Коллекторы, считающие значение при опросе (длина очередей брокера): в multiprocess-режиме
+# не попадают в файлы процессов, их добавляет registry()
+_collectors = []
+_registry: Optional[CollectorRegistry] = None
+
+
+def add_collector(collector):
+    """Коллектор со значениями на момент опроса /metrics (describe() + collect())"""
+    _collectors.append(collector)
+    if not PROMETHEUS_MULTIPROC_DIR:
+        REGISTRY.register(collector)
+    elif _registry is not None:
+        _registry.register(collector)
+
+
+def registry() -> CollectorRegistry:
+    """Реестр для /metrics: свой процесс или сумма файлов всех процессов (MultiProcessCollector)"""
+    global _registry
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    if _registry is None:
+        _registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(_registry, path=PROMETHEUS_MULTIPROC_DIR)
+        for collector in _collectors:
+            _registry.register(collector)
+    return _registry
+
+
+def render() -> bytes:
+    """Текстовый формат Prometheus (коллекторы опроса могут ходить в брокер - вызывать не из event loop)"""
+    return generate_latest(registry())
+
+
+# Воркер Celery (prefork)
+
+def clear_multiprocess_dir():
+    """Файлы прошлого запуска воркера; вызывается в главном процессе до fork"""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+        os.remove(path)
+
+
+def mark_dead(pid: int):
+    """Дочерний процесс завершился: его live-gauge больше не учитываются (счётчики остаются)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
+
+
+def serve(port: int, host: str = "0.0.0.0"):
+    """HTTP-экспортёр /metrics в фоновом потоке (воркер Celery, потребитель событий)"""
+    return start_http_server(port, addr=host, registry=registry())
+
+
+# HTTP API
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Время ответа API до первого байта (SSE - до начала потока)",
+    ("method", "route", "status"), buckets=DEFAULT_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность по шаблону маршрута (/jobs/{job_id}, а не по каждому ID)"""
+
+    def __init__(self, app):
+        self.app = app
+        # endpoint → шаблон пути; строится по app.routes при первом промахе
+        self._templates: Dict[Callable, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        from . import tracing
+
+        started = time.perf_counter()
+        started_response = False
+
+        async def send_timed(message):
+            nonlocal started_response
+            if message["type"] == "http.response.start":
+                started_response = True
+                http_request_seconds.labels(scope["method"], self._route_template(scope), message["status"]) \
+                    .observe(time.perf_counter() - started)
+            await send(message)
+
+        with tracing.server_span(scope) as current:
+            try:
+                await self.app(scope, receive, send_timed)
+            except Exception:
+                if not started_response:
+                    http_request_seconds.labels(scope["method"], self._route_template(scope), 500) \
+                        .observe(time.perf_counter() - started)
+                raise
+            finally:
+                tracing.set_route(current, scope["method"], self._route_template(scope))
+
+    def _route_template(self, scope) -> str:
+        """Шаблон по endpoint, который роутер Starlette записал в scope при сопоставлении"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Без шаблона - одна метка на все неизвестные пути (сканеры не раздувают метрики)
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            self._templates = {
+                getattr(route, "endpoint", None): route.path
+                for route in reversed(getattr(scope.get("app"), "routes", ())) if hasattr(route, "path")
+            }
+            template = self._templates.get(endpoint, "unmatched")
+        return template
+
+
+# База данных
+
+db_query_seconds = Histogram(
+    "db_query_duration_seconds", "Время SQL-запроса (по типу запроса и первой таблице)",
+    ("operation", "table"), buckets=DEFAULT_BUCKETS,
+)
+
+_STATEMENT = re.compile(r"^\s*(\w+)")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def _statement_labels(statement: str) -> Tuple[str, str]:
+    """SELECT ... FROM test_jobs ... → ("select", "test_jobs"); тексты запросов повторяются - кешируем"""
+    operation = _STATEMENT.match(statement)
+    table = _TABLE.search(statement)
+    return (operation.group(1).lower() if operation else "other", table.group(1) if table else "")
+
+
+def instrument_engine(engine):
+    """Замер каждого запроса через события SQLAlchemy (для async-движка - его sync_engine)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_seconds.labels(*_statement_labels(statement)).observe(elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # Запрос упал - after_cursor_execute не будет, стек замеров не должен расти
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
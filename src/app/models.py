@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Integer, String, Text, DateTime, Date, Float, ForeignKey, Enum, Index, text
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -19,12 +20,28 @@ class TestCaseStatus(PyEnum):
 class TestCase(Base):
     __tablename__ = "test_cases"
 
-    id = Column(Integer, primary_key=True, index=True)
-    testcase_number = Column(Integer, nullable=False)
+    id = Column(Integer, primary_key=True)
+    testcase_number = Column(Integer, nullable=False, unique=True)
     name = Column(String(255), nullable=False)
-    preconditions = Column(Text)
-    steps = Column(Text)
+    # Текст без HTML (снимается при синхронизации) и шаги
+    # [{"step": 1, "action": ..., "expected": ..., "manual": false}] - генератор jobs OpenQA читает их как есть.
+    # Отложенная загрузка: списки и select(TestCase) их не тянут (undefer / явные колонки)
+    preconditions = deferred(Column(Text))
+    steps = deferred(Column(JSONB))
     test_suite_id = Column(Integer)
+    # Полнотекстовый поиск (testcase_search): вес A - имя, B - шаги, C - предусловия.
+    # Конфигурация russian разбирает и английские слова (asciiword → english_stem)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('russian'::regconfig, coalesce(steps, '[]'::jsonb)), 'B') || "
+        "setweight(to_tsvector('russian'::regconfig, coalesce(preconditions, '')), 'C')",
+        persisted=True
+    )))
+
+    # Инкрементальная синхронизация: хеш name/preconditions/steps и отметки версии TestLink
+    content_hash = Column(String(64))
+    testlink_version = Column(Integer)
+    testlink_modification_ts = Column(String(32))
 
     openqa_job_id = Column(String(50), unique=True)
     status = Column(Enum(TestCaseStatus), default=TestCaseStatus.PENDING)
@@ -34,6 +51,17 @@ class TestCase(Base):
 
     jobs = relationship("TestJob", back_populates="testcase")
 
+    __table_args__ = (
+        # Фильтр по статусу со страницами по id (списки, запуск ожидающих)
+        Index("ix_test_cases_status_id", "status", "id"),
+        # steps @> '[{"manual": true}]' - кейсы с ручными шагами
+        Index("ix_test_cases_steps", "steps", postgresql_using="gin", postgresql_ops={"steps": "jsonb_path_ops"}),
+        # search_vector @@ tsquery - поиск по тексту
+        Index("ix_test_cases_search_vector", "search_vector", postgresql_using="gin"),
+        # name <% запрос - нечёткий поиск по имени (pg_trgm)
+        Index("ix_test_cases_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
 
 class TestJob(Base):
     __tablename__ = "test_jobs"
@@ -46,4 +74,172 @@ class TestJob(Base):
     started_at = Column(DateTime)
     finished_at = Column(DateTime)
 
+    # Адаптивный опрос OpenQA (когда проверять в следующий раз и текущий интервал, сек)
+    next_check_at = Column(DateTime)
+    check_interval = Column(Integer)
+
+    # Ячейка матрицы: DISTRI / VERSION / FLAVOR / ARCH / MACHINE, на которых запущен job
+    settings = Column(JSONB)
+    # Ключ повторного использования результата (services/result_cache.result_key)
+    result_key = Column(String(64))
+    # Прогон, в рамках которого запущен job; для привязанного готового результата - чей он
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="SET NULL"))
+    source_job_id = Column(String(50))
+    # Один запуск матрицы кейса: статус кейса - худший результат всех ячеек этого запуска
+    launch_id = Column(String(32))
+
+    # Отчёт в TestLink: когда отправлен, ID выполнения, попытки и следующая попытка (backoff)
+    reported_at = Column(DateTime)
+    testlink_execution_id = Column(Integer)
+    report_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_report_at = Column(DateTime)
+
     testcase = relationship("TestCase", back_populates="jobs")
+
+    __table_args__ = (
+        # Jobs кейса (последний job, отчёт в TestLink); FK сам индекс не создаёт
+        Index("ix_test_jobs_testcase_id", "testcase_id", "id"),
+        # Активные jobs по времени следующей проверки - poll_due_jobs
+        Index(
+            "ix_test_jobs_active", "next_check_at",
+            postgresql_where=text(
+                "openqa_job_id IS NOT NULL "
+                "AND (openqa_status IS NULL OR openqa_status NOT IN ('done', 'cancelled'))"
+            )
+        ),
+        # Длительности завершённых jobs (expected_durations) - index-only scan
+        Index(
+            "ix_test_jobs_done_duration", "testcase_id",
+            postgresql_include=["started_at", "finished_at"],
+            postgresql_where=text("openqa_status = 'done'")
+        ),
+        # Jobs прогона (сверка завершения, отчёт прогона)
+        Index("ix_test_jobs_run_id", "run_id", "id", postgresql_where=text("run_id IS NOT NULL")),
+        # Ячейки одного запуска матрицы кейса (итоговый статус кейса в job_poller)
+        Index("ix_test_jobs_launch", "launch_id", "testcase_id", postgresql_where=text("launch_id IS NOT NULL")),
+        # Поиск готового результата для той же сборки и машины
+        Index(
+            "ix_test_jobs_result_key", "result_key", "finished_at",
+            postgresql_where=text("openqa_status = 'done' AND result_key IS NOT NULL")
+        ),
+        # Очередь неотправленных результатов - только её и читает bulk_report_results
+        Index(
+            "ix_test_jobs_unreported", "id",
+            postgresql_include=["next_report_at", "report_attempts", "run_id"],
+            postgresql_where=text("openqa_status = 'done' AND reported_at IS NULL")
+        ),
+    )
+
+
+class TestRun(Base):
+    """Прогон: все кейсы плана или сьюта TestLink на одной сборке (services/test_runs).
+
+    Счётчики обновляются по мере завершения jobs - прогресс читается из одной строки.
+    """
+    __tablename__ = "test_runs"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255))
+    testplan_id = Column(Integer)
+    test_suite_id = Column(Integer)
+    build = Column(String(100))
+    testlink_build = Column(String(100))
+    reuse = Column(String(10), nullable=False, default="link", server_default="link")
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    # starting → running → completed → reported (или error, если не удалось собрать кейсы)
+    status = Column(String(20), nullable=False, default="starting", server_default="starting")
+    error = Column(Text)
+
+    total = Column(Integer, nullable=False, default=0, server_default="0")
+    launched = Column(Integer, nullable=False, default=0, server_default="0")
+    finished = Column(Integer, nullable=False, default=0, server_default="0")
+    passed = Column(Integer, nullable=False, default=0, server_default="0")
+    failed = Column(Integer, nullable=False, default=0, server_default="0")
+    # Прочие результаты OpenQA (softfailed, incomplete, отмена ...)
+    other = Column(Integer, nullable=False, default=0, server_default="0")
+    # Кейсы, которые так и не удалось запустить
+    errors = Column(Integer, nullable=False, default=0, server_default="0")
+    reported = Column(Integer, nullable=False, default=0, server_default="0")
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    reported_at = Column(DateTime)
+
+    __table_args__ = (
+        # Незавершённые прогоны (сверка, отчёты)
+        Index("ix_test_runs_open", "status", postgresql_where=text("status IN ('running', 'completed')")),
+    )
+
+
+class LaunchQueueItem(Base):
+    """Запуск кейса, ожидающий свободного места на OpenQA (services/launch_queue)"""
+    __tablename__ = "launch_queue"
+
+    id = Column(Integer, primary_key=True)
+    testcase_id = Column(Integer, ForeignKey("test_cases.id", ondelete="CASCADE"), nullable=False, unique=True)
+    test_suite_id = Column(Integer)
+    # Больше - раньше; внутри приоритета сьюты чередуются
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    machine = Column(String(50), nullable=False)
+    build = Column(String(100))
+    reuse = Column(String(10), nullable=False, default="link", server_default="link")
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="SET NULL"))
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+
+    enqueued_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Очередь каждого сьюта по порядку (row_number() в выборке диспетчера)
+        Index("ix_launch_queue_fair", "priority", "test_suite_id", "id"),
+    )
+
+
+class TestMatrix(Base):
+    """Оси запуска (distri/version/flavor/arch/machine) для сьюта или отдельного кейса"""
+    __tablename__ = "test_matrices"
+
+    id = Column(Integer, primary_key=True)
+    test_suite_id = Column(Integer, unique=True)
+    testcase_id = Column(Integer, ForeignKey("test_cases.id", ondelete="CASCADE"), unique=True)
+    axes = Column(JSONB, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TestJobHistory(Base):
+    """Архив завершённых jobs, секционирован по месяцам started_at (см. services/job_history.py)"""
+    __tablename__ = "test_job_history"
+
+    id = Column(Integer, primary_key=True)  # id из test_jobs
+    started_at = Column(DateTime, primary_key=True)  # ключ секционирования входит в PK
+    testcase_id = Column(Integer, nullable=False)
+    openqa_job_id = Column(String(50))
+    openqa_status = Column(String(50))
+    openqa_result = Column(Text)
+    finished_at = Column(DateTime)
+    reported_at = Column(DateTime)
+    testlink_execution_id = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_test_job_history_testcase_id", "testcase_id", "started_at"),
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
+
+
+class TestJobDailyStats(Base):
+    """Дневные агрегаты по кейсу - для трендов вместо сырой истории"""
+    __tablename__ = "test_job_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    testcase_id = Column(Integer, primary_key=True)
+    runs = Column(Integer, nullable=False)
+    passed = Column(Integer, nullable=False)
+    failed = Column(Integer, nullable=False)
+    duration_p50 = Column(Float)  # секунды
+    duration_p95 = Column(Float)
+
+    __table_args__ = (
+        Index("ix_test_job_daily_stats_testcase_id", "testcase_id", "day"),
+    )
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Literal
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Optional, List, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -18,9 +18,17 @@ class TestCaseBase(BaseModel):
     name: str
 
 
+class TestStep(BaseModel):
+    """Шаг кейса без HTML (как хранится в test_cases.steps)"""
+    step: int
+    action: str = ""
+    expected: str = ""
+    manual: bool = True
+
+
 class TestCaseCreate(TestCaseBase):
     external_id: Optional[str] = None
-    steps: Optional[str] = None
+    steps: Optional[List[TestStep]] = None
 
 
 class TestCaseUpdate(BaseModel):
@@ -31,7 +39,7 @@ class TestCaseUpdate(BaseModel):
 class TestCaseResponse(TestCaseBase):
     id: int
     testcase_number: int
-    test_suite_id: int
+    test_suite_id: Optional[int] = None
     status: TestCaseStatus
     openqa_job_id: Optional[str] = None
     created_at: datetime
@@ -41,6 +49,28 @@ class TestCaseResponse(TestCaseBase):
         from_attributes = True
 
 
+class TestCaseListItem(TestCaseResponse):
+    """Строка списка: preconditions/steps только при ?fields=preconditions,steps"""
+    preconditions: Optional[str] = None
+    steps: Optional[List[TestStep]] = None
+
+
+class TestCaseSteps(TestCaseBase):
+    preconditions: Optional[str] = None
+    steps: List[TestStep] = []
+
+
+class TestCaseSearchHit(BaseModel):
+    """Найденный кейс: match - по номеру, полнотекстово (text) или нечётко по имени (fuzzy)"""
+    id: int
+    testcase_number: int
+    name: str
+    test_suite_id: Optional[int] = None
+    status: TestCaseStatus
+    rank: float
+    match: Literal["number", "text", "fuzzy"]
+
+
 class TestJobBase(BaseModel):
     testcase_id: int
     openqa_job_id: str
@@ -63,17 +93,93 @@ class TestJobResponse(TestJobBase):
 class SyncResponse(BaseModel):
     status: Literal["success"]
     synced_cases: int
-    total_cases: int
+    total_cases: int  # обработано кейсов за эту синхронизацию
+    inserted_cases: int = 0
+    updated_cases: int = 0
+    unchanged_cases: int = 0
+
+
+class MatrixAxes(BaseModel):
+    """Оси матрицы запуска; iso - шаблон имени ISO ({distri}, {version}, {flavor}, {arch})"""
+    distri: List[str] = Field(["ALT"], min_length=1)
+    version: List[str] = Field(["p10"], min_length=1)
+    flavor: List[str] = Field(["Server"], min_length=1)
+    arch: List[str] = Field(["x86_64"], min_length=1)
+    machine: List[str] = Field(["uefi"], min_length=1)
+    iso: str = "ALT-latest.iso"
 
 
 class JobResponse(BaseModel):
-    status: Literal["created"]
-    openqa_job_id: str
+    # created - новый job, cloned - перезапуск прежнего, linked - готовый результат той же сборки,
+    # queued - ждёт свободного места на OpenQA
+    status: Literal["created", "cloned", "linked", "queued"]
+    openqa_job_id: Optional[str] = None
     testcase_id: int
 
 
+class TestRunCreate(BaseModel):
+    """Прогон плана или сьюта TestLink; build - сборка OpenQA, testlink_build - сборка для отчёта"""
+    testplan_id: Optional[int] = None
+    test_suite_id: Optional[int] = None
+    name: Optional[str] = None
+    build: Optional[str] = None
+    testlink_build: Optional[str] = None
+    reuse: Literal["link", "clone", "never"] = "link"
+    priority: int = 0
+
+    @model_validator(mode="after")
+    def one_scope(self):
+        if (self.testplan_id is None) == (self.test_suite_id is None):
+            raise ValueError("Нужен ровно один из testplan_id / test_suite_id")
+        return self
+
+
+class TestRunResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    testplan_id: Optional[int] = None
+    test_suite_id: Optional[int] = None
+    build: Optional[str] = None
+    testlink_build: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    total: int
+    launched: int
+    finished: int
+    passed: int
+    failed: int
+    other: int
+    errors: int
+    reported: int
+    progress: float
+    queued: int
+    running: int
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    reported_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class HealthComponent(BaseModel):
+    ok: bool
+    latency_ms: Optional[float] = None
+    age_seconds: Optional[float] = None
+    checked_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+
 class HealthCheck(BaseModel):
-    status: Literal["healthy"]
+    status: Literal["healthy", "degraded", "unhealthy"]
+    ready: bool
     database: bool
+    broker: bool = False
+    celery: bool = False
     testlink: bool = False
     openqa: bool = False
+    components: Dict[str, HealthComponent] = {}
@@ -0,0 +1,324 @@
+import logging
+import os
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from .. import tracing
+from ..models import TestCase, TestCaseStatus, TestJob, TestMatrix
+from .openqa_client import get_openqa_client
+from .openqa_runner import (
+    DEFAULT_AXES, OPENQA_STEPS_SETTING, create_openqa_job, default_cell, cell_settings, matrix_cells, group_cells,
+    schedule_group
+)
+from .job_poller import initial_check_at, fetch_job_states, testcase_status_for, combined_status
+from .result_cache import KEY_SETTINGS, result_key, find_reusable, clone_job
+from .dashboard_stats import invalidate_dashboard_cache
+from .test_runs import count_launched, count_results
+from .live_status import publish, job_event, case_event
+
+logger = logging.getLogger(__name__)
+
+# Сколько POST /jobs держать в полёте одновременно (не больше OPENQA_POOL_SIZE)
+LAUNCH_CONCURRENCY = int(os.getenv("OPENQA_LAUNCH_CONCURRENCY", "8"))
+
+
+def claim_pending_cases(db: Session, limit: int) -> List[Any]:
+    """Одним UPDATE ... RETURNING переводит до limit ожидающих кейсов в RUNNING.
+
+    SKIP LOCKED - параллельные запуски не захватят одни и те же кейсы.
+    """
+    pending = select(TestCase.id).where(
+        TestCase.status == TestCaseStatus.PENDING
+    ).order_by(TestCase.id).limit(limit).with_for_update(skip_locked=True)
+
+    claimed = db.execute(
+        update(TestCase)
+        .where(TestCase.id.in_(pending))
+        .values(status=TestCaseStatus.RUNNING, updated_at=datetime.utcnow())
+        .returning(TestCase.id, TestCase.testcase_number, TestCase.name, TestCase.content_hash)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    invalidate_dashboard_cache()
+    return claimed
+
+
+def _case_steps(db: Session, case_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Шаги новых jobs одним запросом (колонка отложенная - в строках кейсов её нет)"""
+    if not case_ids or not OPENQA_STEPS_SETTING:
+        return {}
+    return dict(db.execute(select(TestCase.id, TestCase.steps).where(TestCase.id.in_(case_ids))).all())
+
+
+def _submit(case, build: Optional[str] = None, clone_from: Optional[str] = None,
+            machine: Optional[str] = None, steps: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    try:
+        if clone_from:
+            job_id, status = clone_job(clone_from), "cloned"
+        else:
+            job_id, status = create_openqa_job(case.name, case.id, build, machine, steps), "created"
+        return {"testcase_id": case.id, "testcase_number": case.testcase_number,
+                "openqa_job_id": str(job_id), "status": status}
+    except Exception as e:
+        logger.warning("OpenQA launch failed for case %s: %s", case.testcase_number, e)
+        return {"testcase_id": case.id, "testcase_number": case.testcase_number, "error": str(e)}
+
+
+def launch_cases(db: Session, cases: List[Any], concurrency: Optional[int] = None,
+                 build: Optional[str] = None, reuse: str = "link", machine: Optional[str] = None,
+                 run_id: Optional[int] = None, commit: bool = True) -> Dict[str, Any]:
+    """Параллельно создаёт OpenQA jobs и одной транзакцией записывает TestJob и статусы кейсов.
+
+    Если для кейса уже есть результат на той же сборке (result_cache), он привязывается
+    (reuse=link) или перезапускается клоном (reuse=clone) вместо нового job.
+    В прогоне (run_id) привязанный результат тоже записывается как TestJob прогона
+    (source_job_id - чей результат) - так он попадёт в отчёт прогона.
+    commit=False - коммит и публикация событий (result["events"]) у вызывающего: очередь
+    запусков снимает свои строки в той же транзакции.
+    """
+    cell = default_cell()
+    if machine:
+        cell["machine"] = machine
+    settings = cell_settings(cell, DEFAULT_AXES["iso"], build)
+    keys = {case.id: result_key(case.id, case.content_hash, settings) for case in cases}
+    hits = find_reusable(db, keys.values()) if reuse != "never" else {}
+
+    linked, to_launch = [], []
+    for case in cases:
+        hit = hits.get(keys[case.id])
+        if hit is not None and reuse == "link":
+            linked.append({"testcase_id": case.id, "testcase_number": case.testcase_number,
+                           "openqa_job_id": hit.openqa_job_id, "status": "linked", "result": hit.openqa_result,
+                           "finished_at": hit.finished_at})
+        else:
+            to_launch.append((case, hit.openqa_job_id if hit is not None else None))
+
+    steps = _case_steps(db, [case.id for case, clone_from in to_launch if clone_from is None])
+    with ThreadPoolExecutor(max_workers=concurrency or LAUNCH_CONCURRENCY) as pool:
+        submit = tracing.in_current_context(_submit)
+        results = list(pool.map(lambda item: submit(item[0], build, item[1], machine, steps.get(item[0].id)),
+                                to_launch))
+
+    launched = [r for r in results if "openqa_job_id" in r]
+    failed = [r for r in results if "error" in r]
+
+    check_at = initial_check_at()
+    db.bulk_insert_mappings(TestJob, [
+        {"testcase_id": r["testcase_id"], "openqa_job_id": r["openqa_job_id"], "next_check_at": check_at,
+         "settings": settings, "result_key": keys[r["testcase_id"]], "run_id": run_id}
+        for r in launched
+    ] + [
+        {"testcase_id": r["testcase_id"], "source_job_id": r["openqa_job_id"], "openqa_status": "done",
+         "openqa_result": r["result"], "finished_at": r["finished_at"], "settings": settings, "run_id": run_id}
+        for r in linked if run_id
+    ])
+    events = count_launched(db, run_id, len(launched) + len(linked))
+    events += count_results(db, [(run_id, r["result"]) for r in linked])
+    db.bulk_update_mappings(TestCase, [
+        {"id": r["testcase_id"], "status": TestCaseStatus.RUNNING, "openqa_job_id": r["openqa_job_id"]}
+        for r in launched
+    ] + [
+        # Готовый результат - сразу финальный статус
+        {"id": r["testcase_id"], "status": testcase_status_for(r["result"]), "openqa_job_id": r["openqa_job_id"]}
+        for r in linked
+    ] + [
+        # Не запустились - вернуть в очередь
+        {"id": r["testcase_id"], "status": TestCaseStatus.PENDING} for r in failed
+    ])
+    events = [
+        job_event(r["openqa_job_id"], r["testcase_id"], None, run_id=run_id, status=r["status"]) for r in launched
+    ] + [
+        case_event(r["testcase_id"], testcase_status_for(r["result"])) for r in linked
+    ] + events
+    if commit:
+        db.commit()
+        invalidate_dashboard_cache()
+        publish(events)
+
+    print(f"🚀 OpenQA batch: запущено {len(launched)}, переиспользовано {len(linked)}, ошибок {len(failed)}")
+
+    result = {
+        "launched": len(launched),
+        "linked": len(linked),
+        "failed": len(failed),
+        "results": [{k: v for k, v in r.items() if k not in ("testcase_id", "finished_at")} for r in linked + results],
+    }
+    if not commit:
+        result["events"] = events
+    return result
+
+
+def launch_pending(db: Session, limit: int, concurrency: Optional[int] = None,
+                   build: Optional[str] = None, reuse: str = "link") -> Dict[str, Any]:
+    """Запуск до limit ожидающих тест-кейсов"""
+    return launch_cases(db, claim_pending_cases(db, limit), concurrency, build, reuse)
+
+
+def resolve_axes(db: Session, cases: List[Any]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Оси для каждого кейса: матрица кейса поверх матрицы сьюта (None - DEFAULT_AXES)"""
+    case_axes = dict(db.query(TestMatrix.testcase_id, TestMatrix.axes).filter(
+        TestMatrix.testcase_id.in_([case.id for case in cases])
+    ).all())
+    suite_axes = dict(db.query(TestMatrix.test_suite_id, TestMatrix.axes).filter(
+        TestMatrix.test_suite_id.in_({case.test_suite_id for case in cases})
+    ).all())
+    return {
+        case.id: {**suite_axes.get(case.test_suite_id, {}), **case_axes.get(case.id, {})} or None
+        for case in cases
+    }
+
+
+def launch_matrix(db: Session, cases: List[Any], build: Optional[str] = None,
+                  reuse: str = "link") -> Dict[str, Any]:
+    """Вся матрица кейсов: по POST /isos на группу, затем один GET /jobs?ids= - job на каждую ячейку.
+
+    Ячейки с готовым результатом на той же сборке привязываются (link) или клонируются (clone).
+    Все jobs вызова помечаются одним launch_id: итоговый статус кейса поллер считает по всем его ячейкам.
+    Запуск идёт под замком диспетчера очереди и только в свободные места фермы: кейсы, чьи ячейки
+    не помещаются, возвращаются в deferred и не меняют статус.
+    """
+    # launch_queue сам импортирует этот модуль
+    from .launch_queue import dispatch_lock
+
+    with dispatch_lock(db) as locked:
+        if not locked:
+            return {"calls": 0, "jobs": 0, "cases": 0, "linked": 0, "cloned": 0, "failed": [],
+                    "deferred": [case.id for case in cases], "busy": True}
+        return _launch_matrix(db, cases, build, reuse)
+
+
+def _admit_cases(items: List[Dict[str, Any]], free: int, machine_free: Dict[str, int]) -> set:
+    """Кейсы, все новые jobs которых помещаются в свободные места (всего и по машинам с лимитом).
+    Кейс целиком или никак: ячейки одного launch_id не делятся между запусками"""
+    by_case = defaultdict(Counter)
+    for item in items:
+        by_case[item["testcase_id"]][item["cell"]["machine"]] += 1
+    admitted = set()
+    for case_id, machines in by_case.items():
+        need = sum(machines.values())
+        if need > free or any(count > machine_free.get(machine, count) for machine, count in machines.items()):
+            continue
+        admitted.add(case_id)
+        free -= need
+        for machine, count in machines.items():
+            if machine in machine_free:
+                machine_free[machine] -= count
+    return admitted
+
+
+def _launch_matrix(db: Session, cases: List[Any], build: Optional[str], reuse: str) -> Dict[str, Any]:
+    from .launch_queue import free_slots
+
+    launch_id = uuid.uuid4().hex
+    axes = resolve_axes(db, cases)
+    content_hashes = {case.id: case.content_hash for case in cases}
+    cells = matrix_cells([(case.id, case.name, axes[case.id]) for case in cases])
+    for item in cells:
+        item["settings"] = cell_settings(item["cell"], item["iso"], build)
+        item["key"] = result_key(item["testcase_id"], content_hashes[item["testcase_id"]], item["settings"])
+    hits = find_reusable(db, [item["key"] for item in cells]) if reuse != "never" else {}
+
+    linked = defaultdict(list)
+    cloned, to_schedule = [], []
+    for item in cells:
+        hit = hits.get(item["key"])
+        if hit is None:
+            to_schedule.append(item)
+        elif reuse == "link":
+            linked[item["testcase_id"]].append((item, hit))
+        else:
+            cloned.append((item, hit.openqa_job_id))
+
+    # Новые jobs (и перезапуски) занимают места на ферме наравне с очередью запусков
+    client = get_openqa_client()
+    _, _, free, machine_free = free_slots(db, client)
+    admitted = _admit_cases(to_schedule + [item for item, _ in cloned], free, machine_free)
+    deferred = sorted({item["testcase_id"] for item in to_schedule + [item for item, _ in cloned]} - admitted)
+    to_schedule = [item for item in to_schedule if item["testcase_id"] in admitted]
+    cloned = [(item, job_id) for item, job_id in cloned if item["testcase_id"] in admitted]
+    for case_id in deferred:
+        linked.pop(case_id, None)
+
+    groups = group_cells(to_schedule, _case_steps(db, list({item["testcase_id"] for item in to_schedule})))
+
+    job_ids, failed_groups = [], []
+    tests = {}
+    for group in groups:
+        try:
+            job_ids += schedule_group(group, build, client)
+            tests.update(group["tests"])
+        except Exception as e:
+            logger.warning("OpenQA /isos failed for %s: %s", group["product"], e)
+            failed_groups.append({**group["product"], "error": str(e)})
+
+    check_at = initial_check_at()
+    rows = []
+    for item, source_job_id in cloned:
+        try:
+            job_id = clone_job(source_job_id, client)
+        except Exception as e:
+            logger.warning("OpenQA restart of %s failed: %s", source_job_id, e)
+            continue
+        rows.append({"testcase_id": item["testcase_id"], "openqa_job_id": job_id, "next_check_at": check_at,
+                     "settings": item["settings"], "result_key": item["key"], "launch_id": launch_id})
+
+    # Какой кейс и какая ячейка у каждого job - из настроек, которые вернул OpenQA
+    for job_id, job in fetch_job_states(job_ids, client).items():
+        settings = job.get("settings", {})
+        testcase_id = tests.get(settings.get("TEST"))
+        if testcase_id is None:
+            continue
+        cell = {key: settings.get(key) for key in KEY_SETTINGS if settings.get(key) is not None}
+        rows.append({
+            "testcase_id": testcase_id,
+            "openqa_job_id": job_id,
+            "next_check_at": check_at,
+            "settings": cell,
+            "result_key": result_key(testcase_id, content_hashes[testcase_id], cell),
+            "launch_id": launch_id,
+        })
+
+    launched = {row["testcase_id"]: row["openqa_job_id"] for row in rows}
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(TestJob, rows + [
+        # Готовые ячейки кейса, остальные ячейки которого запущены, - тоже в запуске (итоговый статус).
+        # В TestLink результат уходит с исходным job, эта строка повторно не отправляется
+        {"testcase_id": case_id, "source_job_id": hit.openqa_job_id, "openqa_status": "done",
+         "openqa_result": hit.openqa_result, "finished_at": hit.finished_at, "settings": item["settings"],
+         "launch_id": launch_id, "reported_at": now}
+        for case_id, cells in linked.items() if case_id in launched
+        for item, hit in cells
+    ])
+    db.bulk_update_mappings(TestCase, [
+        {"id": case_id, "status": TestCaseStatus.RUNNING, "openqa_job_id": job_id}
+        for case_id, job_id in launched.items()
+    ] + [
+        # Все ячейки кейса уже посчитаны на этой сборке
+        {"id": case_id, "status": combined_status(hit.openqa_result for _, hit in cells)}
+        for case_id, cells in linked.items() if case_id not in launched
+    ])
+    db.commit()
+    invalidate_dashboard_cache()
+
+    reused = sum(len(results) for results in linked.values())
+    print(f"🧮 OpenQA matrix: {len(groups)} вызовов /isos, {len(rows)} jobs для {len(launched)} кейсов, "
+          f"переиспользовано {reused}" + (f", отложено {len(deferred)} кейсов (нет мест)" if deferred else ""))
+    return {"calls": len(groups), "jobs": len(rows), "cases": len(launched), "linked": reused,
+            "cloned": len(cloned), "failed": failed_groups, "deferred": deferred}
+
+
+def launch_suite_matrix(db: Session, test_suite_id: Optional[int] = None, build: Optional[str] = None,
+                        reuse: str = "link", testcase_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Полный прогон матрицы сьюта (или всех кейсов, если сьют не указан); testcase_ids - только
+    отложенные кейсы прошлой попытки"""
+    query = db.query(TestCase.id, TestCase.testcase_number, TestCase.name,
+                     TestCase.test_suite_id, TestCase.content_hash)
+    if test_suite_id is not None:
+        query = query.filter(TestCase.test_suite_id == test_suite_id)
+    if testcase_ids is not None:
+        query = query.filter(TestCase.id.in_(testcase_ids))
+    return launch_matrix(db, query.order_by(TestCase.id).all(), build, reuse)
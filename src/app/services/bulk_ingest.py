@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Dict, Any, List, Iterable
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..models import TestCase, TestCaseStatus
+from .dashboard_stats import invalidate_dashboard_cache
+
+# Строк в одном INSERT ... VALUES (≈10 параметров на строку, лимит PostgreSQL - 65535)
+UPSERT_CHUNK = 1000
+
+# Поля, которые перезаписываются из TestLink при конфликте по testcase_number
+UPSERT_COLUMNS = (
+    'name',
+    'preconditions',
+    'steps',
+    'test_suite_id',
+    'content_hash',
+    'testlink_version',
+    'testlink_modification_ts',
+)
+
+
+def chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def upsert_testcases(db: Session, cases: List[Dict[str, Any]], incremental: bool = True) -> Dict[str, int]:
+    """INSERT ... ON CONFLICT (testcase_number) DO UPDATE пачками по UPSERT_CHUNK строк, один commit.
+
+    Счётчики берутся из RETURNING: xmax = 0 у вставленных строк, остальные возвращённые -
+    обновлённые, не вернувшиеся - отфильтрованы WHERE (incremental: тот же content_hash).
+    """
+    # Один кейс может прийти несколько раз (разные платформы плана)
+    unique = {c['testcase_number']: c for c in cases}
+    inserted = 0
+    updated = 0
+    unchanged = 0
+
+    for chunk in chunks(list(unique.values()), UPSERT_CHUNK):
+        now = datetime.utcnow()
+        rows = [
+            {**data, 'status': TestCaseStatus.PENDING, 'created_at': now, 'updated_at': now}
+            for data in chunk
+        ]
+
+        stmt = insert(TestCase).values(rows)
+        set_ = {column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+        set_['updated_at'] = now
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TestCase.testcase_number],
+            set_=set_,
+            where=TestCase.content_hash.is_distinct_from(stmt.excluded.content_hash) if incremental else None,
+        ).returning(literal_column("xmax = 0").label("inserted"))
+
+        result = db.execute(stmt).all()
+        chunk_inserted = sum(1 for row in result if row.inserted)
+        inserted += chunk_inserted
+        updated += len(result) - chunk_inserted
+        unchanged += len(chunk) - len(result)
+
+    db.commit()
+    if inserted:
+        invalidate_dashboard_cache()
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged, "total": len(unique)}
@@ -0,0 +1,68 @@
+import os
+from typing import Dict, Any
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..cache import TTLCache
+from ..models import TestCase, TestCaseStatus, TestJob
+from .live_status import dashboard_event, publish
+
+# Стена с дашбордом опрашивает каждые несколько секунд - агрегаты живут столько же.
+# Кеш в памяти процесса API; статусы меняют в основном воркеры Celery - сброс доходит до API
+# событием в канале живых статусов (Redis pub/sub, см. live_status)
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+
+def _status_count(status: TestCaseStatus):
+    return func.count().filter(TestCase.status == status).label(status.value)
+
+
+async def compute_dashboard_counts(db: AsyncSession) -> Dict[str, Any]:
+    """Все счётчики одним запросом (COUNT(*) FILTER по test_cases + подзапрос по test_jobs)"""
+    total_jobs = select(func.count()).select_from(TestJob).scalar_subquery()
+    row = (await db.execute(
+        select(
+            func.count().label("total"),
+            *[_status_count(status) for status in TestCaseStatus],
+            total_jobs.label("total_jobs"),
+        ).select_from(TestCase)
+    )).one()
+
+    counts = row._mapping
+    return {
+        "test_cases": {
+            "total": counts["total"],
+            **{status.value: counts[status.value] for status in TestCaseStatus},
+        },
+        "openqa_jobs": {
+            "total": counts["total_jobs"]
+        },
+    }
+
+
+async def get_dashboard_counts(db: AsyncSession) -> Dict[str, Any]:
+    return await dashboard_cache.get_or_load("dashboard", lambda: compute_dashboard_counts(db))
+
+
+def invalidate_dashboard_cache():
+    """Сброс кеша в этом процессе и во всех процессах API (вызывается и из воркеров Celery)"""
+    dashboard_cache.invalidate()
+    publish([dashboard_event()])
+
+
+# Изменение TestCase.status через ORM в этом процессе сбрасывает кеш после commit;
+# bulk-операции (поллер, пакетный запуск) вызывают invalidate_dashboard_cache() сами
+@event.listens_for(TestCase.status, "set", propagate=True)
+def _mark_status_changed(target, value, oldvalue, initiator):
+    if value != oldvalue:
+        session = Session.object_session(target)
+        if session is not None:
+            session.info["testcase_status_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("testcase_status_changed", False):
+        invalidate_dashboard_cache()
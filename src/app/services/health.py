@@ -0,0 +1,197 @@
+"""Проверки состояния: БД, брокер Celery (Redis), воркеры Celery, TestLink, OpenQA.
+
+Пробы идут параллельно в фоне раз в HEALTH_CHECK_INTERVAL секунд (монитор запускается в
+lifespan API), эндпоинты отдают последний результат с его возрастом - частые опросы
+балансировщика не доходят до внешних систем. Каждая проба - самый дешёвый вызов: SELECT 1,
+PING, tl.about, GET /jobs?limit=1; ping воркеров Celery - широковещательный, поэтому тоже только в фоне.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from ..database import async_engine
+from ..metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+# Результат старше этого - «неизвестно» (фоновый цикл встал): readiness отвечает 503
+HEALTH_MAX_AGE = float(os.getenv("HEALTH_MAX_AGE", str(HEALTH_CHECK_INTERVAL * 3)))
+# Без чего API не готов принимать трафик; остальное - degraded
+HEALTH_REQUIRED = [name for name in os.getenv("HEALTH_REQUIRED", "database").split(",") if name]
+
+_BROKER = os.getenv("CELERY_BROKER", "redis://localhost:6379/0")
+
+# Блокирующие пробы - в своём маленьком пуле: wait_for не прерывает поток, и зависший вызов
+# (до таймаута сокета) не должен занимать общий пул asyncio.to_thread, которым пользуется API
+_probe_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-probe")
+
+
+async def _in_probe_thread(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(_probe_executor, functools.partial(fn, *args, **kwargs))
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - без redis брокер проверяется через kombu
+    aioredis = None
+
+health_component_up = Gauge(
+    "health_component_up", "Последняя проба компонента успешна (1) или нет (0)", ("component",),
+    # Несколько процессов API (PROMETHEUS_MULTIPROC_DIR) - последняя проба среди живых
+    multiprocess_mode="livemostrecent",
+)
+
+
+async def probe_database() -> Dict[str, Any]:
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return {}
+
+
+async def probe_broker() -> Dict[str, Any]:
+    if aioredis is not None and _BROKER.startswith("redis"):
+        client = aioredis.from_url(_BROKER, socket_connect_timeout=HEALTH_CHECK_TIMEOUT)
+        try:
+            await client.ping()
+        finally:
+            await client.aclose()
+        return {}
+
+    from ..workers.celery_worker import celery_app
+
+    def connect():
+        with celery_app.connection_for_read() as conn:
+            conn.ensure_connection(max_retries=1)
+
+    await _in_probe_thread(connect)
+    return {}
+
+
+async def probe_celery() -> Dict[str, Any]:
+    from ..workers.celery_worker import celery_app
+
+    replies = await _in_probe_thread(
+        lambda: celery_app.control.inspect(timeout=min(1.0, HEALTH_CHECK_TIMEOUT)).ping()
+    )
+    if not replies:
+        raise RuntimeError("no Celery workers replied")
+    return {"workers": len(replies)}
+
+
+async def probe_testlink() -> Dict[str, Any]:
+    from .result_reporter import get_testlink_client
+
+    # Свой клиент с таймаутом сокета HEALTH_CHECK_TIMEOUT: поток пробы не висит дольше неё
+    about = await _in_probe_thread(lambda: get_testlink_client(HEALTH_CHECK_TIMEOUT).about())
+    return {"version": str(about)[:100]}
+
+
+async def probe_openqa() -> Dict[str, Any]:
+    from .openqa_client import get_openqa_client
+
+    await _in_probe_thread(get_openqa_client().list_jobs, HEALTH_CHECK_TIMEOUT, limit=1)
+    return {}
+
+
+PROBES: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]] = {
+    "database": probe_database,
+    "broker": probe_broker,
+    "celery": probe_celery,
+    "testlink": probe_testlink,
+    "openqa": probe_openqa,
+}
+
+
+class HealthMonitor:
+    """Последние результаты проб процесса API; обновляются фоновой задачей или по требованию"""
+
+    def __init__(self, probes: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]]):
+        self.probes = probes
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    async def _probe(self, name: str, probe: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(probe(), HEALTH_CHECK_TIMEOUT)
+            result = {"ok": True, **details}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timeout after {HEALTH_CHECK_TIMEOUT}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)[:300]}
+        result.update(latency_ms=round((time.perf_counter() - started) * 1000, 1),
+                      checked_at=datetime.utcnow(), _monotonic=time.monotonic())
+        health_component_up.labels(name).set(int(result["ok"]))
+        return result
+
+    async def refresh(self):
+        """Все пробы одновременно: общее время - самая медленная проба, не сумма"""
+        results = await asyncio.gather(*(self._probe(name, probe) for name, probe in self.probes.items()))
+        self.results = dict(zip(self.probes, results))
+
+    async def ensure_fresh(self):
+        """Без фоновой задачи (тесты, lifespan выключен) - одна проверка на всех ожидающих"""
+        if self._task is not None and not self._task.done() and self.results:
+            return
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self.age() is None or self.age() > HEALTH_CHECK_INTERVAL:
+                await self.refresh()
+
+    def age(self) -> Optional[float]:
+        """Возраст самого старого результата, секунд"""
+        if not self.results:
+            return None
+        return time.monotonic() - min(result["_monotonic"] for result in self.results.values())
+
+    def component(self, name: str) -> Dict[str, Any]:
+        result = self.results.get(name)
+        if result is None:
+            return {"ok": False, "error": "not checked yet"}
+        age = time.monotonic() - result["_monotonic"]
+        public = {key: value for key, value in result.items() if not key.startswith("_")}
+        if age > HEALTH_MAX_AGE:
+            public.update(ok=False, error=f"stale result ({age:.0f}s old)")
+        return {**public, "age_seconds": round(age, 1)}
+
+    def report(self) -> Dict[str, Any]:
+        """healthy - всё в порядке, degraded - лежит необязательный компонент, unhealthy - обязательный"""
+        components = {name: self.component(name) for name in self.probes}
+        required_ok = all(components[name]["ok"] for name in HEALTH_REQUIRED if name in components)
+        status = "healthy" if all(c["ok"] for c in components.values()) else "degraded" if required_ok else "unhealthy"
+        return {"status": status, "ready": required_ok, "components": components}
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Health check loop failed: %s", e)
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+monitor = HealthMonitor(PROBES)
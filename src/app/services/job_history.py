@@ -0,0 +1,202 @@
+"""История OpenQA jobs: перенос завершённых jobs из test_jobs в секционированную
+test_job_history, месячные секции, срок хранения и дневные агрегаты по кейсам.
+
+test_jobs остаётся маленькой «горячей» таблицей (активные и недавние jobs), тренды
+читаются из test_job_daily_stats.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .job_poller import FINAL_STATES
+from .result_reporter import REPORT_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Сколько дней завершённые jobs живут в test_jobs до переноса в историю
+HISTORY_HOT_DAYS = int(os.getenv("JOB_HISTORY_HOT_DAYS", "7"))
+# Сколько месяцев хранить секции истории и что делать со старыми: drop или detach
+# (отсоединённая секция остаётся обычной таблицей - её можно выгрузить pg_dump и удалить)
+HISTORY_RETENTION_MONTHS = int(os.getenv("JOB_HISTORY_RETENTION_MONTHS", "12"))
+HISTORY_RETENTION_MODE = os.getenv("JOB_HISTORY_RETENTION_MODE", "detach")
+# Секции создаются заранее на столько месяцев вперёд
+HISTORY_MONTHS_AHEAD = int(os.getenv("JOB_HISTORY_MONTHS_AHEAD", "2"))
+ARCHIVE_BATCH = int(os.getenv("JOB_HISTORY_ARCHIVE_BATCH", "10000"))
+# Агрегаты пересчитываются за последние N дней (поздно завершившиеся jobs)
+ROLLUP_LOOKBACK_DAYS = int(os.getenv("JOB_HISTORY_ROLLUP_LOOKBACK_DAYS", "2"))
+
+PARTITION_NAME = re.compile(r"^test_job_history_y(\d{4})m(\d{2})$")
+
+# Ключ секции: jobs, отменённые до старта, не имеют started_at
+_PARTITION_KEY = "coalesce(started_at, finished_at, now() at time zone 'utc')"
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"test_job_history_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_partitions(db: Session, start: date, end: date) -> List[str]:
+    """Создаёт месячные секции, покрывающие [start, end]"""
+    created = []
+    month = _month_start(start)
+    while month <= end:
+        name = partition_name(month)
+        exists = db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists is None:
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF test_job_history "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            ))
+            created.append(name)
+        month = _next_month(month)
+    db.commit()
+    return created
+
+
+def _archivable_filter() -> str:
+    final_states = ", ".join(f"'{state}'" for state in FINAL_STATES)
+    return (
+        f"openqa_status IN ({final_states}) "
+        f"AND finished_at < :cutoff "
+        # done jobs переносим после отчёта в TestLink (или когда попытки кончились)
+        f"AND (openqa_status <> 'done' OR reported_at IS NOT NULL OR report_attempts >= {REPORT_MAX_ATTEMPTS})"
+    )
+
+
+def archive_finished_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """Переносит завершённые jobs старше HISTORY_HOT_DAYS в историю (DELETE ... RETURNING → INSERT)"""
+    now = now or datetime.utcnow()
+    params = {"cutoff": now - timedelta(days=HISTORY_HOT_DAYS), "batch": ARCHIVE_BATCH}
+
+    bounds = db.execute(text(
+        f"SELECT min({_PARTITION_KEY}), max({_PARTITION_KEY}) FROM test_jobs WHERE {_archivable_filter()}"
+    ), params).one()
+    if bounds[0] is None:
+        return 0
+    ensure_partitions(db, bounds[0].date(), bounds[1].date())
+
+    moved = 0
+    while True:
+        count = db.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM test_jobs WHERE id IN (
+                    SELECT id FROM test_jobs WHERE {_archivable_filter()}
+                    ORDER BY id LIMIT :batch FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, {_PARTITION_KEY} AS started_at, testcase_id, openqa_job_id, openqa_status,
+                          openqa_result, finished_at, reported_at, testlink_execution_id
+            ), inserted AS (
+                INSERT INTO test_job_history (id, started_at, testcase_id, openqa_job_id, openqa_status,
+                                              openqa_result, finished_at, reported_at, testlink_execution_id)
+                SELECT * FROM moved
+                ON CONFLICT DO NOTHING
+            )
+            SELECT count(*) FROM moved
+        """), params).scalar()
+        db.commit()
+        moved += count
+        if count < ARCHIVE_BATCH:
+            break
+
+    logger.info("Job history: archived %d jobs", moved)
+    return moved
+
+
+def rollup_daily_stats(db: Session, since: Optional[date] = None) -> int:
+    """Пересчитывает test_job_daily_stats с даты since по завершённым jobs (горячие + история)"""
+    since = since or (datetime.utcnow().date() - timedelta(days=ROLLUP_LOOKBACK_DAYS))
+    count = db.execute(text("""
+        WITH jobs AS (
+            SELECT testcase_id, openqa_result, started_at, finished_at
+            FROM test_jobs
+            WHERE openqa_status = 'done' AND finished_at >= :since
+            UNION ALL
+            SELECT testcase_id, openqa_result, started_at, finished_at
+            FROM test_job_history
+            -- started_at - ключ секций: лишние месяцы не читаются
+            WHERE openqa_status = 'done' AND started_at >= :since - interval '1 day' AND finished_at >= :since
+        ), upserted AS (
+            INSERT INTO test_job_daily_stats (day, testcase_id, runs, passed, failed, duration_p50, duration_p95)
+            SELECT
+                finished_at::date,
+                testcase_id,
+                count(*),
+                count(*) FILTER (WHERE openqa_result = 'passed'),
+                count(*) FILTER (WHERE openqa_result = 'failed'),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY extract(epoch FROM finished_at - started_at)),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY extract(epoch FROM finished_at - started_at))
+            FROM jobs
+            GROUP BY 1, 2
+            ON CONFLICT (day, testcase_id) DO UPDATE SET
+                runs = excluded.runs,
+                passed = excluded.passed,
+                failed = excluded.failed,
+                duration_p50 = excluded.duration_p50,
+                duration_p95 = excluded.duration_p95
+            RETURNING 1
+        )
+        SELECT count(*) FROM upserted
+    """), {"since": since}).scalar()
+    db.commit()
+    return count
+
+
+def list_partitions(db: Session) -> List[str]:
+    rows = db.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'test_job_history'
+        ORDER BY child.relname
+    """))
+    return [row[0] for row in rows]
+
+
+def apply_retention(db: Session, today: Optional[date] = None) -> List[str]:
+    """Удаляет (drop) или отсоединяет (detach) секции целиком старше HISTORY_RETENTION_MONTHS"""
+    cutoff = _month_start(today or datetime.utcnow().date())
+    for _ in range(HISTORY_RETENTION_MONTHS):
+        cutoff = _month_start(cutoff - timedelta(days=1))
+
+    expired = []
+    for name in list_partitions(db):
+        match = PARTITION_NAME.match(name)
+        if not match or date(int(match[1]), int(match[2]), 1) >= cutoff:
+            continue
+        if HISTORY_RETENTION_MODE == "drop":
+            db.execute(text(f"DROP TABLE {name}"))
+        else:
+            db.execute(text(f"ALTER TABLE test_job_history DETACH PARTITION {name}"))
+        expired.append(name)
+    db.commit()
+    if expired:
+        logger.info("Job history: %s partitions %s", HISTORY_RETENTION_MODE, ", ".join(expired))
+    return expired
+
+
+def maintain_job_history(db: Session) -> Dict[str, Any]:
+    """Ежедневное обслуживание: секции вперёд, перенос, агрегаты, срок хранения"""
+    today = datetime.utcnow().date()
+    ahead = today
+    for _ in range(HISTORY_MONTHS_AHEAD):
+        ahead = _next_month(ahead)
+
+    created = ensure_partitions(db, today, ahead)
+    archived = archive_finished_jobs(db)
+    rollups = rollup_daily_stats(db)
+    expired = apply_retention(db, today)
+
+    print(f"🗄️ История jobs: перенесено {archived}, агрегатов {rollups}, "
+          f"новых секций {len(created)}, устаревших секций {len(expired)}")
+    return {"created_partitions": created, "archived": archived, "rollups": rollups, "expired_partitions": expired}
@@ -0,0 +1,295 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import requests
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models import TestCase, TestCaseStatus, TestJob
+from .bulk_ingest import chunks
+from .openqa_client import OpenQAClient, get_openqa_client
+from .dashboard_stats import invalidate_dashboard_cache
+from .test_runs import count_results
+from .live_status import publish, job_event, case_event
+
+logger = logging.getLogger(__name__)
+
+# Состояния OpenQA, после которых job больше не меняется
+FINAL_STATES = ("done", "cancelled")
+# Сколько ID отправлять в одном GET /jobs?ids=...
+POLL_CHUNK = 100
+# Результат job, которого больше нет в OpenQA (удалён / архивирован): состояние cancelled, кейс - blocked
+MISSING_RESULT = "missing"
+# Не больше стольких проверок GET /jobs/{id} за цикл: массовая чистка в OpenQA разбирается за несколько циклов
+MISSING_CHECKS_PER_POLL = int(os.getenv("OPENQA_MISSING_CHECKS_PER_POLL", "50"))
+
+# Адаптивный опрос: интервал удваивается, пока job не меняется, но не больше
+# ожидаемой длительности кейса (и не позже ожидаемого окончания)
+POLL_MIN_INTERVAL = int(os.getenv("OPENQA_POLL_MIN_INTERVAL", "30"))
+POLL_MAX_INTERVAL = int(os.getenv("OPENQA_POLL_MAX_INTERVAL", "1800"))
+DEFAULT_EXPECTED_DURATION = int(os.getenv("OPENQA_EXPECTED_DURATION", "1800"))
+
+
+def testcase_status_for(result: Optional[str]) -> TestCaseStatus:
+    """Результат OpenQA → статус тест-кейса"""
+    return (
+        TestCaseStatus.PASSED if result == "passed"
+        else TestCaseStatus.FAILED if result == "failed"
+        else TestCaseStatus.BLOCKED
+    )
+
+
+def combined_status(results: Iterable[Optional[str]]) -> TestCaseStatus:
+    """Статус кейса по нескольким ячейкам матрицы: хуже всех"""
+    statuses = {testcase_status_for(result) for result in results}
+    for status in (TestCaseStatus.FAILED, TestCaseStatus.BLOCKED):
+        if status in statuses:
+            return status
+    return TestCaseStatus.PASSED
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value.rstrip("Z")) if value else None
+
+
+def fetch_job_states(job_ids: Iterable[str], client: Optional[OpenQAClient] = None) -> Dict[str, Dict[str, Any]]:
+    """Состояния многих jobs через GET /jobs?ids=... (POLL_CHUNK ID за запрос)"""
+    client = client or get_openqa_client()
+    states = {}
+    for chunk in chunks(list(job_ids), POLL_CHUNK):
+        for job in client.list_jobs(ids=",".join(str(job_id) for job_id in chunk)):
+            states[str(job["id"])] = job
+    return states
+
+
+def resolve_missing_jobs(states: Dict[str, Dict[str, Any]], job_ids: Iterable[str],
+                         client: Optional[OpenQAClient] = None) -> Dict[str, Dict[str, Any]]:
+    """Jobs, которых нет в ответе GET /jobs?ids=, проверяются по одному через GET /jobs/{id}.
+
+    404 - job удалён: cancelled с результатом MISSING_RESULT, иначе он опрашивался бы вечно и
+    занимал место в лимите активных jobs. Прочие ошибки - job остаётся в расписании.
+    """
+    client = client or get_openqa_client()
+    missing = [job_id for job_id in job_ids if job_id not in states]
+    for job_id in missing[:MISSING_CHECKS_PER_POLL]:
+        try:
+            states[job_id] = client.get_job(job_id)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                logger.warning("OpenQA job %s no longer exists, marking it cancelled", job_id)
+                states[job_id] = {"id": job_id, "state": "cancelled", "result": MISSING_RESULT}
+            else:
+                logger.warning("OpenQA job %s check failed: %s", job_id, e)
+        except requests.RequestException as e:
+            logger.warning("OpenQA job %s check failed: %s", job_id, e)
+    return states
+
+
+def launch_cells(db: Session, launches: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], Dict[int, Tuple]]:
+    """Все ячейки запусков матрицы: (testcase_id, launch_id) → {TestJob.id: (состояние, результат)}"""
+    launches = set(launches)
+    cells = defaultdict(dict)
+    for chunk in chunks(list(launches), 1000):
+        rows = db.query(
+            TestJob.id, TestJob.testcase_id, TestJob.launch_id, TestJob.openqa_status, TestJob.openqa_result
+        ).filter(
+            TestJob.launch_id.in_({launch_id for _, launch_id in chunk}),
+            TestJob.testcase_id.in_({testcase_id for testcase_id, _ in chunk}),
+        )
+        for row in rows:
+            if (row.testcase_id, row.launch_id) in launches:
+                cells[(row.testcase_id, row.launch_id)][row.id] = (row.openqa_status, row.openqa_result)
+    return cells
+
+
+def apply_job_states(db: Session, states: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Пишет только изменившиеся jobs (и статусы их кейсов) одной транзакцией.
+
+    Статус кейса из матрицы - худший результат всех ячеек его запуска (launch_id), включая
+    завершившиеся в прошлых циклах; пока хоть одна ячейка идёт, кейс остаётся RUNNING.
+    Возвращает [{"testcase_id", "job"}] для jobs, которые в этом вызове перешли в финальное состояние.
+    Переходы после коммита публикуются подписчикам живых статусов (live_status).
+    """
+    if not states:
+        return []
+
+    known = {}
+    for chunk in chunks(list(states.keys()), 1000):
+        for row in db.query(
+            TestJob.id, TestJob.testcase_id, TestJob.openqa_job_id,
+            TestJob.openqa_status, TestJob.openqa_result, TestJob.run_id, TestJob.launch_id
+        ).filter(TestJob.openqa_job_id.in_(chunk)):
+            known[row.openqa_job_id] = row
+
+    job_updates = []
+    # Новые состояния jobs пачки (TestJob.id → (состояние, результат)) поверх прочитанных из базы
+    changed = {}
+    # Кейсы, у которых в пачке завершился job: запуск матрицы или результаты одиночных jobs
+    case_launches = {}
+    case_results = defaultdict(list)
+    run_results = []
+    events = []
+    finished = []
+    for job_id, row in known.items():
+        job_data = states[job_id]
+        state = job_data.get("state")
+        result = job_data.get("result")
+        if (state, result) == (row.openqa_status, row.openqa_result):
+            continue
+
+        update = {
+            "id": row.id,
+            "openqa_status": state,
+            "openqa_result": result,
+            "started_at": _parse_ts(job_data.get("t_started")),
+            "finished_at": _parse_ts(job_data.get("t_finished")),
+        }
+        job_updates.append(update)
+        changed[row.id] = (state, result)
+        events.append(job_event(job_id, row.testcase_id, state, result, run_id=row.run_id,
+                                started_at=update["started_at"], finished_at=update["finished_at"]))
+        if state in FINAL_STATES:
+            update["next_check_at"] = None
+            if row.launch_id is not None:
+                case_launches[row.testcase_id] = row.launch_id
+            else:
+                case_results[row.testcase_id].append(result)
+            if row.openqa_status not in FINAL_STATES:
+                run_results.append((row.run_id, result))
+            finished.append({"testcase_id": row.testcase_id, "job": job_data})
+
+    cells = launch_cells(db, case_launches.items())
+    for case_id, launch_id in case_launches.items():
+        launch = {job_id: changed.get(job_id, cell) for job_id, cell in cells[(case_id, launch_id)].items()}
+        if all(state in FINAL_STATES for state, _ in launch.values()):
+            case_results[case_id] = [result for _, result in launch.values()]
+        else:
+            # Остальные ячейки запуска ещё идут - кейс остаётся RUNNING
+            case_results.pop(case_id, None)
+    case_updates = [{"id": case_id, "status": combined_status(results)} for case_id, results in case_results.items()]
+    events += [case_event(update["id"], update["status"]) for update in case_updates]
+
+    if job_updates:
+        db.bulk_update_mappings(TestJob, job_updates)
+        db.bulk_update_mappings(TestCase, case_updates)
+        # Счётчики прогонов - в той же транзакции, что и статусы jobs
+        events += count_results(db, run_results)
+        db.commit()
+        if case_updates:
+            invalidate_dashboard_cache()
+        publish(events)
+
+    logger.info("OpenQA poll: %d jobs, %d changed, %d finished", len(known), len(job_updates), len(finished))
+    return finished
+
+
+def active_job_ids(db: Session) -> List[str]:
+    """ID jobs, которые ещё не в финальном состоянии"""
+    rows = db.query(TestJob.openqa_job_id).filter(
+        TestJob.openqa_job_id.isnot(None),
+        (TestJob.openqa_status.is_(None)) | (TestJob.openqa_status.notin_(FINAL_STATES))
+    )
+    return [row.openqa_job_id for row in rows]
+
+
+def poll_active_jobs(db: Session, client: Optional[OpenQAClient] = None) -> Dict[str, Any]:
+    """Один цикл опроса: все активные jobs пачками, запись только изменившихся"""
+    job_ids = active_job_ids(db)
+    states = resolve_missing_jobs(fetch_job_states(job_ids, client), job_ids, client)
+    finished = apply_job_states(db, states)
+    return {"polled": len(job_ids), "finished": finished}
+
+
+def poll_build(db: Session, build: str, groupid: Optional[int] = None,
+               client: Optional[OpenQAClient] = None) -> Dict[str, Any]:
+    """Опрос по сборке (и группе) OpenQA одним GET /jobs?build=..."""
+    client = client or get_openqa_client()
+    params = {"build": build}
+    if groupid is not None:
+        params["groupid"] = groupid
+    states = {str(job["id"]): job for job in client.list_jobs(**params)}
+    finished = apply_job_states(db, states)
+    return {"polled": len(states), "finished": finished}
+
+
+def initial_check_at(now: Optional[datetime] = None) -> datetime:
+    """Когда впервые проверять только что созданный job"""
+    return (now or datetime.utcnow()) + timedelta(seconds=POLL_MIN_INTERVAL)
+
+
+def expected_durations(db: Session, testcase_ids: Iterable[int]) -> Dict[int, float]:
+    """Средняя длительность завершённых jobs по кейсам, секунды"""
+    duration = func.extract("epoch", TestJob.finished_at - TestJob.started_at)
+    rows = db.query(TestJob.testcase_id, func.avg(duration)).filter(
+        TestJob.testcase_id.in_(list(testcase_ids)),
+        TestJob.openqa_status == "done",
+        TestJob.started_at.isnot(None),
+        TestJob.finished_at.isnot(None),
+    ).group_by(TestJob.testcase_id)
+    return {testcase_id: float(avg) for testcase_id, avg in rows if avg}
+
+
+def next_check(
+        now: datetime,
+        interval: Optional[int],
+        changed: bool,
+        started_at: Optional[datetime],
+        expected: float
+) -> Tuple[datetime, int]:
+    """Следующая проверка job: (время, интервал в секундах)"""
+    cap = int(min(max(expected, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL))
+    if changed or not interval:
+        interval = POLL_MIN_INTERVAL
+    else:
+        interval = min(interval * 2, cap)
+
+    check_at = now + timedelta(seconds=interval)
+    if started_at:
+        eta = started_at + timedelta(seconds=expected)
+        if now < eta < check_at:
+            check_at = eta
+    return check_at, interval
+
+
+def poll_due_jobs(db: Session, client: Optional[OpenQAClient] = None) -> Dict[str, Any]:
+    """Опрос только тех активных jobs, у которых подошло время проверки (next_check_at)"""
+    now = datetime.utcnow()
+    rows = db.query(
+        TestJob.id, TestJob.testcase_id, TestJob.openqa_job_id, TestJob.openqa_status,
+        TestJob.openqa_result, TestJob.started_at, TestJob.check_interval
+    ).filter(
+        TestJob.openqa_job_id.isnot(None),
+        (TestJob.openqa_status.is_(None)) | (TestJob.openqa_status.notin_(FINAL_STATES)),
+        (TestJob.next_check_at.is_(None)) | (TestJob.next_check_at <= now),
+    ).all()
+    if not rows:
+        return {"polled": 0, "finished": []}
+
+    job_ids = [row.openqa_job_id for row in rows]
+    states = resolve_missing_jobs(fetch_job_states(job_ids, client), job_ids, client)
+    durations = expected_durations(db, {row.testcase_id for row in rows})
+
+    schedule = []
+    for row in rows:
+        job_data = states.get(row.openqa_job_id, {})
+        if job_data.get("state") in FINAL_STATES:
+            schedule.append({"id": row.id, "next_check_at": None, "check_interval": None})
+            continue
+        changed = (job_data.get("state"), job_data.get("result")) != (row.openqa_status, row.openqa_result)
+        started_at = _parse_ts(job_data.get("t_started")) or row.started_at
+        check_at, interval = next_check(
+            now, row.check_interval, changed, started_at,
+            durations.get(row.testcase_id, DEFAULT_EXPECTED_DURATION)
+        )
+        schedule.append({"id": row.id, "next_check_at": check_at, "check_interval": interval})
+
+    db.bulk_update_mappings(TestJob, schedule)
+    finished = apply_job_states(db, states)
+    db.commit()
+    return {"polled": len(rows), "finished": finished}
+
+
+def handle_job_events(db: Session, job_ids: Iterable[str], client: Optional[OpenQAClient] = None) -> List[Dict[str, Any]]:
+    """Событие OpenQA (job.done и т.п.) → одна проверка этих jobs вместо ожидания опроса"""
+    return apply_job_states(db, fetch_job_states({str(job_id) for job_id in job_ids}, client))
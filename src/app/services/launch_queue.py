@@ -0,0 +1,277 @@
+"""Очередь запусков перед OpenQA: приоритеты, чередование сьютов и лимит активных jobs.
+
+Одиночный /run и run-all-pending сначала кладут кейсы в launch_queue; диспетчер (dispatch)
+отдаёт их в OpenQA по мере освобождения мест - ферма занята, а scheduled jobs в самом
+OpenQA не копятся. Массовый прогон не задерживает одиночный запуск разработчика: у того
+выше приоритет, а внутри одного приоритета сьюты берутся по очереди. Матрица
+(batch_launcher.launch_matrix) уходит в OpenQA через /isos, но под тем же замком и только
+в свободные места (free_slots); не поместившиеся кейсы откладываются.
+"""
+import logging
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from sqlalchemy import select, delete, func, literal, or_, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..cache import TTLCache
+from ..models import LaunchQueueItem, TestCase, TestCaseStatus, TestJob
+from .openqa_client import OpenQAClient, get_openqa_client
+from .openqa_runner import DEFAULT_AXES
+from .job_poller import FINAL_STATES
+from .batch_launcher import launch_cases
+from .test_runs import count_errors
+from .live_status import publish
+from .dashboard_stats import invalidate_dashboard_cache
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = int(os.getenv("LAUNCH_PRIORITY_INTERACTIVE", "100"))
+PRIORITY_BATCH = int(os.getenv("LAUNCH_PRIORITY_BATCH", "0"))
+# Лимит активных jobs; 0 - живые воркеры OpenQA (GET /workers) + OPENQA_SCHEDULE_HEADROOM
+OPENQA_MAX_ACTIVE_JOBS = int(os.getenv("OPENQA_MAX_ACTIVE_JOBS", "0"))
+# Сколько jobs держать в scheduled сверх воркеров, чтобы освободившийся воркер не простаивал
+OPENQA_SCHEDULE_HEADROOM = int(os.getenv("OPENQA_SCHEDULE_HEADROOM", "2"))
+OPENQA_WORKERS_TTL = float(os.getenv("OPENQA_WORKERS_TTL", "60"))
+# После стольких неудачных попыток запуск убирается из очереди (кейс остаётся pending)
+LAUNCH_MAX_ATTEMPTS = int(os.getenv("LAUNCH_MAX_ATTEMPTS", "5"))
+
+OFFLINE_WORKER_STATES = ("dead", "broken")
+# Ключ pg_advisory_lock: один диспетчер на всю базу
+_DISPATCH_LOCK = 0x6C61756E
+
+capacity_cache = TTLCache(OPENQA_WORKERS_TTL)
+
+
+def parse_machine_caps(value: str) -> Dict[str, int]:
+    """"uefi=4,bios=2" → {"uefi": 4, "bios": 2}"""
+    caps = {}
+    for item in value.split(","):
+        if "=" in item:
+            machine, cap = item.split("=", 1)
+            caps[machine.strip()] = int(cap)
+    return caps
+
+
+# Лимиты по машинам (OPENQA_MACHINE_CAPS="uefi=4,bios=2"); машины без лимита - только общий
+MACHINE_CAPS = parse_machine_caps(os.getenv("OPENQA_MACHINE_CAPS", ""))
+
+
+def enqueue(db: Session, cases: List[Any], priority: int = PRIORITY_BATCH, build: Optional[str] = None,
+            reuse: str = "link", machine: Optional[str] = None, run_id: Optional[int] = None,
+            commit: bool = True) -> int:
+    """Ставит кейсы в очередь; уже стоящие получают больший из приоритетов и новые параметры"""
+    if not cases:
+        return 0
+    stmt = insert(LaunchQueueItem).values([
+        {"testcase_id": case.id, "test_suite_id": case.test_suite_id, "priority": priority,
+         "machine": machine or DEFAULT_AXES["machine"][0], "build": build, "reuse": reuse,
+         "run_id": run_id, "enqueued_at": datetime.utcnow()}
+        for case in cases
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LaunchQueueItem.testcase_id],
+        set_={
+            "priority": func.greatest(LaunchQueueItem.priority, stmt.excluded.priority),
+            "machine": stmt.excluded.machine,
+            "build": stmt.excluded.build,
+            "reuse": stmt.excluded.reuse,
+            "run_id": stmt.excluded.run_id,
+        },
+    )
+    count = db.execute(stmt).rowcount
+    if commit:
+        db.commit()
+    return count
+
+
+def enqueue_pending(db: Session, limit: int, priority: int = PRIORITY_BATCH, build: Optional[str] = None,
+                    reuse: str = "link", machine: Optional[str] = None) -> int:
+    """До limit ожидающих кейсов, которых ещё нет в очереди, - одним INSERT ... SELECT"""
+    pending = select(
+        TestCase.id, TestCase.test_suite_id, literal(priority), literal(machine or DEFAULT_AXES["machine"][0]),
+        literal(build), literal(reuse), literal(datetime.utcnow())
+    ).where(
+        TestCase.status == TestCaseStatus.PENDING,
+        ~exists().where(LaunchQueueItem.testcase_id == TestCase.id),
+    ).order_by(TestCase.id).limit(limit)
+
+    count = db.execute(
+        insert(LaunchQueueItem).from_select(
+            ["testcase_id", "test_suite_id", "priority", "machine", "build", "reuse", "enqueued_at"], pending
+        ).on_conflict_do_nothing()
+    ).rowcount
+    db.commit()
+    return count
+
+
+def farm_capacity(client: Optional[OpenQAClient] = None) -> Optional[int]:
+    """Сколько jobs может быть активно одновременно (None - OpenQA недоступен)"""
+    if OPENQA_MAX_ACTIVE_JOBS > 0:
+        return OPENQA_MAX_ACTIVE_JOBS
+
+    capacity = capacity_cache.get("workers")
+    if capacity is None:
+        try:
+            workers = (client or get_openqa_client()).list_workers()
+        except Exception as e:
+            logger.warning("OpenQA /workers failed: %s", e)
+            return None
+        online = sum(1 for worker in workers if worker.get("status") not in OFFLINE_WORKER_STATES)
+        capacity = online + OPENQA_SCHEDULE_HEADROOM if online else 0
+        capacity_cache.set("workers", capacity)
+    return capacity
+
+
+def active_jobs(db: Session) -> Dict[str, int]:
+    """Незавершённые jobs по машинам (ix_test_jobs_active)"""
+    machine = func.coalesce(TestJob.settings["MACHINE"].astext, DEFAULT_AXES["machine"][0])
+    rows = db.query(machine, func.count()).filter(
+        TestJob.openqa_job_id.isnot(None),
+        or_(TestJob.openqa_status.is_(None), TestJob.openqa_status.notin_(FINAL_STATES)),
+    ).group_by(machine).all()
+    return dict(rows)
+
+
+def free_slots(db: Session, client: Optional[OpenQAClient] = None
+               ) -> Tuple[Optional[int], Dict[str, int], int, Dict[str, int]]:
+    """(лимит, активные по машинам, свободно всего, свободно по машинам с OPENQA_MACHINE_CAPS)"""
+    capacity = farm_capacity(client)
+    active = active_jobs(db)
+    free = (capacity or 0) - sum(active.values())
+    machine_free = {machine: cap - active.get(machine, 0) for machine, cap in MACHINE_CAPS.items()}
+    return capacity, active, free, machine_free
+
+
+@contextmanager
+def dispatch_lock(db: Session) -> Iterator[bool]:
+    """Один запускающий в OpenQA на всю базу (pg_try_advisory_lock); False - занято другим"""
+    with db.get_bind().connect() as lock_conn:
+        locked = lock_conn.execute(select(func.pg_try_advisory_lock(_DISPATCH_LOCK))).scalar()
+        try:
+            yield locked
+        finally:
+            if locked:
+                lock_conn.execute(select(func.pg_advisory_unlock(_DISPATCH_LOCK)))
+
+
+def fair_candidates(db: Session, limit: int, skip_machines: List[str],
+                    testcase_ids: Optional[List[int]] = None) -> List[Any]:
+    """Следующие запуски: по приоритету, а внутри приоритета - по кругу между сьютами"""
+    turn = func.row_number().over(
+        partition_by=(LaunchQueueItem.priority, LaunchQueueItem.test_suite_id),
+        order_by=LaunchQueueItem.id,
+    ).label("turn")
+    ranked = select(
+        LaunchQueueItem.id, LaunchQueueItem.testcase_id, LaunchQueueItem.priority, LaunchQueueItem.machine,
+        LaunchQueueItem.build, LaunchQueueItem.reuse, LaunchQueueItem.run_id, turn
+    )
+    if skip_machines:
+        ranked = ranked.where(LaunchQueueItem.machine.notin_(skip_machines))
+    if testcase_ids is not None:
+        ranked = ranked.where(LaunchQueueItem.testcase_id.in_(testcase_ids))
+    ranked = ranked.subquery()
+    return db.execute(
+        select(ranked).order_by(ranked.c.priority.desc(), ranked.c.turn, ranked.c.id).limit(limit)
+    ).all()
+
+
+def dispatch(db: Session, client: Optional[OpenQAClient] = None,
+             testcase_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Отдаёт в OpenQA столько запусков из очереди, сколько есть свободных мест.
+
+    Параллельные вызовы (beat, /run) не превышают лимит: работает один диспетчер,
+    остальные сразу выходят (pg_try_advisory_lock). testcase_ids - только эти кейсы
+    (одиночный /run не запускает в своём запросе чужую очередь).
+    """
+    with dispatch_lock(db) as locked:
+        if not locked:
+            return {"launched": 0, "linked": 0, "failed": 0, "busy": True, "results": []}
+        return _dispatch(db, client, testcase_ids)
+
+
+def _dispatch(db: Session, client: Optional[OpenQAClient], testcase_ids: Optional[List[int]]) -> Dict[str, Any]:
+    capacity, active, free, machine_free = free_slots(db, client)
+    summary = {"launched": 0, "linked": 0, "failed": 0, "capacity": capacity, "active": active, "results": []}
+    if free <= 0:
+        return summary
+
+    full = [machine for machine, left in machine_free.items() if left <= 0]
+
+    batch = []
+    # С запасом: часть кандидатов может упереться в лимит своей машины
+    for item in fair_candidates(db, free * 2, full, testcase_ids):
+        if len(batch) >= free:
+            break
+        if item.machine in machine_free:
+            if machine_free[item.machine] <= 0:
+                continue
+            machine_free[item.machine] -= 1
+        batch.append(item)
+    if not batch:
+        return summary
+
+    cases = {case.id: case for case in db.query(
+        TestCase.id, TestCase.testcase_number, TestCase.name, TestCase.content_hash
+    ).filter(TestCase.id.in_([item.testcase_id for item in batch]))}
+
+    groups = defaultdict(list)
+    for item in batch:
+        groups[(item.build, item.reuse, item.machine, item.run_id)].append(item)
+
+    failed = []
+    for (build, reuse, machine, run_id), items in groups.items():
+        result = launch_cases(db, [cases[item.testcase_id] for item in items], None, build, reuse, machine, run_id,
+                              commit=False)
+        errors = {r["testcase_number"] for r in result["results"] if "error" in r}
+        group_failed = [item.id for item in items if cases[item.testcase_id].testcase_number in errors]
+        # Строки очереди снимаются в транзакции запуска группы: падение между группами
+        # не оставит в очереди уже запущенные кейсы (повторный запуск - второй job)
+        events = result["events"] + _settle(
+            db, [item.id for item in items if item.id not in group_failed], group_failed
+        )
+        db.commit()
+        invalidate_dashboard_cache()
+        publish(events)
+        failed += group_failed
+        summary["launched"] += result["launched"]
+        summary["linked"] += result["linked"]
+        summary["results"] += result["results"]
+
+    summary["failed"] = len(failed)
+    print(f"📬 Очередь запусков: отдано {summary['launched']}, переиспользовано {summary['linked']}, "
+          f"ошибок {len(failed)}, мест {capacity}, активно {sum(active.values())}")
+    return summary
+
+
+def _settle(db: Session, done: List[int], failed: List[int]) -> List[Dict[str, Any]]:
+    """Запущенные - из очереди; неудачным +1 попытка, после LAUNCH_MAX_ATTEMPTS - тоже из очереди"""
+    db.query(LaunchQueueItem).filter(LaunchQueueItem.id.in_(done)).delete(synchronize_session=False)
+    if not failed:
+        return []
+    db.query(LaunchQueueItem).filter(LaunchQueueItem.id.in_(failed)).update(
+        {LaunchQueueItem.attempts: LaunchQueueItem.attempts + 1}, synchronize_session=False
+    )
+    dropped = db.execute(
+        delete(LaunchQueueItem).where(
+            LaunchQueueItem.id.in_(failed), LaunchQueueItem.attempts >= LAUNCH_MAX_ATTEMPTS
+        ).returning(LaunchQueueItem.run_id)
+    ).scalars().all()
+    if not dropped:
+        return []
+    logger.warning("Launch queue: dropped %d launches after %d attempts", len(dropped), LAUNCH_MAX_ATTEMPTS)
+    return count_errors(db, dropped)
+
+
+def queue_status(db: Session) -> Dict[str, Any]:
+    """Размер очереди по приоритетам и загрузка OpenQA"""
+    by_priority = dict(db.query(LaunchQueueItem.priority, func.count()).group_by(LaunchQueueItem.priority).all())
+    return {
+        "queued": sum(by_priority.values()),
+        "by_priority": by_priority,
+        "capacity": farm_capacity(),
+        "active": active_jobs(db),
+        "machine_caps": MACHINE_CAPS,
+    }
@@ -0,0 +1,214 @@
+"""Живые статусы jobs, кейсов и прогонов: pub/sub вместо опроса OpenQA каждым наблюдателем.
+
+Переходы статусов публикуются там, где они пишутся в базу (apply_job_states, launch_cases,
+test_runs), одним сообщением на пачку в канал Redis LIVE_STATUS_CHANNEL. Каждый процесс API
+держит одну подписку (LiveStatusHub, открывается при старте) и раздаёт события своим SSE-клиентам -
+сколько бы их ни было, OpenQA опрашивается только поллером. Без Redis (или без пакета redis) события ходят
+внутри процесса - этого хватает, когда API и поллер в одном процессе (локальный запуск).
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_BROKER = os.getenv("CELERY_BROKER", "redis://localhost:6379/0")
+LIVE_STATUS_REDIS_URL = os.getenv("LIVE_STATUS_REDIS_URL", _BROKER if _BROKER.startswith("redis") else "")
+LIVE_STATUS_CHANNEL = os.getenv("LIVE_STATUS_CHANNEL", "testlink-openqa:status")
+# Раз в столько секунд SSE-клиенту уходит комментарий, чтобы прокси не рвали тихое соединение
+LIVE_STATUS_HEARTBEAT = float(os.getenv("LIVE_STATUS_HEARTBEAT", "15"))
+# Событий в буфере клиента; медленный клиент теряет самые старые (важен последний статус)
+LIVE_STATUS_QUEUE_SIZE = int(os.getenv("LIVE_STATUS_QUEUE_SIZE", "100"))
+# Сколько SSE-поток ждёт подтверждения подписки на канал перед снимком (Redis недоступен - не дольше)
+LIVE_STATUS_SUBSCRIBE_TIMEOUT = float(os.getenv("LIVE_STATUS_SUBSCRIBE_TIMEOUT", "2"))
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - без redis только внутрипроцессная доставка
+    redis = aioredis = None
+
+_publisher = None
+_publisher_pid = None
+
+
+def _redis_enabled() -> bool:
+    return bool(LIVE_STATUS_REDIS_URL) and redis is not None
+
+
+def _get_publisher():
+    """Свой клиент Redis в каждом процессе (воркеры Celery форкаются)"""
+    global _publisher, _publisher_pid
+    if _publisher is None or _publisher_pid != os.getpid():
+        _publisher = redis.Redis.from_url(LIVE_STATUS_REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+        _publisher_pid = os.getpid()
+    return _publisher
+
+
+def event_topics(event: Dict[str, Any]) -> List[str]:
+    """Темы, на которые подписываются клиенты: job:<id>, case:<testcase_id>, run:<id>"""
+    kind = event.get("type")
+    if kind == "job":
+        return [f"job:{event['openqa_job_id']}", f"case:{event['testcase_id']}"]
+    if kind == "case":
+        return [f"case:{event['testcase_id']}"]
+    if kind == "run":
+        return [f"run:{event['id']}"]
+    return []
+
+
+def job_event(openqa_job_id: str, testcase_id: int, state: Optional[str], result: Optional[str] = None,
+              **extra: Any) -> Dict[str, Any]:
+    return {"type": "job", "openqa_job_id": str(openqa_job_id), "testcase_id": testcase_id,
+            "state": state, "result": result, **extra}
+
+
+def case_event(testcase_id: int, status: Any) -> Dict[str, Any]:
+    return {"type": "case", "testcase_id": testcase_id, "status": getattr(status, "value", status)}
+
+
+def dashboard_event() -> Dict[str, Any]:
+    """Счётчики дашборда устарели: процессы API сбрасывают свой кеш"""
+    return {"type": "dashboard"}
+
+
+def publish(events: List[Dict[str, Any]]):
+    """Публикует пачку событий после коммита; ошибки доставки не ломают запись статусов"""
+    if not events:
+        return
+    if not _redis_enabled():
+        hub.deliver_threadsafe(events)
+        return
+    try:
+        _get_publisher().publish(LIVE_STATUS_CHANNEL, json.dumps(events, default=str))
+    except Exception as e:
+        logger.warning("Live status publish failed (%d events): %s", len(events), e)
+
+
+class LiveStatusHub:
+    """Подписчики процесса API по темам; одна подписка на Redis на весь процесс"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        # Установлен, пока Redis подтвердил SUBSCRIBE и соединение не оборвалось
+        self._subscribed: Optional[asyncio.Event] = None
+
+    def start(self):
+        """Подписка на канал Redis (при старте API; вызывать из event loop)"""
+        self._loop = asyncio.get_running_loop()
+        if self._subscribed is None:
+            self._subscribed = asyncio.Event()
+        if _redis_enabled() and (self._listener is None or self._listener.done()):
+            self._listener = self._loop.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def ready(self) -> bool:
+        """Ждёт подтверждения SUBSCRIBE: события после него уже не пройдут мимо процесса"""
+        self.start()
+        if not _redis_enabled():
+            return True
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), LIVE_STATUS_SUBSCRIBE_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Live status channel is not subscribed after %ss", LIVE_STATUS_SUBSCRIBE_TIMEOUT)
+            return False
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @contextmanager
+    def subscribe(self, topic: str) -> Iterator[asyncio.Queue]:
+        """Очередь событий темы (вызывать из event loop API)"""
+        self.start()
+        queue = asyncio.Queue(maxsize=LIVE_STATUS_QUEUE_SIZE)
+        self._subscribers[topic].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[topic].discard(queue)
+            if not self._subscribers[topic]:
+                del self._subscribers[topic]
+
+    def deliver(self, events: List[Dict[str, Any]]):
+        for event in events:
+            if event.get("type") == "dashboard":
+                from .dashboard_stats import dashboard_cache
+
+                dashboard_cache.invalidate()
+                continue
+            for topic in event_topics(event):
+                for queue in self._subscribers.get(topic, ()):
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(event)
+
+    def deliver_threadsafe(self, events: List[Dict[str, Any]]):
+        """Доставка из синхронного кода (поток эндпоинта, задача Celery в том же процессе)"""
+        if self._loop is not None and not self._loop.is_closed() and self._subscribers:
+            self._loop.call_soon_threadsafe(self.deliver, events)
+
+    async def _listen(self):
+        """Читает канал Redis, пока есть процесс; при обрыве переподключается"""
+        while True:
+            client = aioredis.from_url(LIVE_STATUS_REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(LIVE_STATUS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.deliver(json.loads(message["data"]))
+                        elif message["type"] == "subscribe":
+                            self._subscribed.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Live status subscription lost: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                self._subscribed.clear()
+                await client.aclose()
+
+
+hub = LiveStatusHub()
+
+
+def sse_message(event: Dict[str, Any]) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def sse_stream(topic: str, load_snapshot, is_final) -> AsyncIterator[str]:
+    """Текущее состояние, затем переходы, пока объект не придёт в финальное состояние.
+
+    Подписка оформляется (и подтверждается Redis) до чтения состояния - переход между ними не потеряется.
+    """
+    with hub.subscribe(topic) as queue:
+        await hub.ready()
+        snapshot = await load_snapshot()
+        yield sse_message(snapshot)
+        if is_final(snapshot):
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_STATUS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield sse_message(event)
+            if is_final(event):
+                return
+
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .. import tracing
+from ..metrics import DEFAULT_BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+
+OPENQA_URL = os.getenv("OPENQA_URL", "http://openqa/api/v1")
+OPENQA_TIMEOUT = float(os.getenv("OPENQA_TIMEOUT", "10"))
+OPENQA_RETRIES = int(os.getenv("OPENQA_RETRIES", "3"))
+OPENQA_BACKOFF = float(os.getenv("OPENQA_BACKOFF", "0.5"))
+OPENQA_POOL_SIZE = int(os.getenv("OPENQA_POOL_SIZE", "20"))
+OPENQA_VERIFY_SSL = os.getenv("OPENQA_VERIFY_SSL", "false").lower() == "true"
+
+# /jobs/123 → /jobs/{id}, чтобы метрики не разъезжались по ID
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+openqa_request_seconds = Histogram(
+    "openqa_request_duration_seconds", "Время вызова OpenQA REST API (с ретраями)",
+    ("method", "endpoint", "status"), buckets=DEFAULT_BUCKETS,
+)
+
+
+class OpenQAClient:
+    """Общий клиент OpenQA REST API: keep-alive пул, таймауты, ретраи с backoff, гистограмма Prometheus"""
+
+    def __init__(
+            self,
+            base_url: str = OPENQA_URL,
+            timeout: float = OPENQA_TIMEOUT,
+            retries: int = OPENQA_RETRIES,
+            backoff_factor: float = OPENQA_BACKOFF,
+            pool_size: int = OPENQA_POOL_SIZE,
+            verify: bool = OPENQA_VERIFY_SSL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.verify = verify
+
+        # Ошибки соединения ретраим всегда, 5xx и обрывы чтения - только для идемпотентных
+        # методов: повтор POST /jobs после 5xx может создать второй job
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """HTTP-вызов к OpenQA, возвращает распарсенный JSON (HTTPError на 4xx/5xx)"""
+        endpoint = _ID_SEGMENT.sub('/{id}', path)
+        started = time.perf_counter()
+        status = "error"
+        with tracing.span(f"openqa {method} {endpoint}", "client", **{"http.method": method, "http.url": path}) as span:
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    timeout=timeout or self.timeout,
+                    verify=self.verify,
+                    **kwargs
+                )
+                status = str(response.status_code)
+                if span is not None:
+                    span.set_attribute("http.status_code", response.status_code)
+                response.raise_for_status()
+                return response.json()
+            finally:
+                elapsed = time.perf_counter() - started
+                openqa_request_seconds.labels(method, endpoint, status).observe(elapsed)
+                logger.debug("OpenQA %s %s %.3fs%s", method, path, elapsed,
+                             "" if status.startswith("2") else " (error)")
+
+    def get_job(self, job_id, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """GET /jobs/{id}; OpenQA оборачивает ответ в {"job": {...}}"""
+        data = self.request("GET", f"/jobs/{job_id}", timeout=timeout)
+        return data.get("job", data)
+
+    def list_jobs(self, timeout: Optional[float] = None, **params) -> list:
+        """GET /jobs с фильтрами OpenQA (ids, build, groupid, limit, ...)"""
+        return self.request("GET", "/jobs", timeout=timeout, params=params).get("jobs", [])
+
+    def create_job(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """POST /jobs, возвращает ID нового job"""
+        job_id = self.request("POST", "/jobs", timeout=timeout, json=payload)["id"]
+        # Событие в span задачи / запроса: по ID job в OpenQA находится трасса, которая его создала
+        tracing.add_event("openqa.job_created", **{"openqa.job_id": job_id, "openqa.test": payload.get("TEST") or payload.get("test")})
+        return job_id
+
+    def restart_job(self, job_id, timeout: Optional[float] = None) -> str:
+        """POST /jobs/{id}/restart, возвращает ID клона; ответ OpenQA: {"result": [{"<id>": <clone_id>}]}"""
+        data = self.request("POST", f"/jobs/{job_id}/restart", timeout=timeout)
+        clone = data["result"][0]
+        clone_id = str(next(iter(clone.values())) if isinstance(clone, dict) else clone)
+        tracing.add_event("openqa.job_cloned", **{"openqa.job_id": clone_id, "openqa.clone_of": job_id})
+        return clone_id
+
+    def list_workers(self, timeout: Optional[float] = None) -> list:
+        """GET /workers: воркеры OpenQA со статусом (idle / running / dead / broken ...)"""
+        return self.request("GET", "/workers", timeout=timeout).get("workers", [])
+
+    def schedule_iso(self, settings: Dict[str, Any], timeout: Optional[float] = None) -> list:
+        """POST /isos: задания по шаблонам продукта (DISTRI/VERSION/FLAVOR/ARCH), возвращает ID jobs"""
+        return self.request("POST", "/isos", timeout=timeout, data=settings).get("ids", [])
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOpenQAClient:
+    """asyncio-вариант: те же вызовы в пуле потоков поверх общего keep-alive пула OpenQAClient"""
+
+    def __init__(self, client: Optional[OpenQAClient] = None):
+        self.client = client or get_openqa_client()
+
+    async def request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        return await asyncio.to_thread(self.client.request, method, path, timeout, **kwargs)
+
+    async def get_job(self, job_id, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.client.get_job, job_id, timeout)
+
+    async def list_jobs(self, timeout: Optional[float] = None, **params) -> list:
+        return await asyncio.to_thread(self.client.list_jobs, timeout, **params)
+
+    async def restart_job(self, job_id, timeout: Optional[float] = None) -> str:
+        return await asyncio.to_thread(self.client.restart_job, job_id, timeout)
+
+    async def schedule_iso(self, settings: Dict[str, Any], timeout: Optional[float] = None) -> list:
+        return await asyncio.to_thread(self.client.schedule_iso, settings, timeout)
+
+    async def create_job(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        return await asyncio.to_thread(self.client.create_job, payload, timeout)
+
+
+_client: Optional[OpenQAClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_openqa_client() -> OpenQAClient:
+    """Один клиент на процесс (после fork воркера Celery создаётся заново - сокеты не делим)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = OpenQAClient()
+            _client_pid = os.getpid()
+        return _client
@@ -1,58 +1,145 @@
-import requests
+import itertools
+import json
 import os
-import time
-from sqlalchemy.orm import Session
-from ..models import TestCase, TestCaseStatus, TestJob
+import re
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+from .openqa_client import OpenQAClient, get_openqa_client
 
-OPENQA_URL = os.getenv("OPENQA_URL", "http://openqa/api/v1")
+# Оси матрицы по умолчанию - прежняя единственная конфигурация запуска
+DEFAULT_AXES = {
+    "distri": ["ALT"],
+    "version": ["p10"],
+    "flavor": ["Server"],
+    "arch": ["x86_64"],
+    "machine": ["uefi"],
+    "iso": "ALT-latest.iso",  # шаблон: ALT-{version}-{flavor}-{arch}.iso
+}
+# Оси, определяющие продукт OpenQA: один POST /isos на продукт
+PRODUCT_AXES = ("distri", "version", "flavor", "arch")
+# Настройка job с шагами кейса (JSON из test_cases.steps, без HTML); пусто - шаги не передаются
+OPENQA_STEPS_SETTING = os.getenv("OPENQA_STEPS_SETTING", "TESTLINK_STEPS")
+# OpenQA принимает в TEST только [A-Za-z0-9_], а запятая в /isos ещё и разделяет тесты
+_UNSAFE_TEST_CHARS = re.compile(r"[^A-Za-z0-9_]+")
+TEST_SLUG_MAX = 60
 
 
-def create_openqa_job(test_name: str, testcase_id: int) -> str:
-    """Создает job в OpenQA"""
+def test_name_for(test_name: Optional[str], testcase_id: int) -> str:
+    """TEST job: testlink_<имя>_<id>, из имени - только [A-Za-z0-9_] (кириллица, пробелы, запятые → «_»)"""
+    slug = _UNSAFE_TEST_CHARS.sub("_", test_name or "").strip("_")[:TEST_SLUG_MAX].rstrip("_")
+    return f"testlink_{slug}_{testcase_id}" if slug else f"testlink_{testcase_id}"
+
+
+def steps_setting(steps: List[Dict[str, Any]]) -> str:
+    """Шаги кейса для настройки OPENQA_STEPS_SETTING: компактный JSON"""
+    return json.dumps(steps, ensure_ascii=False, separators=(",", ":"))
+
+
+def default_cell() -> Dict[str, str]:
+    return {axis: DEFAULT_AXES[axis][0] for axis in PRODUCT_AXES + ("machine",)}
+
+
+def cell_settings(cell: Dict[str, str], iso: str, build: Optional[str] = None) -> Dict[str, Any]:
+    """Настройки OpenQA ячейки (как их вернёт GET /jobs) - по ним же считается ключ результата"""
+    settings = {axis.upper(): cell[axis] for axis in PRODUCT_AXES + ("machine",)}
+    settings["ISO"] = iso.format(**cell)
+    if build:
+        settings["BUILD"] = build
+    return settings
+
+
+def create_openqa_job(test_name: str, testcase_id: int, build: Optional[str] = None,
+                      machine: Optional[str] = None, steps: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Создает job в OpenQA; steps - в настройку OPENQA_STEPS_SETTING (тест читает её через get_var)"""
     payload = {
-        "iso": "ALT-latest.iso",
-        "distri": "ALT",
-        "version": "p10",
-        "flavor": "Server",
-        "arch": "x86_64",
-        "test": f"testlink_{test_name}_{testcase_id}",
-        "machine": "uefi"
+        "iso": DEFAULT_AXES["iso"],
+        "distri": DEFAULT_AXES["distri"][0],
+        "version": DEFAULT_AXES["version"][0],
+        "flavor": DEFAULT_AXES["flavor"][0],
+        "arch": DEFAULT_AXES["arch"][0],
+        "test": test_name_for(test_name, testcase_id),
+        "machine": machine or DEFAULT_AXES["machine"][0]
     }
+    if build:
+        payload["build"] = build
+    if steps and OPENQA_STEPS_SETTING:
+        payload[OPENQA_STEPS_SETTING] = steps_setting(steps)
+
+    return get_openqa_client().create_job(payload, timeout=10)
+
+
+def expand_matrix(axes: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Все ячейки матрицы: декартово произведение осей (пропущенные оси - из DEFAULT_AXES)"""
+    axes = {**DEFAULT_AXES, **(axes or {})}
+    names = PRODUCT_AXES + ("machine",)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
 
-    response = requests.post(
-        f"{OPENQA_URL}/jobs",
-        json=payload,
-        verify=False,
-        timeout=10
-    )
-    response.raise_for_status()
-    return response.json()['id']
-
-
-def update_job_status(job_id: str, testcase_id: int, db: Session):
-    """Фоновое обновление статуса job"""
-    time.sleep(5)  # Даем job запуститься
-
-    resp = requests.get(f"{OPENQA_URL}/jobs/{job_id}", verify=False)
-    job_data = resp.json()
-
-    testcase = db.query(TestCase).filter(TestCase.id == testcase_id).first()
-    test_job = db.query(TestJob).filter(TestJob.openqa_job_id == job_id).first()
-
-    if test_job:
-        test_job.openqa_status = job_data.get("state")
-        test_job.openqa_result = job_data.get("result")
-        test_job.started_at = job_data.get("t_started")
-        test_job.finished_at = job_data.get("t_finished")
-
-        # Обновляем статус тест-кейса
-        state = job_data.get("state")
-        if state == "done":
-            result = job_data.get("result", "none")
-            testcase.status = (
-                TestCaseStatus.PASSED if result == "passed"
-                else TestCaseStatus.FAILED if result == "failed"
-                else TestCaseStatus.BLOCKED
-            )
-
-        db.commit()
+
+def matrix_cells(cases: List[Tuple[int, str, Optional[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """(testcase_id, name, axes) → ячейки {"testcase_id", "name", "cell", "iso"}"""
+    return [
+        {
+            "testcase_id": testcase_id,
+            "name": name,
+            "cell": cell,
+            "iso": {**DEFAULT_AXES, **(axes or {})}["iso"].format(**cell),
+        }
+        for testcase_id, name, axes in cases
+        for cell in expand_matrix(axes)
+    ]
+
+
+def group_cells(cells: List[Dict[str, Any]],
+                steps: Optional[Dict[int, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+    """Ячейки → вызовы /isos: продукт + набор машин → список TEST.
+
+    Кейсы с одинаковыми машинами в одном продукте уходят одним вызовом; разные наборы
+    машин не смешиваются, чтобы не запустить лишние ячейки. Настройки /isos общие для всех
+    TEST вызова, поэтому кейс с шагами (steps, OPENQA_STEPS_SETTING) - отдельным вызовом.
+    """
+    steps = steps if OPENQA_STEPS_SETTING else {}
+    machines = defaultdict(set)
+    for item in cells:
+        product = tuple(item["cell"][a] for a in PRODUCT_AXES)
+        machines[(item["testcase_id"], item["name"], product, item["iso"])].add(item["cell"]["machine"])
+
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for (testcase_id, name, product, iso), case_machines in machines.items():
+        case_steps = (steps or {}).get(testcase_id)
+        key = (product, iso, tuple(sorted(case_machines)), testcase_id if case_steps else None)
+        group = groups.setdefault(key, {
+            "product": dict(zip(PRODUCT_AXES, product)),
+            "iso": iso,
+            "machines": list(key[2]),
+            "tests": {},
+        })
+        if case_steps:
+            group["steps"] = case_steps
+        group["tests"][test_name_for(name, testcase_id)] = testcase_id
+    return list(groups.values())
+
+
+def group_matrix(cases: List[Tuple[int, str, Optional[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    return group_cells(matrix_cells(cases))
+
+
+def schedule_group(group: Dict[str, Any], build: Optional[str] = None,
+                   client: Optional[OpenQAClient] = None) -> List[int]:
+    """Один POST /isos на группу: все TEST × MACHINE продукта"""
+    client = client or get_openqa_client()
+    settings = {
+        "DISTRI": group["product"]["distri"],
+        "VERSION": group["product"]["version"],
+        "FLAVOR": group["product"]["flavor"],
+        "ARCH": group["product"]["arch"],
+        "ISO": group["iso"],
+        "TEST": ",".join(group["tests"]),
+        "MACHINE": ",".join(group["machines"]),
+        # Иначе каждый следующий вызов для того же продукта отменит jobs предыдущего
+        "_NO_OBSOLETE": 1,
+    }
+    if build:
+        settings["BUILD"] = build
+    if group.get("steps") and OPENQA_STEPS_SETTING:
+        settings[OPENQA_STEPS_SETTING] = steps_setting(group["steps"])
+    return client.schedule_iso(settings, timeout=60)
@@ -0,0 +1,64 @@
+"""Повторное использование результатов OpenQA: тот же кейс (content_hash), та же сборка ISO
+и те же настройки машины не дают нового ответа - вместо нового job берём готовый результат.
+
+Режимы запуска (reuse):
+    link  - привязать найденный завершённый job, ничего не запускать (по умолчанию)
+    clone - перезапустить найденный job (POST /jobs/{id}/restart), настройки не собираем заново
+    never - всегда новый job
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, Optional
+from sqlalchemy.orm import Session
+from ..models import TestJob
+from .openqa_client import OpenQAClient, get_openqa_client
+
+REUSE_MODES = ("link", "clone", "never")
+# Настройки job, от которых зависит результат
+KEY_SETTINGS = ("DISTRI", "VERSION", "FLAVOR", "ARCH", "MACHINE", "ISO", "BUILD")
+# Только однозначные результаты; incomplete / user_cancelled и т.п. запускаем заново
+REUSABLE_RESULTS = ("passed", "failed", "softfailed")
+# Результат старше этого не переиспользуем, секунды
+RESULT_REUSE_MAX_AGE = int(os.getenv("OPENQA_RESULT_REUSE_MAX_AGE", "86400"))
+
+
+def result_key(testcase_id: int, content_hash: Optional[str], settings: Dict[str, Any]) -> Optional[str]:
+    """sha256 от (кейс, содержимое кейса, сборка ISO, машина); None - ключа нет, переиспользовать нельзя.
+
+    Без BUILD имя ISO (ALT-latest.iso) не говорит, какой образ реально тестировался.
+    """
+    if not content_hash or not settings.get("BUILD"):
+        return None
+    payload = json.dumps(
+        [testcase_id, content_hash, {name: settings.get(name) for name in KEY_SETTINGS}],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def find_reusable(db: Session, keys: Iterable[Optional[str]], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Последний завершённый job с однозначным результатом для каждого ключа (ix_test_jobs_result_key)"""
+    keys = [key for key in set(keys) if key]
+    if not keys:
+        return {}
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=RESULT_REUSE_MAX_AGE)
+    rows = db.query(
+        TestJob.result_key, TestJob.openqa_job_id, TestJob.openqa_result, TestJob.finished_at
+    ).filter(
+        TestJob.result_key.in_(keys),
+        TestJob.openqa_status == "done",
+        TestJob.openqa_result.in_(REUSABLE_RESULTS),
+        TestJob.finished_at >= cutoff,
+    ).order_by(TestJob.finished_at.desc())
+
+    hits = {}
+    for row in rows:
+        hits.setdefault(row.result_key, row)
+    return hits
+
+
+def clone_job(openqa_job_id: str, client: Optional[OpenQAClient] = None) -> str:
+    """Перезапуск найденного job в OpenQA (клон с теми же настройками и ассетами)"""
+    return (client or get_openqa_client()).restart_job(openqa_job_id)
@@ -1,93 +1,282 @@
 import testlink
 import os
-import requests
-import json
+import threading
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
-from ..models import TestCase, TestJob, TestCaseStatus
-from ..database import get_db_session
+from .. import tracing
+from ..cache import TTLCache
+from ..models import TestCase, TestJob
+from .bulk_ingest import chunks
+from .openqa_client import OPENQA_URL
+from .testlink_sync import TESTLINK_PREFIX, TESTLINK_TIMEOUT, connect_testlink, find_project
+from .test_runs import reconcile_runs, completed_runs, finish_run_report
 
+# Куда отчитываться: без TESTLINK_PLAN_NAME - первый активный план проекта,
+# без TESTLINK_BUILD_NAME - последняя сборка плана
+TESTLINK_PLAN_NAME = os.getenv("TESTLINK_PLAN_NAME")
+TESTLINK_BUILD_NAME = os.getenv("TESTLINK_BUILD_NAME")
+TESTLINK_PLATFORM_NAME = os.getenv("TESTLINK_PLATFORM_NAME")
 
-def get_testlink_client():
-    """TestLink API клиент"""
+# План/сборка/платформа резолвятся один раз и живут REPORT_CONTEXT_TTL секунд
+REPORT_CONTEXT_TTL = int(os.getenv("TESTLINK_REPORT_CONTEXT_TTL", "600"))
+# reportTCResult одного system.multicall и сколько multicall держать в полёте
+REPORT_CHUNK = int(os.getenv("TESTLINK_REPORT_CHUNK", "50"))
+REPORT_CONCURRENCY = int(os.getenv("TESTLINK_REPORT_CONCURRENCY", "4"))
+# Сколько неотправленных jobs читать из очереди за раз
+REPORT_BATCH = int(os.getenv("TESTLINK_REPORT_BATCH", "1000"))
+# Повторы после ошибки: 60с, 120с, 240с ... (не дольше REPORT_RETRY_MAX), всего не больше REPORT_MAX_ATTEMPTS попыток
+REPORT_RETRY_BASE = int(os.getenv("TESTLINK_REPORT_RETRY_BASE", "60"))
+REPORT_RETRY_MAX = int(os.getenv("TESTLINK_REPORT_RETRY_MAX", "21600"))
+REPORT_MAX_ATTEMPTS = int(os.getenv("TESTLINK_REPORT_MAX_ATTEMPTS", "8"))
+
+# Маппинг статусов OpenQA → TestLink
+TESTLINK_STATUS = {
+    "passed": "p",  # passed
+    "softfailed": "b",  # blocked
+    "failed": "f",  # failed
+    "none": "b",  # blocked
+    "skipped": "x"  # not run
+}
+
+report_context_cache = TTLCache(REPORT_CONTEXT_TTL)
+_local = threading.local()
+
+
+def get_testlink_client(timeout: float = TESTLINK_TIMEOUT):
+    """TestLink API клиент (timeout - таймаут сокета XML-RPC)"""
     server_url = os.getenv('TESTLINK_URL')
     devkey = os.getenv('TESTLINK_DEVKEY')
 
-    tl_helper = testlink.TestLinkHelper()
-    return tl_helper.connect(
-        testlink.TestlinkAPIClient,
-        server_url=server_url,
-        devKey=devkey
-    )
+    return connect_testlink(testlink.TestLinkHelper(server_url, devkey), timeout)
+
+
+def shared_testlink_client():
+    """Один XML-RPC клиент на поток (и процесс - после fork соединение не делим)"""
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.client = get_testlink_client()
+        _local.pid = os.getpid()
+    return _local.client
+
+
+def _resolve_plan(api, project: Dict[str, Any]) -> Dict[str, Any]:
+    if TESTLINK_PLAN_NAME:
+        return api.getTestPlanByName(project['name'], TESTLINK_PLAN_NAME)[0]
+    plans = [p for p in api.getProjectTestPlans(project['id']) if str(p.get('active', '1')) == '1']
+    if not plans:
+        raise ValueError(f"No active test plans in TestLink project '{project['prefix']}'")
+    return plans[0]
 
 
-def report_result_to_testlink(testcase_id: int, db: Session):
-    """Отправка результата OpenQA обратно в TestLink"""
-    testcase = db.query(TestCase).filter(TestCase.id == testcase_id).first()
-    test_job = db.query(TestJob).filter(TestJob.testcase_id == testcase_id).first()
+def _resolve_build(api, testplan_id, build_name: Optional[str] = None) -> Dict[str, Any]:
+    build_name = build_name or TESTLINK_BUILD_NAME
+    if build_name:
+        for build in api.getBuildsForTestPlan(testplan_id):
+            if build['name'] == build_name:
+                return build
+        raise ValueError(f"Build '{build_name}' not found in test plan {testplan_id}")
+    return api.getLatestBuildForTestPlan(testplan_id)
 
-    if not testcase or not test_job:
-        return False
 
-    # Получаем статус из OpenQA
-    OPENQA_URL = os.getenv("OPENQA_URL", "http://openqa/api/v1")
+def _resolve_platform_id(api, testplan_id) -> Optional[int]:
     try:
-        resp = requests.get(f"{OPENQA_URL}/jobs/{test_job.openqa_job_id}", verify=False)
-        job_data = resp.json()
-
-        state = job_data.get("state")
-        result = job_data.get("result", "none")
-
-        # Маппинг статусов OpenQA → TestLink
-        status_map = {
-            "passed": "p",  # passed
-            "softfailed": "b",  # blocked
-            "failed": "f",  # failed
-            "none": "b",  # blocked
-            "skipped": "x"  # not run
-        }
+        platforms = api.getTestPlanPlatforms(testplan_id)
+    except testlink.testlinkerrors.TLResponseError:
+        return None  # У плана нет платформ
+    if TESTLINK_PLATFORM_NAME:
+        for platform in platforms:
+            if platform['name'] == TESTLINK_PLATFORM_NAME:
+                return int(platform['id'])
+        raise ValueError(f"Platform '{TESTLINK_PLATFORM_NAME}' not found in test plan {testplan_id}")
+    return int(platforms[0]['id']) if len(platforms) == 1 else None
 
-        testlink_status = status_map.get(result, "b")
 
-        # Отправляем результат в TestLink
-        api = get_testlink_client()
-        plan = api.getFirstPlan()
+def get_report_context(api=None, testplan_id: Optional[int] = None,
+                       build_name: Optional[str] = None) -> Dict[str, Any]:
+    """ID плана, сборки и платформы TestLink (кешируется на REPORT_CONTEXT_TTL).
 
-        result_data = {
-            "notes": f"OpenQA result: {result}\nJob: {test_job.openqa_job_id}\nLogs: {job_data.get('testurl', '')}",
-            "guess": testlink_status == "p"  # Автоопределение
+    Прогон передаёт свой план и сборку TestLink; без них - план и сборка проекта по умолчанию.
+    """
+    key = f"{TESTLINK_PREFIX}:{testplan_id or ''}:{build_name or ''}"
+    context = report_context_cache.get(key)
+    if context is None:
+        api = api or shared_testlink_client()
+        if testplan_id is None:
+            testplan_id = _resolve_plan(api, find_project(api, TESTLINK_PREFIX))['id']
+        build = _resolve_build(api, testplan_id, build_name)
+        context = {
+            "testplanid": int(testplan_id),
+            "buildid": int(build['id']),
+            "platformid": _resolve_platform_id(api, testplan_id),
         }
+        report_context_cache.set(key, context)
+    return context
+
+
+def _job_url(openqa_job_id: str) -> str:
+    return f"{OPENQA_URL.rsplit('/api/', 1)[0]}/tests/{openqa_job_id}"
+
+
+def _report_args(context: Dict[str, Any], testcase_number: int, openqa_job_id: str,
+                 result: Optional[str], logs: Optional[str] = None) -> Dict[str, Any]:
+    args = {
+        "testplanid": context["testplanid"],
+        "buildid": context["buildid"],
+        "testcaseexternalid": f"{TESTLINK_PREFIX}-{testcase_number}",
+        "status": TESTLINK_STATUS.get(result or "none", "b"),
+        "notes": f"OpenQA result: {result}\nJob: {openqa_job_id}\nLogs: {logs or _job_url(openqa_job_id)}",
+    }
+    if context["platformid"] is not None:
+        args["platformid"] = context["platformid"]
+    return args
+
+
+def _report_chunk(items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Один system.multicall с reportTCResult для пачки кейсов: (отправленные, ошибки)"""
+    api = shared_testlink_client()
+    multicall = xmlrpc.client.MultiCall(api.server)
+    for item in items:
+        multicall.tl.reportTCResult({'devKey': api.devKey, **item["args"]})
+
+    reported, failed = [], []
+    for item, response in zip(items, multicall()):
+        # Ошибки TestLink приходят списком [{'code': ..., 'message': ...}]
+        if isinstance(response, list) and response and 'code' not in response[0]:
+            reported.append({**item, "execution_id": _execution_id(response)})
+        else:
+            print(f"Error reporting {item['args']['testcaseexternalid']} to TestLink: {response}")
+            failed.append(item)
+    return reported, failed
+
+
+def _execution_id(response) -> Optional[int]:
+    execution_id = response[0].get('id') if isinstance(response, list) and response else None
+    return int(execution_id) if execution_id else None
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальный backoff до следующей попытки отчёта"""
+    return timedelta(seconds=min(REPORT_RETRY_BASE * 2 ** (attempts - 1), REPORT_RETRY_MAX))
+
+
+def _reported(job_id: int, attempts: int, execution_id: Optional[int], now: datetime) -> Dict[str, Any]:
+    return {
+        "id": job_id, "reported_at": now, "testlink_execution_id": execution_id,
+        "report_attempts": attempts + 1, "next_report_at": None,
+    }
+
+
+def _failed(job_id: int, attempts: int, now: datetime) -> Dict[str, Any]:
+    return {"id": job_id, "report_attempts": attempts + 1, "next_report_at": now + retry_delay(attempts + 1)}
+
+
+def unreported_jobs(db: Session, limit: int, now: Optional[datetime] = None,
+                    run_id: Optional[int] = None) -> List[Any]:
+    """Завершённые, ещё не отправленные jobs, у которых подошло время попытки (ix_test_jobs_unreported).
+
+    Без run_id - jobs вне прогонов; jobs прогона отправляются вместе, когда прогон завершён.
+    """
+    now = now or datetime.utcnow()
+    return db.query(
+        TestJob.id, TestJob.openqa_job_id, TestJob.source_job_id, TestJob.openqa_result,
+        TestJob.report_attempts, TestCase.testcase_number
+    ).join(TestCase, TestCase.id == TestJob.testcase_id).filter(
+        TestJob.openqa_status == "done",
+        TestJob.reported_at.is_(None),
+        TestJob.report_attempts < REPORT_MAX_ATTEMPTS,
+        (TestJob.next_report_at.is_(None)) | (TestJob.next_report_at <= now),
+        TestJob.run_id.is_(None) if run_id is None else TestJob.run_id == run_id,
+    ).order_by(TestJob.id).limit(limit).all()
+
+
+def _drain(db: Session, pool: ThreadPoolExecutor, load_context: Callable[[], Dict[str, Any]],
+           run_id: Optional[int] = None) -> Tuple[int, int]:
+    """Очередь неотправленных jobs (вне прогонов или одного прогона) пачками: (отправлено, отложено)"""
+    success = failed_total = 0
+    context = None
+    while True:
+        jobs = unreported_jobs(db, REPORT_BATCH, run_id=run_id)
+        if not jobs:
+            break
+        if context is None:
+            try:
+                context = load_context()
+            except Exception as e:
+                # План/сборка не находятся или TestLink недоступен: пачка откладывается с backoff
+                # (после REPORT_MAX_ATTEMPTS больше не берётся), остальные прогоны отправляются
+                print(f"Error resolving TestLink plan/build{f' for run {run_id}' if run_id else ''}: {e}")
+                now = datetime.utcnow()
+                db.bulk_update_mappings(TestJob, [_failed(job.id, job.report_attempts, now) for job in jobs])
+                db.commit()
+                failed_total += len(jobs)
+                break
+        items = [{
+            "job_id": job.id,
+            "attempts": job.report_attempts,
+            "args": _report_args(context, job.testcase_number, job.openqa_job_id or job.source_job_id,
+                                 job.openqa_result),
+        } for job in jobs]
+
+        report_chunk = tracing.in_current_context(_report_chunk)
+        futures = {pool.submit(report_chunk, chunk): chunk for chunk in chunks(items, REPORT_CHUNK)}
+        for future in as_completed(futures):
+            try:
+                reported, failed = future.result()
+            except Exception as e:
+                print(f"Error reporting to TestLink: {e}")
+                reported, failed = [], futures[future]
 
-        api.reportTestCaseResult(
-            testcaseexternalid=testcase.testlink_id,
-            testplanid=plan['id'],
-            status=testlink_status,
-            results=result_data
-        )
+            now = datetime.utcnow()
+            db.bulk_update_mappings(TestJob, [
+                _reported(item["job_id"], item["attempts"], item["execution_id"], now) for item in reported
+            ] + [
+                _failed(item["job_id"], item["attempts"], now) for item in failed
+            ])
+            db.commit()
+            success += len(reported)
+            failed_total += len(failed)
+    return success, failed_total
 
-        # Обновляем локальный статус
-        testcase.status = (
-            TestCaseStatus.PASSED if result == "passed"
-            else TestCaseStatus.FAILED if result == "failed"
-            else TestCaseStatus.BLOCKED
-        )
 
-        db.commit()
-        return True
+def bulk_report_results(db: Session, concurrency: Optional[int] = None):
+    """Отправка новых результатов: очередь неотправленных jobs пачками по REPORT_BATCH.
 
-    except Exception as e:
-        print(f"Error reporting to TestLink: {e}")
-        return False
+    Внутри пачки - multicall-чанки в пуле, состояние отчёта jobs - коммит на чанк (статусы кейсов
+    ставит поллер при завершении job).
+    Ошибки откладываются с backoff, после REPORT_MAX_ATTEMPTS попыток job больше не берётся.
+    Завершённые прогоны отправляются целиком - в свой план и сборку TestLink.
+    """
+    reconcile_runs(db)
+    with ThreadPoolExecutor(max_workers=concurrency or REPORT_CONCURRENCY) as pool:
+        success, failed_total = _drain(db, pool, get_report_context)
 
+        for run in completed_runs(db):
+            try:
+                reported, failed = _drain(
+                    db, pool, lambda: get_report_context(testplan_id=run.testplan_id, build_name=run.testlink_build),
+                    run.id
+                )
+                finish_run_report(db, run, reported, has_unreported_jobs(db, run.id))
+            except Exception as e:
+                db.rollback()
+                print(f"Error reporting run {run.id} to TestLink: {e}")
+                continue
+            print(f"📤 TestLink: прогон {run.id} - отправлено {reported}, отложено {failed}")
+            success += reported
+            failed_total += failed
 
-def bulk_report_results(db: Session):
-    """Массовое обновление результатов"""
-    jobs = db.query(TestJob).filter(
-        TestJob.openqa_status == "done"
-    ).all()
+    print(f"📤 TestLink: отправлено {success}, отложено {failed_total}")
+    return {"reported": success, "failed": failed_total, "total": success + failed_total}
 
-    success = 0
-    for job in jobs:
-        if report_result_to_testlink(job.testcase_id, db):
-            success += 1
 
-    return {"reported": success, "total": len(jobs)}
+def has_unreported_jobs(db: Session, run_id: int) -> bool:
+    """Остались jobs прогона, которые ещё можно отправить (в том числе после backoff)"""
+    return db.query(exists().where(
+        TestJob.run_id == run_id,
+        TestJob.openqa_status == "done",
+        TestJob.reported_at.is_(None),
+        TestJob.report_attempts < REPORT_MAX_ATTEMPTS,
+    )).scalar()
@@ -0,0 +1,197 @@
+"""Прогоны: все кейсы тест-плана или сьюта TestLink на одной сборке как одно целое.
+
+Прогон ставит свои кейсы в очередь запусков (launch_queue) с run_id, счётчики в строке
+test_runs растут по мере завершения jobs (count_results - в той же транзакции, что и статус
+job), а когда всё завершилось, результаты уходят в TestLink одной пачкой (bulk_report_results).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy import update, case, exists, or_, and_
+from sqlalchemy.orm import Session
+from ..models import TestRun, TestCase, TestJob, LaunchQueueItem
+from .bulk_ingest import chunks
+from .live_status import publish
+
+logger = logging.getLogger(__name__)
+
+RUN_STARTING = "starting"
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_REPORTED = "reported"
+RUN_ERROR = "error"
+
+# job_poller.FINAL_STATES (job_poller сам импортирует этот модуль)
+_FINAL_JOB_STATES = ("done", "cancelled")
+
+# Поля события прогона для живых статусов (UPDATE ... RETURNING)
+_EVENT_FIELDS = (
+    TestRun.id, TestRun.status, TestRun.total, TestRun.launched, TestRun.finished, TestRun.passed,
+    TestRun.failed, TestRun.other, TestRun.errors, TestRun.reported,
+)
+
+
+def run_event(row: Any) -> Dict[str, Any]:
+    """Строка прогона → событие live_status (счётчики и прогресс)"""
+    return {"type": "run", **{column.key: getattr(row, column.key) for column in _EVENT_FIELDS}, **run_progress(row)}
+
+
+def _bump(db: Session, run_id: int, now: datetime, finished: int, **deltas: int) -> List[Dict[str, Any]]:
+    """Атомарно увеличивает счётчики прогона; последний завершившийся кейс переводит его в completed"""
+    total_finished = TestRun.finished + finished
+    done = and_(TestRun.status == RUN_RUNNING, total_finished >= TestRun.total)
+    values = {name: getattr(TestRun, name) + delta for name, delta in deltas.items() if delta}
+    values.update(
+        finished=total_finished,
+        status=case((done, RUN_COMPLETED), else_=TestRun.status),
+        completed_at=case((done, now), else_=TestRun.completed_at),
+    )
+    return [run_event(row) for row in db.execute(
+        update(TestRun).where(TestRun.id == run_id).values(**values).returning(*_EVENT_FIELDS)
+    )]
+
+
+def count_launched(db: Session, run_id: Optional[int], launched: int) -> List[Dict[str, Any]]:
+    """Кейсы, получившие job (новый, клон или готовый результат)"""
+    if not (run_id and launched):
+        return []
+    return [run_event(row) for row in db.execute(
+        update(TestRun).where(TestRun.id == run_id).values(launched=TestRun.launched + launched)
+        .returning(*_EVENT_FIELDS)
+    )]
+
+
+def count_results(db: Session, results: Iterable[Tuple[Optional[int], Optional[str]]]) -> List[Dict[str, Any]]:
+    """(run_id, результат OpenQA) завершившихся jobs → счётчики прогонов.
+
+    Коммит и публикация возвращённых событий - у вызывающего.
+    """
+    counts = defaultdict(lambda: {"finished": 0, "passed": 0, "failed": 0, "other": 0})
+    for run_id, result in results:
+        if run_id is None:
+            continue
+        counts[run_id]["finished"] += 1
+        counts[run_id][result if result in ("passed", "failed") else "other"] += 1
+
+    now = datetime.utcnow()
+    events = []
+    for run_id, deltas in counts.items():
+        events += _bump(db, run_id, now, **deltas)
+    return events
+
+
+def count_errors(db: Session, run_ids: Iterable[Optional[int]]) -> List[Dict[str, Any]]:
+    """Кейсы, снятые с очереди после LAUNCH_MAX_ATTEMPTS, тоже завершают прогон"""
+    counts = defaultdict(int)
+    for run_id in run_ids:
+        if run_id is not None:
+            counts[run_id] += 1
+    now = datetime.utcnow()
+    events = []
+    for run_id, errors in counts.items():
+        events += _bump(db, run_id, now, finished=errors, errors=errors)
+    return events
+
+
+def create_run(db: Session, testplan_id: Optional[int] = None, test_suite_id: Optional[int] = None,
+               build: Optional[str] = None, testlink_build: Optional[str] = None, reuse: str = "link",
+               priority: int = 0, name: Optional[str] = None) -> TestRun:
+    run = TestRun(
+        name=name, testplan_id=testplan_id, test_suite_id=test_suite_id, build=build,
+        testlink_build=testlink_build, reuse=reuse, priority=priority, status=RUN_STARTING
+    )
+    db.add(run)
+    db.commit()
+    return run
+
+
+def run_cases(db: Session, run: TestRun) -> List[Any]:
+    """Кейсы прогона: план - свежий список из TestLink (с синхронизацией), сьют - из базы"""
+    if run.testplan_id is not None:
+        from .testlink_sync import sync_testplan_numbers
+
+        numbers = sync_testplan_numbers(db, run.testplan_id)
+        cases = []
+        for chunk in chunks(numbers, 1000):
+            cases += db.query(TestCase.id, TestCase.test_suite_id).filter(TestCase.testcase_number.in_(chunk)).all()
+        return cases
+    return db.query(TestCase.id, TestCase.test_suite_id).filter(
+        TestCase.test_suite_id == run.test_suite_id
+    ).order_by(TestCase.id).all()
+
+
+def start_run(db: Session, run_id: int) -> Dict[str, Any]:
+    """Собирает кейсы прогона и ставит их в очередь запусков (одним коммитом со статусом running)"""
+    from .launch_queue import enqueue, dispatch
+
+    run = db.get(TestRun, run_id)
+    if run is None or run.status != RUN_STARTING:
+        return {"run_id": run_id, "status": run.status if run else None}
+    try:
+        cases = run_cases(db, run)
+    except Exception as e:
+        logger.warning("Test run %s: failed to collect cases: %s", run_id, e)
+        db.rollback()
+        run.status, run.error = RUN_ERROR, str(e)
+        db.commit()
+        publish([run_event(run)])
+        return {"run_id": run_id, "status": run.status, "error": run.error}
+
+    now = datetime.utcnow()
+    run.total, run.started_at = len(cases), now
+    run.status = RUN_RUNNING if cases else RUN_COMPLETED
+    if not cases:
+        run.completed_at = now
+    for chunk in chunks(cases, 1000):
+        enqueue(db, chunk, run.priority, run.build, run.reuse, run_id=run.id, commit=False)
+    db.commit()
+    publish([run_event(run)])
+
+    print(f"🏁 Прогон {run.id}: {run.total} кейсов в очереди")
+    dispatch(db)
+    return {"run_id": run.id, "status": run.status, "total": run.total}
+
+
+def reconcile_runs(db: Session) -> int:
+    """Прогоны без очереди и активных jobs - завершены, даже если счётчики разошлись
+    (кейс перехватил другой прогон, job удалён вручную и т.п.)"""
+    now = datetime.utcnow()
+    rows = db.execute(
+        update(TestRun).where(
+            TestRun.status == RUN_RUNNING,
+            ~exists().where(LaunchQueueItem.run_id == TestRun.id),
+            ~exists().where(
+                TestJob.run_id == TestRun.id,
+                or_(TestJob.openqa_status.is_(None), TestJob.openqa_status.notin_(_FINAL_JOB_STATES)),
+            ),
+        ).values(status=RUN_COMPLETED, completed_at=now).returning(*_EVENT_FIELDS)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    publish([run_event(row) for row in rows])
+    return len(rows)
+
+
+def completed_runs(db: Session) -> List[TestRun]:
+    """Завершённые, но ещё не отправленные в TestLink прогоны"""
+    return db.query(TestRun).filter(TestRun.status == RUN_COMPLETED).order_by(TestRun.id).all()
+
+
+def finish_run_report(db: Session, run: TestRun, reported: int, pending: bool):
+    """Отправленные результаты в счётчик; прогон - reported, когда отправлять больше нечего"""
+    values = {"reported": TestRun.reported + reported}
+    if not pending:
+        values.update(status=RUN_REPORTED, reported_at=datetime.utcnow())
+    rows = db.execute(update(TestRun).where(TestRun.id == run.id).values(**values).returning(*_EVENT_FIELDS)).all()
+    db.commit()
+    publish([run_event(row) for row in rows])
+
+
+def run_progress(run: TestRun) -> Dict[str, Any]:
+    """Производные от счётчиков: без запросов к test_jobs"""
+    return {
+        "progress": round(100.0 * run.finished / run.total, 1) if run.total else 100.0,
+        "queued": max(run.total - run.launched - run.errors, 0) if run.status == RUN_RUNNING else 0,
+        "running": max(run.launched - (run.finished - run.errors), 0),
+    }
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models import TestCase, TestCaseStatus
+
+# Поля списка по умолчанию; тяжёлые steps/preconditions - только по явному запросу (fields=...)
+LIST_FIELDS = ("id", "testcase_number", "name", "test_suite_id", "status", "openqa_job_id", "created_at", "updated_at")
+HEAVY_FIELDS = ("preconditions", "steps")
+ALL_FIELDS = LIST_FIELDS + HEAVY_FIELDS
+
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH = 1000
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """fields=steps,preconditions → LIST_FIELDS + запрошенные; id всегда есть (курсор)"""
+    if not fields:
+        return LIST_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in ALL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    extra = tuple(f for f in requested if f not in LIST_FIELDS)
+    return LIST_FIELDS + extra
+
+
+def _query(columns: Tuple[str, ...], status: Optional[str], after_id: int, manual: Optional[bool] = None):
+    query = select(*[getattr(TestCase, c) for c in columns]).where(TestCase.id > after_id)
+    if status:
+        query = query.where(TestCase.status == TestCaseStatus(status))
+    if manual is not None:
+        # steps @> '[{"manual": true}]' - по GIN-индексу ix_test_cases_steps
+        has_manual = TestCase.steps.contains([{"manual": True}])
+        query = query.where(has_manual if manual else ~has_manual)
+    return query.order_by(TestCase.id)
+
+
+async def keyset_page(
+        db: AsyncSession,
+        after_id: int = 0,
+        limit: int = 100,
+        status: Optional[str] = None,
+        fields: Tuple[str, ...] = LIST_FIELDS,
+        manual: Optional[bool] = None
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Страница по курсору id > after_id: (строки, следующий курсор или None)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    result = await db.execute(_query(fields, status, after_id, manual).limit(limit))
+    rows = [dict(row._mapping) for row in result]
+    next_cursor = rows[-1]["id"] if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _stream_rows(status: Optional[str], fields: Tuple[str, ...]) -> AsyncIterator[Dict[str, Any]]:
+    """Серверный курсор: в памяти не больше EXPORT_BATCH строк"""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            _query(fields, status, 0).execution_options(yield_per=EXPORT_BATCH)
+        )
+        async for row in result:
+            yield {key: _plain(value) for key, value in row._mapping.items()}
+
+
+async def export_ndjson(status: Optional[str], fields: Tuple[str, ...]) -> AsyncIterator[str]:
+    async for row in _stream_rows(status, fields):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+async def export_csv(status: Optional[str], fields: Tuple[str, ...]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    count = 0
+    async for row in _stream_rows(status, fields):
+        # Шаги (jsonb) - JSON-строкой в ячейке
+        writer.writerow({key: json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+                         for key, value in row.items()})
+        count += 1
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,81 @@
+"""Поиск кейсов для запуска: по номеру, полнотекстовый по имени/шагам/предусловиям, нечёткий по имени.
+
+Текст - вычисляемая колонка search_vector (GIN ix_test_cases_search_vector) и
+websearch_to_tsquery: слова, "фраза", -исключение, or. Порядок - ts_rank_cd с весами колонки:
+совпадение в имени выше, чем в шагах, в шагах - выше, чем в предусловиях. Нечёткий поиск -
+pg_trgm по имени (GIN ix_test_cases_name_trgm): опечатки и части слов, которых нет в словаре;
+добирает выдачу, если полнотекстовых совпадений меньше limit.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Select, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import TestCase, TestCaseStatus
+
+# Та же конфигурация, что в выражении search_vector
+SEARCH_CONFIG = "russian"
+MAX_SEARCH_LIMIT = 100
+# Частое слово совпадает с десятками тысяч кейсов, а ts_rank_cd читает вектор каждого:
+# ранжируются первые SEARCH_RANK_CANDIDATES совпадений. Меньше совпадений - порядок точный,
+# больше - лучшие из первых найденных (такой запрос всё равно надо уточнять)
+SEARCH_RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "2000"))
+
+_COLUMNS = (TestCase.id, TestCase.testcase_number, TestCase.name, TestCase.test_suite_id, TestCase.status)
+# 123 или repo-tests-123 (полный внешний ID TestLink)
+_NUMBER = re.compile(r"^\s*(?:[\w.-]+-)?(\d{1,9})\s*$")
+
+
+def _with_status(query: Select, status: Optional[str]) -> Select:
+    return query.where(TestCase.status == TestCaseStatus(status)) if status else query
+
+
+def text_search_query(q: str, limit: int, status: Optional[str] = None) -> Select:
+    """search_vector @@ запрос по GIN-индексу, лучшие по ts_rank_cd (32 - ранг в [0, 1))"""
+    tsquery = func.websearch_to_tsquery(cast(literal(SEARCH_CONFIG), REGCONFIG), q)
+    candidates = _with_status(
+        select(*_COLUMNS, TestCase.search_vector).where(TestCase.search_vector.op("@@")(tsquery)), status
+    ).limit(SEARCH_RANK_CANDIDATES).subquery()
+    rank = func.ts_rank_cd(candidates.c.search_vector, tsquery, 32)
+    return (
+        select(*[candidates.c[column.key] for column in _COLUMNS], rank.label("rank"))
+        .order_by(rank.desc(), candidates.c.id)
+        .limit(limit)
+    )
+
+
+def fuzzy_name_query(q: str, limit: int, status: Optional[str] = None, exclude_ids: List[int] = ()) -> Select:
+    """q <% name - похожее слово в имени (pg_trgm.word_similarity_threshold, по умолчанию 0.6)"""
+    similarity = func.word_similarity(q, TestCase.name)
+    query = _with_status(select(*_COLUMNS, similarity.label("rank")).where(literal(q).op("<%")(TestCase.name)), status)
+    if exclude_ids:
+        query = query.where(TestCase.id.notin_(exclude_ids))
+    return query.order_by(similarity.desc(), TestCase.id).limit(limit)
+
+
+async def search_cases(
+        db: AsyncSession,
+        q: str,
+        limit: int = 20,
+        status: Optional[str] = None,
+        fuzzy: bool = True
+) -> List[Dict[str, Any]]:
+    """Точное совпадение номера, затем полнотекстовые по рангу, затем нечёткие по имени"""
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    hits: List[Dict[str, Any]] = []
+
+    number = _NUMBER.match(q)
+    if number:
+        query = _with_status(select(*_COLUMNS).where(TestCase.testcase_number == int(number.group(1))), status)
+        hits += [{**row._mapping, "rank": 1.0, "match": "number"} for row in await db.execute(query)]
+
+    rows = await db.execute(text_search_query(q, limit, status))
+    hits += [{**row._mapping, "match": "text"} for row in rows if not any(h["id"] == row.id for h in hits)]
+
+    if fuzzy and len(hits) < limit:
+        rows = await db.execute(fuzzy_name_query(q, limit - len(hits), status, [h["id"] for h in hits]))
+        hits += [{**row._mapping, "match": "fuzzy"} for row in rows]
+    return hits[:limit]
@@ -1,59 +1,289 @@
+import hashlib
 import logging
+import os
+import re
+import ssl
+import time
+import xmlrpc.client
+from functools import lru_cache
 from sqlalchemy.orm import Session
-from typing import Dict, Any
-from ..models import TestCase, TestCaseStatus
+from typing import Dict, Any, List, Optional
+from bs4 import BeautifulSoup, Tag
+from .bulk_ingest import upsert_testcases, chunks
+from .. import tracing
+from ..metrics import DEFAULT_BUCKETS, Histogram
 import testlink
 import json
 
 logger = logging.getLogger(__name__)
 
-def sync_testcases(db: Session, testcase_number: int) -> Dict[str, Any]:
-    external_id = f"repo-tests-{testcase_number}"
-    tls = testlink.TestLinkHelper().connect(testlink.TestlinkAPIClient)
-    tc_info = tls.getTestCase(None, testcaseexternalid=external_id)
-    print(f"API: {tc_info[0]['name']}")
+# Префикс внешних ID проекта в TestLink (repo-tests-N)
+TESTLINK_PREFIX = os.getenv("TESTLINK_PREFIX", "repo-tests")
+# Сколько getTestCase отправлять одним system.multicall
+MULTICALL_CHUNK = int(os.getenv("TESTLINK_MULTICALL_CHUNK", "200"))
+# Таймаут сокета XML-RPC (секунды): без него зависший TestLink держит поток навсегда
+TESTLINK_TIMEOUT = float(os.getenv("TESTLINK_TIMEOUT", "60"))
+
+
+testlink_request_seconds = Histogram(
+    "testlink_request_duration_seconds", "Время HTTP-запроса к TestLink XML-RPC (system.multicall - один запрос)",
+    ("method", "status"), buckets=DEFAULT_BUCKETS,
+)
+
+_METHOD_NAME = re.compile(rb"<methodName>([^<]+)</methodName>")
+
+
+class _TimedTransportMixin:
+    """Замер и span на каждый XML-RPC запрос; метод - из тела запроса (tl.getTestCase, system.multicall)"""
+
+    def __init__(self, *args, timeout: float = TESTLINK_TIMEOUT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        """Соединение keep-alive с таймаутом сокета (xmlrpc.client.Transport его не задаёт)"""
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(self.timeout)
+        return conn
+
+    def request(self, host, handler, request_body, verbose=False):
+        match = _METHOD_NAME.search(request_body[:512])
+        method = match.group(1).decode() if match else "unknown"
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span(f"testlink {method}", "client", **{"rpc.method": method}):
+                response = super().request(host, handler, request_body, verbose)
+            status = "ok"
+            return response
+        finally:
+            testlink_request_seconds.labels(method, status).observe(time.perf_counter() - started)
+
+
+class TimedTransport(_TimedTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class TimedSafeTransport(_TimedTransportMixin, xmlrpc.client.SafeTransport):
+    pass
 
-    count_before = db.query(TestCase).count()
-    total_synced = 0
 
-    if tc_info and len(tc_info) > 0:
-        tc = tc_info[0]
+def testlink_transport(server_url: str, timeout: float = TESTLINK_TIMEOUT) -> xmlrpc.client.Transport:
+    """Транспорт с метриками и таймаутом; для https - без проверки сертификата, как TestLinkHelper.connect"""
+    if server_url.lower().startswith("https"):
+        return TimedSafeTransport(context=ssl._create_unverified_context(), timeout=timeout)
+    return TimedTransport(timeout=timeout)
 
-        testcase_data = {
-            'testcase_number': int(tc['tc_external_id']),
-            'name': tc['name'],
-            'preconditions': tc.get('preconditions', ''),
 
-            'steps': json.dumps(tc.get('steps', []), ensure_ascii=False),
+def connect_testlink(helper: testlink.TestLinkHelper, timeout: float = TESTLINK_TIMEOUT):
+    """TestlinkAPIClient поверх TimedTransport (с прокси TestLinkHelper ставит свой транспорт)"""
+    return helper.connect(testlink.TestlinkAPIClient, transport=testlink_transport(helper._server_url, timeout))
 
-            'test_suite_id': int(tc['testsuite_id']),
-            'status': TestCaseStatus.PENDING
-        }
 
-        existing = db.query(TestCase).filter(
-            TestCase.testcase_number == testcase_data['testcase_number']
-        ).first()
+def get_testlink_client(timeout: float = TESTLINK_TIMEOUT):
+    """TestLink API клиент (TESTLINK_API_PYTHON_SERVER_URL / TESTLINK_API_PYTHON_DEVKEY)"""
+    return connect_testlink(testlink.TestLinkHelper(), timeout)
+
+
+def _external_number(tc: Dict[str, Any]) -> int:
+    """Номер кейса: tc_external_id или хвост полного external_id (repo-tests-N)"""
+    if tc.get('tc_external_id'):
+        return int(tc['tc_external_id'])
+    full_id = tc.get('full_external_id') or tc.get('external_id')
+    return int(str(full_id).rsplit('-', 1)[-1])
+
+
+def content_hash(name: str, preconditions: Optional[str], steps: Any) -> str:
+    """sha256 от содержимого кейса, которое мы храним и запускаем"""
+    payload = json.dumps([name, preconditions or '', steps or ''], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Блочные теги - с новой строки, ячейки таблиц - через пробел, остальные (b, i, span, a ...) - внутри строки.
+# Одинаковые фрагменты (ожидаемые результаты, общие предусловия) разбираются один раз - lru_cache
+_BLOCK_TAGS = frozenset(("p", "div", "li", "tr", "pre", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6"))
+
+
+@lru_cache(maxsize=8192)
+def html_to_text(html: Optional[str]) -> str:
+    """HTML редактора TestLink → текст: абзацы и <br> - переводы строк, пункты списков - «- »"""
+    if not html:
+        return ''
+    if '<' not in html and '&' not in html:
+        return html.strip()
+    soup = BeautifulSoup(html, 'html.parser')
+    # Один проход по дереву: find_all на каждый вызов строит фильтр и стоит дороже разбора
+    for tag in [node for node in soup.descendants if isinstance(node, Tag)]:
+        if tag.name == 'br':
+            tag.replace_with('\n')
+        elif tag.name in _BLOCK_TAGS:
+            if tag.name == 'li':
+                tag.insert(0, '- ')
+            tag.append('\n')
+        elif tag.name in ('td', 'th'):
+            tag.append(' ')
+    lines = (' '.join(line.split()) for line in soup.get_text().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def compact_steps(steps: Any) -> List[Dict[str, Any]]:
+    """Шаги TestLink → [{"step", "action", "expected", "manual"}] без HTML (execution_type 1 - ручной)"""
+    if not isinstance(steps, list):
+        return []
+    return [{
+        'step': int(step.get('step_number') or n),
+        'action': html_to_text(step.get('actions')),
+        'expected': html_to_text(step.get('expected_results')),
+        'manual': str(step.get('execution_type') or '1') == '1',
+    } for n, step in enumerate(steps, 1)]
+
+
+def _testcase_data(tc: Dict[str, Any], test_suite_id: Optional[int] = None) -> Dict[str, Any]:
+    """Ответ TestLink → поля TestCase (HTML снимается здесь, один раз)"""
+    suite_id = tc.get('testsuite_id') or tc.get('parent_id') or test_suite_id
+    data = {
+        'testcase_number': _external_number(tc),
+        'name': tc['name'],
+        'preconditions': html_to_text(tc.get('preconditions')),
+        'steps': compact_steps(tc.get('steps')),
+
+        'test_suite_id': int(suite_id) if suite_id else None,
+        'testlink_version': int(tc['version']) if tc.get('version') else None,
+        'testlink_modification_ts': tc.get('modification_ts') or tc.get('creation_ts'),
+    }
+    data['content_hash'] = content_hash(data['name'], data['preconditions'], data['steps'])
+    return data
 
-        if not existing:
-            testcase = TestCase(**testcase_data)
-            db.add(testcase)
-            total_synced += 1
-            print(f"✅ ➕ {testcase_data['name'][:40]} (ID: {testcase_data['testcase_number']})")
-            print(f"   📋 Шагов: {len(tc.get('steps', []))}")
-        else:
-            print(f"⏭️  Уже есть: {testcase_data['testcase_number']}")
 
-    db.commit()
-    count_after = db.query(TestCase).count()
+def fetch_suite_testcases(tls, testsuite_id: int) -> List[Dict[str, Any]]:
+    """Все кейсы сьюта (включая вложенные) одним вызовом"""
+    # TestlinkAPIClient принимает deep и details только позиционно
+    cases = tls.getTestCasesForTestSuite(testsuite_id, True, 'full')
+    return cases if isinstance(cases, list) else []
 
-    print(f"🎉 {count_before}→{count_after} (+{total_synced})")
 
+def fetch_testcases_by_id(tls, testcase_ids: List[int]) -> List[Dict[str, Any]]:
+    """getTestCase для многих кейсов через system.multicall (MULTICALL_CHUNK за запрос)"""
+    cases = []
+    for chunk in chunks(testcase_ids, MULTICALL_CHUNK):
+        multicall = xmlrpc.client.MultiCall(tls.server)
+        for tc_id in chunk:
+            multicall.tl.getTestCase({'devKey': tls.devKey, 'testcaseid': tc_id})
+        for response in multicall():
+            # Ошибки TestLink приходят списком [{'code': ..., 'message': ...}]
+            if isinstance(response, list) and response and 'name' in response[0]:
+                cases.append(response[0])
+    return cases
+
+
+def fetch_plan_testcases(tls, testplan_id: int) -> List[Dict[str, Any]]:
+    """Кейсы тест-плана: список ID одним вызовом, детали через multicall"""
+    plan_cases = tls.getTestCasesForTestPlan(testplan_id, details='simple')
+    if not isinstance(plan_cases, dict):
+        return []
+    testcase_ids = [int(tc_id) for tc_id in plan_cases.keys()]
+    return fetch_testcases_by_id(tls, testcase_ids)
+
+
+def find_project(tls, prefix: str) -> Dict[str, Any]:
+    for project in tls.getProjects():
+        if project.get('prefix') == prefix:
+            return project
+    raise ValueError(f"TestLink project with prefix '{prefix}' not found")
+
+
+def fetch_project_testcases(tls, prefix: str) -> List[Dict[str, Any]]:
+    """Все кейсы проекта: по одному deep-вызову на каждый сьют первого уровня"""
+    project = find_project(tls, prefix)
+    suites = tls.getFirstLevelTestSuitesForTestProject(project['id'])
+
+    cases = []
+    for suite in suites:
+        suite_cases = fetch_suite_testcases(tls, int(suite['id']))
+        logger.info("Suite %s (%s): %d cases", suite['id'], suite.get('name'), len(suite_cases))
+        cases.extend(suite_cases)
+    return cases
+
+
+def _sync_result(counts: Dict[str, int]) -> Dict[str, Any]:
     return {
         "status": "success",
-        "synced_cases": total_synced,
-        "total_cases": count_after,
-        "sample_case": testcase_data['name'] if total_synced > 0 else None
+        "synced_cases": counts["inserted"] + counts["updated"],
+        "inserted_cases": counts["inserted"],
+        "updated_cases": counts["updated"],
+        "unchanged_cases": counts["unchanged"],
+        "total_cases": counts["total"],
     }
 
 
+def _bulk_sync(
+        db: Session,
+        raw_cases: List[Dict[str, Any]],
+        test_suite_id: Optional[int] = None,
+        incremental: bool = True
+) -> Dict[str, Any]:
+    cases = [_testcase_data(tc, test_suite_id) for tc in raw_cases]
+    counts = upsert_testcases(db, cases, incremental=incremental)
+
+    print(f"🎉 TestLink bulk sync: +{counts['inserted']} ~{counts['updated']} "
+          f"={counts['unchanged']} (всего {counts['total']})")
+
+    return _sync_result(counts)
+
+
+def sync_testsuite(db: Session, testsuite_id: int, incremental: bool = True) -> Dict[str, Any]:
+    """Синхронизация всего сьюта (deep)"""
+    tls = get_testlink_client()
+    return _bulk_sync(db, fetch_suite_testcases(tls, testsuite_id),
+                      test_suite_id=testsuite_id, incremental=incremental)
+
+
+def sync_testplan(db: Session, testplan_id: int, incremental: bool = True) -> Dict[str, Any]:
+    """Синхронизация всех кейсов тест-плана"""
+    tls = get_testlink_client()
+    return _bulk_sync(db, fetch_plan_testcases(tls, testplan_id), incremental=incremental)
+
+
+def sync_testplan_numbers(db: Session, testplan_id: int, incremental: bool = True) -> List[int]:
+    """Синхронизирует кейсы тест-плана и возвращает их номера (состав прогона плана)"""
+    raw_cases = fetch_plan_testcases(get_testlink_client(), testplan_id)
+    _bulk_sync(db, raw_cases, incremental=incremental)
+    return [_external_number(tc) for tc in raw_cases]
+
+
+def sync_project(db: Session, prefix: str = TESTLINK_PREFIX, incremental: bool = True) -> Dict[str, Any]:
+    """Синхронизация всего проекта TestLink"""
+    tls = get_testlink_client()
+    return _bulk_sync(db, fetch_project_testcases(tls, prefix), incremental=incremental)
+
+
+# scope → функция массовой синхронизации (для Celery и API)
+BULK_SYNC_SCOPES = {
+    "suite": sync_testsuite,
+    "plan": sync_testplan,
+    "project": sync_project,
+}
+
+
+def sync_testcases(db: Session, testcase_number: int, incremental: bool = True) -> Dict[str, Any]:
+    external_id = f"{TESTLINK_PREFIX}-{testcase_number}"
+    tls = get_testlink_client()
+    tc_info = tls.getTestCase(None, testcaseexternalid=external_id)
+    print(f"API: {tc_info[0]['name']}")
+
+    tc = tc_info[0]
+    counts = upsert_testcases(db, [_testcase_data(tc)], incremental=incremental)
+
+    if counts["inserted"]:
+        print(f"✅ ➕ {tc['name'][:40]} (ID: {tc['tc_external_id']})")
+        print(f"   📋 Шагов: {len(tc.get('steps', []))}")
+    elif counts["updated"]:
+        print(f"✅ ✏️  {tc['name'][:40]} (ID: {tc['tc_external_id']})")
+    else:
+        print(f"⏭️  Без изменений: {tc['tc_external_id']}")
 
+    result = _sync_result(counts)
+    result["sample_case"] = tc['name'] if result["synced_cases"] > 0 else None
+    return result
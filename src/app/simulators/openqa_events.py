@@ -0,0 +1,27 @@
+"""Локальная замена AMQP-брокера OpenQA: публикация событий jobs через kombu.
+
+С OPENQA_AMQP_URL=memory:// публикатор и JobEventConsumer должны работать в одном процессе.
+"""
+from typing import Optional
+
+from kombu import Connection
+
+from ..workers.openqa_events import job_events_exchange, job_events_queue, OPENQA_AMQP_TOPIC_PREFIX
+
+
+def publish_job_event(
+        connection: Connection,
+        job_id: int,
+        event: str = "job.done",
+        result: Optional[str] = "passed",
+        prefix: str = OPENQA_AMQP_TOPIC_PREFIX
+):
+    """Публикует событие в том же формате, что и OpenQA (JSON с id и result)"""
+    with connection.Producer() as producer:
+        producer.publish(
+            {"id": job_id, "result": result},
+            exchange=job_events_exchange,
+            routing_key=f"{prefix}.openqa.{event}",
+            serializer="json",
+            declare=[job_events_queue(prefix)],
+        )
@@ -0,0 +1,225 @@
+"""Локальная заглушка OpenQA REST API для проверки клиента без живого сервера.
+
+    python -m src.app.simulators.openqa_stub --port 9526
+    OPENQA_URL=http://127.0.0.1:9526/api/v1
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = "/api/v1"
+_JOB_PATH = re.compile(r"^/jobs/(\d+)$")
+_RESTART_PATH = re.compile(r"^/jobs/(\d+)/restart$")
+
+
+class OpenQAStub:
+    """In-memory OpenQA: POST /jobs, POST /isos, POST /jobs/{id}/restart, GET /jobs[?ids=&build=&limit=], GET /jobs/{id},
+    GET /workers (workers штук, все idle); fail_next(n) - n ответов 503.
+
+    latency - секунд на запрос, failure_rate - доля случайных 503. С job_duration job при первом
+    чтении уже running и через столько секунд (±job_jitter) - done, из них job_failure_rate
+    с result=failed; без него job завершает только finish_job().
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, workers: int = 4, latency: float = 0.0,
+                 failure_rate: float = 0.0, job_duration: Optional[float] = None, job_jitter: float = 0.0,
+                 job_failure_rate: float = 0.0, first_id: int = 1, seed: Optional[int] = None):
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        self.workers = workers
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.job_duration = job_duration
+        self.job_jitter = job_jitter
+        self.job_failure_rate = job_failure_rate
+        self.requests_count = 0
+        self._ids = itertools.count(first_id)
+        self._failures = 0
+        self._random = random.Random(seed)
+        # job_id → (момент создания, длительность, итоговый результат) для jobs с job_duration
+        self._schedule: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def fail_next(self, count: int = 1):
+        with self._lock:
+            self._failures = count
+
+    def finish_job(self, job_id: int, result: str = "passed"):
+        with self._lock:
+            self._schedule.pop(job_id, None)
+            self.jobs[job_id].update(state="done", result=result, t_finished="2026-01-01T00:10:00")
+
+    def create_job(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            job_id = next(self._ids)
+            job = {
+                "id": job_id,
+                "name": settings.get("test") or settings.get("TEST", f"job_{job_id}"),
+                "state": "scheduled",
+                "result": "none",
+                "settings": settings,
+                "t_started": None,
+                "t_finished": None,
+            }
+            self.jobs[job_id] = job
+            if self.job_duration is not None:
+                duration = max(0.0, self.job_duration + self._random.uniform(-self.job_jitter, self.job_jitter))
+                result = "failed" if self._random.random() < self.job_failure_rate else "passed"
+                self._schedule[job_id] = (time.monotonic(), duration, result)
+            return job
+
+    def _advance(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Состояние job с job_duration на текущий момент (вызывать под _lock)"""
+        planned = self._schedule.get(job["id"])
+        if planned is None or job["state"] == "done":
+            return job
+        created, duration, result = planned
+        elapsed = time.monotonic() - created
+        started = datetime.utcnow() - timedelta(seconds=elapsed)
+        job.update(state="running", t_started=started.isoformat(timespec="seconds"))
+        if elapsed >= duration:
+            finished = started + timedelta(seconds=duration)
+            job.update(state="done", result=result, t_finished=finished.isoformat(timespec="seconds"))
+            del self._schedule[job["id"]]
+        return job
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Any):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests_count += 1
+                    if stub._failures > 0:
+                        stub._failures -= 1
+                        return 503, {"error": "injected failure"}
+                    if stub.failure_rate and stub._random.random() < stub.failure_rate:
+                        return 503, {"error": "random failure"}
+
+                parsed = urlparse(self.path)
+                path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+                query = parse_qs(parsed.query)
+
+                if self.command == "POST" and path == "/jobs":
+                    length = int(self.headers.get("Content-Length") or 0)
+                    raw = self.rfile.read(length) if length else b"{}"
+                    job = stub.create_job(json.loads(raw or b"{}"))
+                    return 200, {"id": job["id"]}
+
+                if self.command == "POST" and path == "/isos":
+                    # Шаблоны не храним: job на каждую пару TEST × MACHINE из запроса
+                    length = int(self.headers.get("Content-Length") or 0)
+                    form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                    ids = [
+                        stub.create_job({**form, "TEST": test, "MACHINE": machine})["id"]
+                        for test in form.get("TEST", "").split(",") if test
+                        for machine in form.get("MACHINE", "").split(",") if machine
+                    ]
+                    return 200, {"ids": ids, "count": len(ids), "failed": []}
+
+                restart = _RESTART_PATH.match(path)
+                if self.command == "POST" and restart:
+                    job = stub.jobs.get(int(restart.group(1)))
+                    if job is None:
+                        return 404, {"error": "no such job"}
+                    clone = stub.create_job(dict(job["settings"]))
+                    return 200, {"result": [{str(job["id"]): clone["id"]}], "test_url": [{}]}
+
+                if self.command == "GET" and path == "/jobs":
+                    with stub._lock:
+                        if "ids" in query:
+                            ids = [int(i) for value in query["ids"] for i in value.split(",") if i.isdigit()]
+                            jobs = [stub.jobs[i] for i in ids if i in stub.jobs]
+                        else:
+                            jobs = list(stub.jobs.values())
+                        jobs = [stub._advance(job) for job in jobs]
+                    if "build" in query:
+                        jobs = [job for job in jobs if job["settings"].get("BUILD") == query["build"][0]]
+                    if "limit" in query:
+                        jobs = jobs[:int(query["limit"][0])]
+                    return 200, {"jobs": jobs}
+
+                if self.command == "GET" and path == "/workers":
+                    return 200, {"workers": [
+                        {"id": i, "host": "stub", "instance": i, "status": "idle",
+                         "properties": {"WORKER_CLASS": "qemu_x86_64"}}
+                        for i in range(1, stub.workers + 1)
+                    ]}
+
+                match = _JOB_PATH.match(path)
+                if self.command == "GET" and match:
+                    job = stub.jobs.get(int(match.group(1)))
+                    if job is None:
+                        return 404, {"error": "no such job"}
+                    with stub._lock:
+                        return 200, {"job": stub._advance(job)}
+
+                return 404, {"error": f"unknown route {self.command} {path}"}
+
+            def do_GET(self):
+                self._send(*self._route())
+
+            def do_POST(self):
+                self._send(*self._route())
+
+        return Handler
+
+    def start(self) -> "OpenQAStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "OpenQAStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная заглушка OpenQA REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9526)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="секунд на запрос")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--job-duration", type=float, help="секунд от создания job до done")
+    parser.add_argument("--job-jitter", type=float, default=0.0)
+    parser.add_argument("--job-failure-rate", type=float, default=0.0, help="доля jobs с result=failed")
+    args = parser.parse_args()
+
+    stub = OpenQAStub(args.host, args.port, args.workers, args.latency, args.failure_rate,
+                      args.job_duration, args.job_jitter, args.job_failure_rate)
+    print(f"🧪 OpenQA stub: {stub.url}")
+    stub.server.serve_forever()
@@ -0,0 +1,289 @@
+"""Локальная заглушка TestLink XML-RPC API для синхронизации и отчётов без живого сервера.
+
+    python -m src.app.simulators.testlink_stub --port 9527 --suites 5 --cases 200
+    TESTLINK_API_PYTHON_SERVER_URL=http://127.0.0.1:9527/lib/api/xmlrpc/v1/xmlrpc.php  (синхронизация)
+    TESTLINK_URL=http://127.0.0.1:9527/lib/api/xmlrpc/v1/xmlrpc.php                     (отчёты)
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from datetime import datetime
+from socketserver import ThreadingMixIn
+from typing import Dict, Any, List, Optional
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+RPC_PATH = "/lib/api/xmlrpc/v1/xmlrpc.php"
+# Как в TestLink: эти методы отвечают без devKey (проверка доступности)
+_NO_AUTH = {"about"}
+
+
+class _Handler(SimpleXMLRPCRequestHandler):
+    rpc_paths = (RPC_PATH, "/")
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        with stub._lock:
+            stub.requests_count += 1
+        # Задержка сети и TestLink - на HTTP-запрос (system.multicall - один запрос)
+        if stub.latency:
+            time.sleep(stub.latency)
+        super().do_POST()
+
+
+class _Server(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+def _error(code: int, message: str) -> List[Dict[str, Any]]:
+    """Ошибка в формате TestLink: [{'code': ..., 'message': ...}]"""
+    return [{"code": code, "message": message}]
+
+
+class TestLinkStub:
+    """In-memory TestLink: один проект, сьюты с кейсами, план со сборками.
+
+    Методы tl.*, которые вызывают testlink_sync и result_reporter, плюс system.multicall.
+    latency - секунд на HTTP-запрос, call_latency - на каждый вызов (в multicall тоже),
+    failure_rate - доля вызовов, отвечающих ошибкой TestLink. first_id / first_number - начало
+    внутренних ID (сьюты, кейсы) и внешних номеров кейсов, чтобы не пересекаться с данными в базе.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, prefix: str = "repo-tests",
+                 latency: float = 0.0, call_latency: float = 0.0, failure_rate: float = 0.0,
+                 seed: Optional[int] = None, first_id: int = 100, first_number: int = 1):
+        self.prefix = prefix
+        self.latency = latency
+        self.call_latency = call_latency
+        self.failure_rate = failure_rate
+        self.project = {"id": "1", "name": "Repo", "prefix": prefix, "active": "1"}
+        self.suites: Dict[int, Dict[str, Any]] = {}
+        self.cases: Dict[int, Dict[str, Any]] = {}
+        self.cases_by_external: Dict[str, Dict[str, Any]] = {}
+        self.plan = {"id": "1000", "name": "Regression", "active": "1", "is_public": "1"}
+        self.plan_cases: List[int] = []
+        self.builds = [{"id": "1", "name": "build-1", "testplan_id": self.plan["id"], "active": "1"}]
+        self.executions: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self.requests_count = 0
+        self._random = random.Random(seed)
+        self._ids = itertools.count(first_id)
+        self._numbers = itertools.count(first_number)
+        self._executions = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self.server = _Server((host, port), requestHandler=_Handler, logRequests=False, allow_none=True)
+        self.server.stub = self
+        self.server.register_multicall_functions()
+        for name in (
+            "checkDevKey", "about", "getProjects", "getTestProjectByName",
+            "getFirstLevelTestSuitesForTestProject", "getTestSuitesForTestSuite", "getTestSuiteByID",
+            "getTestCasesForTestSuite", "getTestCase", "getTestCasesForTestPlan", "getProjectTestPlans",
+            "getTestPlanByName", "getBuildsForTestPlan", "getLatestBuildForTestPlan", "getTestPlanPlatforms",
+            "reportTCResult",
+        ):
+            self.server.register_function(self._wrap(name, getattr(self, f"_{name}")), f"tl.{name}")
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{RPC_PATH}"
+
+    # Наполнение
+
+    def add_suite(self, cases: int, name: Optional[str] = None, steps: int = 3,
+                  parent_id: Optional[int] = None, in_plan: bool = True) -> int:
+        """Сьют с cases кейсами (по steps шагов); кейсы сразу попадают в план"""
+        with self._lock:
+            suite_id = next(self._ids)
+            self.suites[suite_id] = {"id": str(suite_id), "name": name or f"Suite {suite_id}",
+                                     "parent_id": str(parent_id or self.project["id"]), "cases": []}
+            for _ in range(cases):
+                case = self._new_case(suite_id, steps)
+                self.suites[suite_id]["cases"].append(int(case["id"]))
+                if in_plan:
+                    self.plan_cases.append(int(case["id"]))
+            return suite_id
+
+    def _new_case(self, suite_id: int, steps: int) -> Dict[str, Any]:
+        case_id, number = next(self._ids), next(self._numbers)
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        case = {
+            "id": str(case_id),
+            "testcase_id": str(case_id),
+            "tc_external_id": str(number),
+            "full_tc_external_id": f"{self.prefix}-{number}",
+            "name": f"case {number}",
+            "summary": f"<p>Summary of case {number}</p>",
+            "preconditions": "<p>Clean install</p>",
+            "steps": [
+                {"step_number": str(n), "actions": f"<p>Step {n} of case {number}</p>",
+                 "expected_results": f"<p>Step {n} passes</p>", "execution_type": "2"}
+                for n in range(1, steps + 1)
+            ],
+            "version": "1",
+            "testsuite_id": str(suite_id),
+            "parent_id": str(suite_id),
+            "creation_ts": now,
+            "modification_ts": now,
+        }
+        self.cases[case_id] = case
+        self.cases_by_external[case["full_tc_external_id"]] = case
+        return case
+
+    def touch_case(self, case_id: int):
+        """Новая версия кейса - следующая синхронизация увидит изменение"""
+        with self._lock:
+            case = self.cases[case_id]
+            case["version"] = str(int(case["version"]) + 1)
+            case["name"] += "*"
+            case["modification_ts"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Обработчики
+
+    def _wrap(self, name: str, method):
+        def call(args: Optional[Dict[str, Any]] = None):
+            with self._lock:
+                self.calls[name] = self.calls.get(name, 0) + 1
+                fail = self.failure_rate and self._random.random() < self.failure_rate
+            if self.call_latency:
+                time.sleep(self.call_latency)
+            if fail:
+                return _error(500, f"simulated failure in {name}")
+            if name not in _NO_AUTH and (not isinstance(args, dict) or not args.get("devKey")):
+                return _error(2000, "Can not authenticate client: invalid developer key")
+            with self._lock:
+                return method(args)
+        return call
+
+    def _checkDevKey(self, args):
+        return True
+
+    def _about(self, args):
+        return "Testlink API stub"
+
+    def _getProjects(self, args):
+        return [self.project]
+
+    def _getTestProjectByName(self, args):
+        if args.get("testprojectname") != self.project["name"]:
+            return _error(7011, "project not found")
+        return self.project
+
+    def _suite_info(self, suite: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: suite[key] for key in ("id", "name", "parent_id")}
+
+    def _getFirstLevelTestSuitesForTestProject(self, args):
+        return [self._suite_info(s) for s in self.suites.values() if s["parent_id"] == self.project["id"]] \
+            or _error(7008, "project has no suites")
+
+    def _getTestSuitesForTestSuite(self, args):
+        parent = str(args.get("testsuiteid"))
+        return {s["id"]: self._suite_info(s) for s in self.suites.values() if s["parent_id"] == parent}
+
+    def _getTestSuiteByID(self, args):
+        suite = self.suites.get(int(args.get("testsuiteid", 0)))
+        return self._suite_info(suite) if suite else _error(8000, "suite not found")
+
+    def _suite_tree(self, suite_id: int) -> List[int]:
+        ids = [suite_id]
+        for child in self.suites.values():
+            if child["parent_id"] == str(suite_id):
+                ids += self._suite_tree(int(child["id"]))
+        return ids
+
+    def _getTestCasesForTestSuite(self, args):
+        suite_id = int(args.get("testsuiteid", 0))
+        if suite_id not in self.suites:
+            return _error(8000, "suite not found")
+        suite_ids = self._suite_tree(suite_id) if args.get("deep", True) else [suite_id]
+        cases = [self.cases[case_id] for sid in suite_ids for case_id in self.suites[sid]["cases"]]
+        if args.get("details") == "only_id":
+            return [case["id"] for case in cases]
+        if args.get("details") == "simple":
+            return [{"id": case["id"], "name": case["name"], "parent_id": case["parent_id"],
+                     "external_id": case["tc_external_id"]} for case in cases]
+        return [dict(case, external_id=case["tc_external_id"]) for case in cases]
+
+    def _getTestCase(self, args):
+        if args.get("testcaseexternalid"):
+            case = self.cases_by_external.get(args["testcaseexternalid"])
+        else:
+            case = self.cases.get(int(args.get("testcaseid", 0)))
+        return [case] if case else _error(5000, "test case not found")
+
+    def _getTestCasesForTestPlan(self, args):
+        if str(args.get("testplanid")) != self.plan["id"]:
+            return _error(3000, "test plan not found")
+        return {
+            str(case_id): {"0": {"tcase_id": str(case_id), "tcase_name": self.cases[case_id]["name"],
+                                 "full_external_id": self.cases[case_id]["full_tc_external_id"],
+                                 "platform_id": "0"}}
+            for case_id in self.plan_cases
+        }
+
+    def _getProjectTestPlans(self, args):
+        return [self.plan]
+
+    def _getTestPlanByName(self, args):
+        return [self.plan] if args.get("testplanname") == self.plan["name"] else _error(3033, "plan not found")
+
+    def _getBuildsForTestPlan(self, args):
+        return self.builds
+
+    def _getLatestBuildForTestPlan(self, args):
+        return self.builds[-1]
+
+    def _getTestPlanPlatforms(self, args):
+        return _error(3041, "test plan has no platforms linked")
+
+    def _reportTCResult(self, args):
+        case = self.cases_by_external.get(args.get("testcaseexternalid"))
+        if case is None:
+            return _error(5040, f"test case {args.get('testcaseexternalid')} not found")
+        if args.get("status") not in ("p", "f", "b", "x"):
+            return _error(6000, f"invalid status {args.get('status')}")
+        execution_id = next(self._executions)
+        self.executions.append({"id": execution_id, "testcaseexternalid": args["testcaseexternalid"],
+                                "testplanid": args.get("testplanid"), "buildid": args.get("buildid"),
+                                "status": args["status"], "notes": args.get("notes")})
+        return [{"status": True, "operation": "reportTCResult", "overwrite": False,
+                 "message": "Success!", "id": execution_id}]
+
+    def start(self) -> "TestLinkStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "TestLinkStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная заглушка TestLink XML-RPC API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9527)
+    parser.add_argument("--suites", type=int, default=5)
+    parser.add_argument("--cases", type=int, default=200, help="кейсов в каждом сьюте")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = TestLinkStub(args.host, args.port, latency=args.latency, failure_rate=args.failure_rate)
+    for _ in range(args.suites):
+        stub.add_suite(args.cases)
+    print(f"🧪 TestLink stub: {stub.url} (сьюты {sorted(stub.suites)}, план {stub.plan['id']})")
+    stub.server.serve_forever()
@@ -0,0 +1,135 @@
+"""Необязательная трассировка OpenTelemetry: запрос API → задачи Celery → вызовы OpenQA / TestLink.
+
+Включается TRACING_ENABLED=true при установленных opentelemetry-sdk и
+opentelemetry-exporter-otlp-proto-http (poetry install -E tracing); адрес коллектора и имя сервиса -
+стандартные OTEL_EXPORTER_OTLP_ENDPOINT / OTEL_SERVICE_NAME. Контекст трассы уходит в
+заголовках сообщений Celery (traceparent), поэтому span задачи - потомок запроса API, который
+её поставил, а созданные задачей jobs OpenQA - события этого span. Без пакетов или с
+выключенным флагом функции модуля ничего не делают.
+"""
+import contextvars
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover - трассировка необязательна
+    trace = None
+
+_tracer = None
+# task_id → (span, токен контекста) задач, выполняющихся в процессе
+_task_spans: Dict[str, Any] = {}
+
+
+def setup_tracing(service_name: str) -> bool:
+    """Провайдер с экспортом OTLP; вызывать в каждом процессе (после fork - в дочернем)"""
+    global _tracer
+    if not TRACING_ENABLED or trace is None or _tracer is not None:
+        return _tracer is not None
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        logger.warning("Tracing disabled, OpenTelemetry SDK is not installed: %s", e)
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", service_name)}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("testlink-openqa-automator")
+    print(f"🔭 Tracing: {service_name} → {os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'localhost:4318')}")
+    return True
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", context: Any = None, **attributes: Any) -> Iterator[Any]:
+    """Вложенный span (None без трассировки); исключение помечает span ошибкой"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(
+        name, context=context, kind=getattr(SpanKind, kind.upper()),
+        attributes={key: value for key, value in attributes.items() if value is not None},
+    ) as current:
+        yield current
+
+
+@contextmanager
+def server_span(scope: Dict[str, Any]) -> Iterator[Any]:
+    """Span запроса API; входящий traceparent (от вызывающего сервиса) - родитель.
+    Шаблон маршрута известен только после сопоставления роутером - его дописывает set_route"""
+    if _tracer is None:
+        yield None
+        return
+    headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", ())}
+    with span(scope["method"], "server", propagate.extract(headers),
+              **{"http.method": scope["method"], "http.target": scope.get("path")}) as current:
+        yield current
+
+
+def set_route(current: Any, method: str, route: str):
+    """Имя span запроса и http.route по шаблону маршрута (/jobs/{job_id})"""
+    if current is not None:
+        current.update_name(f"{method} {route}")
+        current.set_attribute("http.route", route)
+
+
+def add_event(name: str, **attributes: Any):
+    """Событие в текущем span (например, ID созданного job OpenQA)"""
+    if _tracer is not None:
+        trace.get_current_span().add_event(name, {key: str(value) for key, value in attributes.items()
+                                                        if value is not None})
+
+
+def inject(carrier: Dict[str, Any]):
+    """traceparent / tracestate текущего span - в заголовки исходящего сообщения"""
+    if _tracer is not None:
+        propagate.inject(carrier)
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """fn для пула потоков: выполняется в контексте вызывающего, span потока - потомок текущего"""
+    if _tracer is None:
+        return fn
+    parent = contextvars.copy_context()
+    return lambda *args, **kwargs: parent.copy().run(fn, *args, **kwargs)
+
+
+# Задачи Celery (сигналы task_prerun / task_postrun)
+
+def start_task_span(task_id: str, name: str, request: Any, queue: Optional[str] = None):
+    if _tracer is None:
+        return
+    headers = getattr(request, "headers", None) or {}
+    carrier = {key: getattr(request, key, None) or headers.get(key) for key in ("traceparent", "tracestate")}
+    current = _tracer.start_span(
+        f"celery {name}", context=propagate.extract({k: v for k, v in carrier.items() if v}),
+        kind=SpanKind.CONSUMER, attributes={"celery.task_id": task_id, "celery.queue": queue or ""},
+    )
+    token = otel_context.attach(trace.set_span_in_context(current))
+    _task_spans[task_id] = (current, token)
+
+
+def end_task_span(task_id: str, state: Optional[str]):
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    current, token = entry
+    current.set_attribute("celery.state", state or "")
+    if state == "FAILURE":
+        current.set_status(Status(StatusCode.ERROR))
+    otel_context.detach(token)
+    current.end()
@@ -0,0 +1,52 @@
+"""Сборка мелких вызовов в одну задачу Celery.
+
+ID (например, jobs из событий OpenQA) копятся в процессе-отправителе и уходят одной задачей
+task.delay([...]) - как только набралось flush_every штук или через flush_interval секунд
+после первого. Повторы внутри пачки схлопываются.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+BATCH_FLUSH_EVERY = int(os.getenv("CELERY_BATCH_FLUSH_EVERY", "100"))
+BATCH_FLUSH_INTERVAL = float(os.getenv("CELERY_BATCH_FLUSH_INTERVAL", "2"))
+
+
+class TaskBatcher:
+    """Накопитель аргументов для задачи, принимающей список"""
+
+    def __init__(self, task, flush_every: int = BATCH_FLUSH_EVERY, flush_interval: float = BATCH_FLUSH_INTERVAL):
+        self.task = task
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._items: Dict[Any, None] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, item: Any):
+        with self._lock:
+            self._items[item] = None
+            if len(self._items) >= self.flush_every:
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            self.task.delay(batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self.task.delay(batch)
+
+    def _take(self) -> List[Any]:
+        batch = list(self._items)
+        self._items.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
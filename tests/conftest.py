@@ -0,0 +1,68 @@
+"""Общие фикстуры: заглушки TestLink / OpenQA (src.app.simulators) и тестовая база.
+
+Фикстура db пишет в базу из DATABASE_URL кейсы с номерами от FIRST_NUMBER и удаляет их (с jobs)
+после теста - только тестовая база. Без доступной базы такие тесты пропускаются.
+"""
+import os
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.throughput import cleanup
+from src.app.services import openqa_client, result_reporter
+from src.app.simulators.openqa_stub import OpenQAStub
+from src.app.simulators.testlink_stub import TestLinkStub
+
+# Номера кейсов и ID jobs тестов - далеко от данных в базе и от бенчмарков
+FIRST_NUMBER = 970_000_000
+
+
+@pytest.fixture
+def openqa(monkeypatch):
+    """Заглушка OpenQA; общий клиент процесса (get_openqa_client) смотрит на неё, без пауз между ретраями"""
+    with OpenQAStub(first_id=FIRST_NUMBER) as stub:
+        monkeypatch.setattr(openqa_client, "_client", openqa_client.OpenQAClient(base_url=stub.url, backoff_factor=0))
+        monkeypatch.setattr(openqa_client, "_client_pid", os.getpid())
+        yield stub
+        openqa_client._client.close()
+
+
+@pytest.fixture
+def testlink(monkeypatch):
+    """Заглушка TestLink для синхронизации и отчётов (кеши клиента и контекста отчёта - заново)"""
+    with TestLinkStub(first_id=FIRST_NUMBER, first_number=FIRST_NUMBER) as stub:
+        monkeypatch.setenv("TESTLINK_API_PYTHON_SERVER_URL", stub.url)
+        monkeypatch.setenv("TESTLINK_URL", stub.url)
+        monkeypatch.setenv("TESTLINK_API_PYTHON_DEVKEY", "tests")
+        monkeypatch.setenv("TESTLINK_DEVKEY", "tests")
+        monkeypatch.setattr(result_reporter, "_local", threading.local())
+        result_reporter.report_context_cache.invalidate()
+        yield stub
+        result_reporter.report_context_cache.invalidate()
+
+
+@pytest.fixture(scope="session")
+def database():
+    from src.app.database import engine
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"test database is not available: {e.orig}")
+    return engine
+
+
+@pytest.fixture
+def db(database):
+    from src.app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        cleanup(session, FIRST_NUMBER)
+        session.close()
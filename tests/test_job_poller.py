@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from src.app.models import TestCase, TestCaseStatus, TestJob
+from src.app.services import job_poller
+from src.app.services.job_poller import (
+    MISSING_RESULT, apply_job_states, combined_status, fetch_job_states, resolve_missing_jobs,
+)
+from src.app.services.openqa_client import OpenQAClient
+from .conftest import FIRST_NUMBER
+
+
+@pytest.mark.parametrize("results, status", [
+    (["passed", "passed"], TestCaseStatus.PASSED),
+    (["passed", "softfailed"], TestCaseStatus.BLOCKED),
+    (["failed", "none", "passed"], TestCaseStatus.FAILED),
+    ([MISSING_RESULT, "passed"], TestCaseStatus.BLOCKED),
+])
+def test_combined_status_is_worst_cell(results, status):
+    assert combined_status(results) == status
+
+
+def test_fetch_job_states_in_chunks(openqa, monkeypatch):
+    monkeypatch.setattr(job_poller, "POLL_CHUNK", 2)
+    job_ids = [str(openqa.create_job({"TEST": f"t{n}"})["id"]) for n in range(5)]
+
+    states = fetch_job_states(job_ids)
+
+    assert sorted(states) == sorted(job_ids)
+    assert openqa.requests_count == 3
+
+
+def test_resolve_missing_jobs(openqa):
+    job_id = str(openqa.create_job({"TEST": "kept"})["id"])
+    deleted = str(FIRST_NUMBER - 1)
+
+    states = resolve_missing_jobs(fetch_job_states([job_id, deleted]), [job_id, deleted])
+
+    assert states[job_id]["state"] == "scheduled"
+    assert states[deleted] == {"id": deleted, "state": "cancelled", "result": MISSING_RESULT}
+
+
+def test_resolve_missing_jobs_keeps_job_on_server_error(openqa):
+    # Не 404 - job не отмечается удалённым, его проверят в следующем цикле
+    client = OpenQAClient(base_url=openqa.url, retries=0)
+    openqa.fail_next(1)
+
+    assert resolve_missing_jobs({}, [str(FIRST_NUMBER)], client) == {}
+
+
+def _case(db, number: int) -> TestCase:
+    case = TestCase(testcase_number=number, name=f"case {number}", status=TestCaseStatus.RUNNING)
+    db.add(case)
+    db.flush()
+    return case
+
+
+def _job(db, openqa, case: TestCase, launch_id=None) -> str:
+    job_id = str(openqa.create_job({"TEST": f"testlink_{case.id}"})["id"])
+    db.add(TestJob(testcase_id=case.id, openqa_job_id=job_id, openqa_status="scheduled",
+                   next_check_at=datetime.utcnow(), launch_id=launch_id))
+    return job_id
+
+
+def _status(db, case: TestCase) -> TestCaseStatus:
+    return db.query(TestCase.status).filter(TestCase.id == case.id).scalar()
+
+
+def test_matrix_case_status_across_poll_cycles(db, openqa):
+    case = _case(db, FIRST_NUMBER)
+    failed_cell, passed_cell = _job(db, openqa, case, "launch-1"), _job(db, openqa, case, "launch-1")
+    db.commit()
+
+    openqa.finish_job(int(failed_cell), "failed")
+    finished = apply_job_states(db, fetch_job_states([failed_cell]))
+    assert [item["job"]["id"] for item in finished] == [int(failed_cell)]
+    # Вторая ячейка ещё идёт
+    assert _status(db, case) == TestCaseStatus.RUNNING
+
+    openqa.finish_job(int(passed_cell), "passed")
+    apply_job_states(db, fetch_job_states([passed_cell]))
+    # Худший результат, включая ячейку прошлого цикла
+    assert _status(db, case) == TestCaseStatus.FAILED
+
+
+def test_single_job_sets_case_status(db, openqa):
+    case = _case(db, FIRST_NUMBER)
+    job_id = _job(db, openqa, case)
+    db.commit()
+
+    assert apply_job_states(db, fetch_job_states([job_id])) == []
+    openqa.finish_job(int(job_id), "passed")
+    apply_job_states(db, fetch_job_states([job_id]))
+
+    assert _status(db, case) == TestCaseStatus.PASSED
+    job = db.query(TestJob).filter(TestJob.openqa_job_id == job_id).one()
+    assert (job.openqa_status, job.openqa_result, job.next_check_at) == ("done", "passed", None)
@@ -0,0 +1,43 @@
+import pytest
+import requests
+
+from src.app.services.openqa_client import OpenQAClient
+
+
+def test_get_retries_server_errors(openqa):
+    job = openqa.create_job({"TEST": "retry"})
+    client = OpenQAClient(base_url=openqa.url, retries=3, backoff_factor=0)
+    openqa.fail_next(2)
+
+    assert client.get_job(job["id"])["settings"]["TEST"] == "retry"
+    assert openqa.requests_count == 3
+
+
+def test_get_gives_up_after_retries(openqa):
+    client = OpenQAClient(base_url=openqa.url, retries=1, backoff_factor=0)
+    openqa.fail_next(5)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client.list_jobs(limit=1)
+    assert error.value.response.status_code == 503
+    assert openqa.requests_count == 2
+
+
+def test_post_is_not_retried(openqa):
+    # Повтор POST /jobs после 5xx мог бы создать второй job
+    client = OpenQAClient(base_url=openqa.url, retries=3, backoff_factor=0)
+    openqa.fail_next(1)
+
+    with pytest.raises(requests.HTTPError):
+        client.create_job({"TEST": "once"})
+    assert openqa.requests_count == 1
+    assert openqa.jobs == {}
+
+
+def test_missing_job_is_404(openqa):
+    client = OpenQAClient(base_url=openqa.url, backoff_factor=0)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client.get_job(1)
+    assert error.value.response.status_code == 404
+    assert openqa.requests_count == 1
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from src.app.models import TestCase, TestJob
+from src.app.services.result_reporter import bulk_report_results
+from src.app.services.testlink_sync import sync_testsuite
+from .conftest import FIRST_NUMBER
+
+
+def _done_jobs(db, testlink, results):
+    suite_id = testlink.add_suite(len(results))
+    sync_testsuite(db, suite_id)
+    cases = db.query(TestCase).filter(TestCase.testcase_number >= FIRST_NUMBER).order_by(TestCase.testcase_number)
+    db.add_all(
+        TestJob(testcase_id=case.id, openqa_job_id=str(FIRST_NUMBER + n), openqa_status="done",
+                openqa_result=result, finished_at=datetime.utcnow())
+        for n, (case, result) in enumerate(zip(cases, results))
+    )
+    db.commit()
+
+
+def _executions(testlink):
+    return {execution["testcaseexternalid"]: execution["status"] for execution in testlink.executions
+            if execution["testcaseexternalid"].startswith(f"{testlink.prefix}-")}
+
+
+def test_drain_reports_each_job_once(db, testlink):
+    _done_jobs(db, testlink, ["passed", "failed", "softfailed"])
+
+    bulk_report_results(db)
+    bulk_report_results(db)
+
+    assert _executions(testlink) == {
+        f"{testlink.prefix}-{FIRST_NUMBER}": "p",
+        f"{testlink.prefix}-{FIRST_NUMBER + 1}": "f",
+        f"{testlink.prefix}-{FIRST_NUMBER + 2}": "b",
+    }
+    assert len(testlink.executions) == len({execution["id"] for execution in testlink.executions})
+    jobs = db.query(TestJob).join(TestCase).filter(TestCase.testcase_number >= FIRST_NUMBER).all()
+    assert all(job.reported_at is not None and job.testlink_execution_id for job in jobs)
+
+
+def test_failed_report_is_retried_later(db, testlink):
+    _done_jobs(db, testlink, ["passed"])
+    testlink.failure_rate = 1.0
+
+    bulk_report_results(db)
+
+    job = db.query(TestJob).join(TestCase).filter(TestCase.testcase_number == FIRST_NUMBER).one()
+    assert (job.reported_at, job.report_attempts) == (None, 1)
+    assert job.next_report_at > datetime.utcnow()
+    assert _executions(testlink) == {}
@@ -0,0 +1,30 @@
+from src.app.models import TestCase
+from src.app.services import testlink_sync
+from src.app.services.testlink_sync import fetch_plan_testcases, get_testlink_client, sync_testsuite
+from .conftest import FIRST_NUMBER
+
+
+def test_plan_cases_are_fetched_by_multicall(testlink, monkeypatch):
+    monkeypatch.setattr(testlink_sync, "MULTICALL_CHUNK", 4)
+    testlink.add_suite(10)
+    tls = get_testlink_client()
+    requests_before = testlink.requests_count
+
+    cases = fetch_plan_testcases(tls, int(testlink.plan["id"]))
+
+    assert sorted(int(case["tc_external_id"]) for case in cases) == list(range(FIRST_NUMBER, FIRST_NUMBER + 10))
+    # Список плана + 3 multicall по 4 / 4 / 2 getTestCase
+    assert testlink.requests_count - requests_before == 4
+    assert testlink.calls["getTestCase"] == 10
+
+
+def test_incremental_sync_writes_only_changed_cases(db, testlink):
+    suite_id = testlink.add_suite(3)
+
+    first = sync_testsuite(db, suite_id)
+    testlink.touch_case(testlink.suites[suite_id]["cases"][0])
+    again = sync_testsuite(db, suite_id)
+
+    assert (first["inserted_cases"], first["updated_cases"]) == (3, 0)
+    assert (again["inserted_cases"], again["updated_cases"], again["unchanged_cases"]) == (0, 1, 2)
+    assert db.query(TestCase).filter(TestCase.testcase_number >= FIRST_NUMBER).count() == 3